@@ -1,3 +1,4 @@
+import json
 import os
 from typing import Literal
 import datetime
@@ -29,6 +30,7 @@ class MyExpenses:
     FILE_LAST_UPDATE = os.path.join(
         FOLDER_CACHED_EXPENSES, "last_update.txt"
     )
+    FILE_ETAGS = os.path.join(FOLDER_CACHED_EXPENSES, "etags.json")
     URL_API = "http://ec2-23-20-155-185.compute-1.amazonaws.com:5000"
 
     # Time to wait before updating the expenses
@@ -53,6 +55,51 @@ class MyExpenses:
 
         return True
 
+    def _get_from_api_with_etag(self, url: str) -> pd.DataFrame:
+        """
+        This method requests the url sending the ETag of the last response.
+        If the data did not change, the API answers 304 and an empty
+        DataFrame is returned, since the cached files are up to date.
+
+        Parameters:
+        ----------
+        url: str
+            The url to request
+
+        Returns:
+        -------
+        pd.DataFrame
+            The response as a DataFrame, None if the request failed
+        """
+        # The ETags are only valid while the cached files exist
+        etags = {}
+        if (
+            os.path.exists(MyExpenses.FILE_ETAGS)
+            and os.path.exists(MyExpenses.FILE_EXPENSES)
+            and os.path.exists(MyExpenses.FILE_LABELED_EXPENSES)
+        ):
+            with open(MyExpenses.FILE_ETAGS, "r") as f:
+                etags = json.load(f)
+
+        headers = {"Authorization": f"Bearer {self._token}"}
+        if url in etags:
+            headers["If-None-Match"] = etags[url]
+        response = requests.get(url, headers=headers)
+
+        if response.status_code == 304:
+            return pd.DataFrame()
+
+        if response.status_code != 200:
+            return None
+
+        # Save the ETag for the next request
+        if "ETag" in response.headers:
+            etags[url] = response.headers["ETag"]
+            with open(MyExpenses.FILE_ETAGS, "w") as f:
+                json.dump(etags, f)
+
+        return pd.DataFrame(response.json())
+
     def _modify_expenses_table(
         self, df_expenses: pd.DataFrame
     ) -> pd.DataFrame:
@@ -105,14 +152,9 @@ class MyExpenses:
             MyExpenses.URL_API
             + f"/expenses/get_full_transactions/?timeframe={timeframe}"
         )
-        headers = {"Authorization": f"Bearer {self._token}"}
-        response = requests.get(url, headers=headers)
 
         # Get the response as a DataFrame
-        if response.status_code != 200:
-            return None
-
-        return pd.DataFrame(response.json())
+        return self._get_from_api_with_etag(url)
 
     def _modify_expenses_labeled_table(
         self,
@@ -198,14 +240,9 @@ class MyExpenses:
             MyExpenses.URL_API
             + f"/expenses/get_transactions_with_labels/?timeframe={timeframe}"
         )  # noqa
-        headers = {"Authorization": f"Bearer {self._token}"}
-        response = requests.get(url, headers=headers)
-
-        if response.status_code != 200:
-            return None
 
         # Get the response as a DataFrame
-        return pd.DataFrame(response.json())
+        return self._get_from_api_with_etag(url)
 
     @staticmethod
     def _get_appended_data(
@@ -305,12 +342,21 @@ class MyExpenses:
         df_expenses = self._get_expenses_from_api(api_timeframe)
         df_expenses = self._modify_expenses_table(df_expenses)
 
+        # If the expenses did not change, the labels are merged with the
+        # cached expenses
+        df_expenses_to_label = df_expenses
+        if df_expenses.empty and os.path.exists(MyExpenses.FILE_EXPENSES):
+            df_expenses_to_label = self._get_expenses_from_cache()
+            df_expenses_to_label["datetime"] = pd.to_datetime(
+                df_expenses_to_label["datetime"]
+            )
+
         # Get the labeled expenses from the API
         df_labeled_expenses = self._get_labeled_expenses_from_api(
             api_timeframe
         )
         df_labeled_expenses = self._modify_expenses_labeled_table(
-            df_expenses,
+            df_expenses_to_label,
             df_labeled_expenses,
             return_amount=return_amount,
         )
@@ -395,6 +441,32 @@ class MyExpenses:
 
         return df_expenses_moving_average
 
+    def get_weekly_expenses_from_api(
+        self,
+        timeframe: Literal[
+            "daily", "weekly", "partial_weekly", "monthly", "from_origin"
+        ] = "from_origin",
+    ) -> pd.DataFrame:
+        """
+        This method returns the weekly expenses computed by the API
+
+        Parameters:
+        ----------
+        timeframe: Literal["daily", "weekly", "partial_weekly", "monthly", "from_origin"]
+            The timeframe to get the expenses from
+        """
+        url = (
+            MyExpenses.URL_API
+            + f"/expenses/weekly-expenses/?timeframe={timeframe}"
+        )
+        headers = {"Authorization": f"Bearer {self._token}"}
+        response = requests.get(url, headers=headers)
+
+        if response.status_code != 200:
+            return None
+
+        return pd.DataFrame(response.json(), columns=["week", "amount"])
+
     @staticmethod
     def get_weekly_expenses(df: pd.DataFrame) -> pd.DataFrame:
         """
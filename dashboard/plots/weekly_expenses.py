@@ -47,9 +47,7 @@ if __name__ == "__main__":
 
     # Load your data from the backend (assuming a CSV file)
     expenses = MyExpenses(token=os.getenv("TOKEN_EXPENSES_API"))
-    df_expenses = expenses._get_expenses_from_api(timeframe="from_origin")
-
-    df_weekly = expenses.get_weekly_expenses(df_expenses)
+    df_weekly = expenses.get_weekly_expenses_from_api(timeframe="from_origin")
 
     figure = barplot_weekly(df_weekly)
     figure.show()
@@ -1,11 +1,10 @@
 import os
-from typing import Literal, Tuple, List
+from typing import Any, Callable, List, Literal, Optional, Tuple
 import datetime
 
-import pyodbc
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import HTTPException
 
 from expenses.api.schemas import (
@@ -13,11 +12,39 @@ from expenses.api.schemas import (
     LabeledTransactionInfoFull,
 )
 from expenses.api.security import check_access_token
+from expenses.processors.schemas import TransactionInfo
 from expenses.api.utils import (
+    ANOMALY_TRANSACTION_TYPES_,
+    append_to_columnar_store,
+    are_there_transactions_without_label,
+    check_connection,
+    compute_etag,
     get_cursor,
+    get_data_version,
+    get_full_transaction_rows_with_labels,
+    get_backfill_checkpoint,
     get_date_from_search,
     get_query_to_insert_values,
+    get_query_to_update_daily_aggregates,
     get_transactions,
+    IngestionBuffer,
+    intraday_profiles,
+    is_not_modified,
+    Job,
+    JobCancelled,
+    job_manager,
+    merchant_dictionary,
+    merchant_windows,
+    online_detector,
+    rebuild_anomaly_features,
+    rebuild_columnar_store,
+    rebuild_daily_aggregates,
+    rebuild_merchants,
+    result_cache,
+    run_in_database,
+    save_backfill_checkpoint,
+    transaction_outliers,
+    update_anomaly_features,
 )
 
 # Emails to obtain the transactions from
@@ -33,32 +60,442 @@ if os.path.exists("expenses/.env"):
     load_dotenv(dotenv_path="expenses/.env")
 
 
+def invalidate_read_caches(transactions: List[Tuple]) -> None:
+    """
+    This function removes the cached results that are not valid after the
+    transactions are committed. It must be called after the commit, so a
+    reader does not cache the data before the transactions.
+
+    Parameters
+    ----------
+    transactions : List[Tuple]
+        The values of the transactions inserted.
+    """
+    if len(transactions) == 0:
+        return
+
+    result_cache.invalidate()
+    for transaction in transactions:
+        intraday_profiles.invalidate_day(transaction[3].date())
+
+
 # Function to insert the data into the database
 def insert_data_into_database(
-    cursor: pyodbc.Cursor, transaction: Tuple
-) -> str:
+    cursor: Any, transaction: Tuple, commit: bool = True
+) -> bool:
     """
     This function inserts the data into the database.
 
     Parameters
     ----------
-    cursor : pyodbc.Cursor
+    cursor : Cursor
         The cursor to the database.
     transaction : Tuple
         The transaction to insert.
+    commit : bool, optional
+        If False, the insertion is not committed, so it is committed with
+        other changes, by default True. The caller must then call
+        invalidate_read_caches after the commit.
+
+    Returns
+    -------
+    bool
+        False if the transaction was already in the database.
     """
     try:
+        merchant_id = merchant_dictionary.get_id(cursor, transaction[2])
         cursor.execute(
-            get_query_to_insert_values(), transaction + transaction[:-1]
+            get_query_to_insert_values(),
+            transaction + (merchant_id,) + transaction[:-1],
         )
-        cursor.commit()
-        return JSONResponse(status_code=200, content={"message": "Success."})
+        # Update the daily aggregates and the features of the day only if
+        # the transaction was inserted, all the changes are committed
+        # together.
+        inserted = cursor.rowcount > 0
+        if inserted:
+            cursor.execute(
+                get_query_to_update_daily_aggregates(),
+                (transaction[3], transaction[0], transaction[1]),
+            )
+            if transaction[0] in ANOMALY_TRANSACTION_TYPES_:
+                update_anomaly_features(cursor, transaction[3].date())
+        if commit:
+            cursor.connection.commit()
+
+        # The cached results are not valid after a new transaction
+        if inserted and commit:
+            invalidate_read_caches([transaction])
+        if inserted:
+            if transaction[0] == "Compra":
+                merchant_windows.add(
+                    transaction[3].date(), merchant_id, transaction[1]
+                )
+            if transaction[0] in ANOMALY_TRANSACTION_TYPES_:
+                online_detector.add(
+                    cursor, transaction[3].date(), transaction[1]
+                )
+                transaction_outliers.add(
+                    transaction[2], transaction[3].date(), transaction[1]
+                )
+
+        # The day is scored again once the transaction is committed
+        if commit:
+            online_detector.schedule_scoring()
+        return inserted
     except Exception as e:
+        # The new merchant was not committed
+        if commit:
+            merchant_dictionary.invalidate()
         raise HTTPException(status_code=500, detail="Insertion failed.")
 
 
+def get_transaction_values(transaction: TransactionInfo) -> Tuple:
+    """
+    This function returns the values of the transaction in the order of the
+    insertion query.
+
+    Parameters
+    ----------
+    transaction : TransactionInfo
+        The transaction to insert.
+
+    Returns
+    -------
+    Tuple
+        The values to insert.
+    """
+    return (
+        transaction.transaction_type,
+        transaction.amount,
+        transaction.merchant,
+        transaction.datetime.replace(tzinfo=None),
+        transaction.paynment_method,
+        transaction.email_log,
+    )
+
+
+def insert_transactions(
+    transactions: List[TransactionInfo],
+    progress: Optional[Callable[[str], None]] = None,
+) -> None:
+    """
+    This function inserts the transactions into the database using a single
+    connection.
+
+    Parameters
+    ----------
+    transactions : List[TransactionInfo]
+        The transactions to insert.
+    progress : Callable[[str], None], optional
+        A function called with "inserted" after each new transaction is
+        inserted.
+    """
+    # Establish the connection
+    cursor = get_cursor()
+
+    inserted_rows = []
+    for transaction in transactions:
+        values = get_transaction_values(transaction)
+        if insert_data_into_database(cursor, values):
+            inserted_rows.append(values)
+            if progress is not None:
+                progress("inserted")
+
+    # Close the connection
+    cursor.close()
+
+    # Only the new transactions are appended to the columnar store
+    append_to_columnar_store(inserted_rows)
+
+
+def write_transactions(rows: List[Tuple]) -> List[bool]:
+    """
+    This function inserts a batch of transactions using a single connection
+    and a single commit. It is the writer of the ingestion buffer.
+
+    Parameters
+    ----------
+    rows : List[Tuple]
+        The values of the transactions to insert.
+
+    Returns
+    -------
+    List[bool]
+        For each transaction, False if it was already in the database.
+    """
+    cursor = get_cursor()
+    if cursor is None:
+        raise ConnectionError("The connection to the database failed.")
+
+    try:
+        inserted = [
+            insert_data_into_database(cursor, row, commit=False)
+            for row in rows
+        ]
+        cursor.connection.commit()
+    except Exception:
+        # The transactions and the merchants were added to the windows,
+        # profiles and dictionary in memory before the commit.
+        merchant_dictionary.invalidate()
+        merchant_windows.invalidate()
+        intraday_profiles.invalidate()
+        online_detector.invalidate()
+        transaction_outliers.invalidate()
+        raise
+    finally:
+        cursor.close()
+
+    inserted_rows = [
+        row for row, row_inserted in zip(rows, inserted) if row_inserted
+    ]
+    invalidate_read_caches(inserted_rows)
+
+    # The days of the batch are scored in a single call to the model
+    online_detector.schedule_scoring()
+
+    # Only the new transactions are appended to the columnar store
+    append_to_columnar_store(inserted_rows)
+
+    return inserted
+
+
+# Buffer between the parsing of the emails and the writes to the database
+ingestion_buffer = IngestionBuffer(
+    write_transactions,
+    max_size=int(os.getenv("INGESTION_QUEUE_SIZE", 1000)),
+    batch_size=int(os.getenv("INGESTION_BATCH_SIZE", 100)),
+    flush_interval_ms=int(os.getenv("INGESTION_FLUSH_MS", 200)),
+    spill_path=os.getenv("INGESTION_SPILL_PATH"),
+    max_retries=int(os.getenv("INGESTION_MAX_RETRIES", 3)),
+)
+
+
+def populate_from_emails(
+    date_to_search: datetime.datetime,
+    progress: Optional[Callable[[str], None]] = None,
+) -> bool:
+    """
+    This function obtains the transactions from the emails and inserts them
+    into the database. Each transaction is put in the ingestion buffer when
+    it is parsed, so it is written while the next emails are fetched. If
+    the rows cannot be written, the parsing stops and the error is raised.
+
+    Parameters
+    ----------
+    date_to_search : datetime.datetime
+        The date to obtain the transactions from.
+    progress : Callable[[str], None], optional
+        A function called with the name of the counter to increase: emails
+        "fetched", transactions "parsed" and "inserted".
+
+    Returns
+    -------
+    bool
+        False if there were no transactions for an email.
+    """
+
+    errors = []
+
+    def on_written(inserted: bool) -> None:
+        if inserted and progress is not None:
+            progress("inserted")
+
+    def on_transaction(transaction: TransactionInfo) -> None:
+        if len(errors) > 0:
+            raise errors[0]
+        ingestion_buffer.put(
+            get_transaction_values(transaction), on_written, errors.append
+        )
+
+    try:
+        for email in EMAILS_FROM_:
+            # Process the transactions
+            transactions = get_transactions(
+                email_from=email,
+                date_to_search=date_to_search,
+                progress=progress,
+                on_transaction=on_transaction,
+            )
+            if len(transactions) == 0:
+                return False
+    finally:
+        # Wait for the transactions put in the buffer
+        ingestion_buffer.flush()
+
+    if len(errors) > 0:
+        raise errors[0]
+
+    return True
+
+
+def populate_job(job: Job, date_to_search: datetime.datetime) -> dict:
+    """
+    This function is the background job to populate the transactions
+    table. The progress is reported in the job.
+
+    Parameters
+    ----------
+    job : Job
+        The job executed.
+    date_to_search : datetime.datetime
+        The date to obtain the transactions from.
+
+    Returns
+    -------
+    dict
+        If there were transactions for all the emails.
+    """
+    return {
+        "transactions_found": populate_from_emails(date_to_search, job.report)
+    }
+
+
+def backfill_chunk(
+    cursor: Any,
+    job: Job,
+    email_from: str,
+    date_from: datetime.date,
+    date_until: datetime.date,
+) -> List[Tuple]:
+    """
+    This function inserts the transactions of the emails between the dates
+    and saves the checkpoint. Everything is committed at the end, so the
+    chunk is inserted completely or not at all.
+
+    Parameters
+    ----------
+    cursor : Cursor
+        The cursor to the database.
+    job : Job
+        The job of the backfill, to report the progress.
+    email_from : str
+        The email address to obtain the transactions from.
+    date_from : datetime.date
+        The start date of the chunk (inclusive).
+    date_until : datetime.date
+        The end date of the chunk (exclusive).
+
+    Returns
+    -------
+    List[Tuple]
+        The values of the transactions inserted.
+    """
+    transactions = get_transactions(
+        email_from=email_from,
+        date_to_search=datetime.datetime.combine(date_from, datetime.time()),
+        progress=job.report,
+        date_until=datetime.datetime.combine(date_until, datetime.time()),
+    )
+    values = [
+        get_transaction_values(transaction) for transaction in transactions
+    ]
+
+    inserted_rows = []
+    for transaction in values:
+        if insert_data_into_database(cursor, transaction, commit=False):
+            inserted_rows.append(transaction)
+            job.report("inserted")
+
+    # The days after today may have more emails, so they are not saved in
+    # the checkpoint.
+    save_backfill_checkpoint(
+        cursor, email_from, min(date_until, datetime.date.today())
+    )
+    cursor.connection.commit()
+    invalidate_read_caches(inserted_rows)
+
+    return inserted_rows
+
+
+def backfill_job(
+    job: Job,
+    date_from: datetime.date,
+    chunk_days: int,
+    restart: bool = False,
+) -> dict:
+    """
+    This function is the background job to backfill the transactions
+    table. The emails are processed in chunks of days, in order. Each
+    chunk is committed with its checkpoint, so if the job fails it resumes
+    from the last chunk committed. The insertion is idempotent, so a chunk
+    processed twice does not duplicate the transactions.
+
+    Parameters
+    ----------
+    job : Job
+        The job executed.
+    date_from : datetime.date
+        The date to obtain the transactions from.
+    chunk_days : int
+        The number of days of each chunk.
+    restart : bool, optional
+        If True, the checkpoints are removed and the backfill starts from
+        the date given, by default False.
+
+    Returns
+    -------
+    dict
+        The checkpoint of each email address.
+    """
+    cursor = get_cursor()
+    date_until = datetime.date.today() + datetime.timedelta(days=1)
+    checkpoints = {}
+
+    try:
+        for email in EMAILS_FROM_:
+            if restart:
+                save_backfill_checkpoint(cursor, email, None)
+                cursor.connection.commit()
+
+            # Resume from the last chunk committed
+            checkpoint = get_backfill_checkpoint(cursor, email)
+            chunk_start = (
+                max(date_from, checkpoint)
+                if checkpoint is not None
+                else date_from
+            )
+
+            while chunk_start < date_until:
+                chunk_end = min(
+                    chunk_start + datetime.timedelta(days=chunk_days),
+                    date_until,
+                )
+                try:
+                    inserted_rows = backfill_chunk(
+                        cursor, job, email, chunk_start, chunk_end
+                    )
+                except Exception as e:
+                    # The transactions and the merchants of the chunk were
+                    # added to the memory before the commit.
+                    cursor.connection.rollback()
+                    merchant_dictionary.invalidate()
+                    merchant_windows.invalidate()
+                    intraday_profiles.invalidate()
+                    online_detector.invalidate()
+                    transaction_outliers.invalidate()
+                    if isinstance(e, JobCancelled):
+                        raise
+                    raise RuntimeError(
+                        f"The chunk from {chunk_start} to {chunk_end} of "
+                        f"{email} failed: {e}"
+                    ) from e
+
+                append_to_columnar_store(inserted_rows)
+                online_detector.schedule_scoring()
+                job.report("chunks")
+                chunk_start = chunk_end
+
+            checkpoints[email] = min(
+                chunk_start, datetime.date.today()
+            ).isoformat()
+    finally:
+        cursor.close()
+
+    return {"checkpoints": checkpoints}
+
+
 @router.get("/health", dependencies=[Depends(check_access_token)])
-def test_connection():
+async def test_connection():
     """
     This function tests the connection to the database.
 
@@ -68,12 +505,7 @@ def test_connection():
         A message indicating the status of the connection.
     """
     try:
-        # Establish the connection
-        cursor = get_cursor()
-        # Obtain the rows
-        cursor.execute("SELECT TOP 1 * FROM transactions")
-        rows = cursor.fetchall()
-        cursor.close()
+        await run_in_database(check_connection)
         return JSONResponse(
             status_code=200, content={"message": "Connection sucessful"}
         )
@@ -83,16 +515,44 @@ def test_connection():
         )
 
 
+@router.get("/cache", dependencies=[Depends(check_access_token)])
+async def get_cache_stats() -> dict:
+    """
+    This function returns the counters of the cache of the read endpoints.
+
+    Returns
+    -------
+    dict
+        The hits, misses, hit ratio and size of the cache.
+    """
+    return result_cache.stats()
+
+
+@router.get("/ingestion", dependencies=[Depends(check_access_token)])
+async def get_ingestion_metrics() -> dict:
+    """
+    This function returns the metrics of the ingestion buffer.
+
+    Returns
+    -------
+    dict
+        The depth of the queue, the rows of each stage and their
+        throughput.
+    """
+    return ingestion_buffer.metrics()
+
+
 @router.post(
-    "/", dependencies=[Depends(check_access_token)], responses={500: {}}
+    "/", dependencies=[Depends(check_access_token)], responses={202: {}}
 )
-def populate_table(
+async def populate_table(
     timeframe: Literal[
         "daily", "weekly", "partial_weekly", "monthly", "from_origin"
     ]
 ):
     """
-    This function populates the transactions table.
+    This function enqueues a job to populate the transactions table. The
+    progress of the job is returned by /database/jobs/{job_id}.
 
     Parameters
     ----------
@@ -103,7 +563,7 @@ def populate_table(
     Returns
     -------
     str
-        A message indicating the status of the connection.
+        The id of the job.
     """
     # Check if the timeframe is valid
     if timeframe not in [
@@ -119,44 +579,239 @@ def populate_table(
             "monthly",
         )
 
+    # Get the date to search
+    date_to_search = get_date_from_search(timeframe)
+
+    # The emails are processed in background
+    job = job_manager.submit("populate_table", populate_job, date_to_search)
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Operation enqueued.",
+            "job_id": job.id,
+            "status_url": f"/database/jobs/{job.id}",
+        },
+    )
+
+
+@router.post(
+    "/backfill",
+    dependencies=[Depends(check_access_token)],
+    responses={202: {}},
+)
+async def backfill_table(
+    date_from: Optional[datetime.date] = None,
+    chunk_days: int = Query(default=30, ge=1),
+    restart: bool = False,
+):
+    """
+    This function enqueues a job to backfill the transactions table in
+    chunks of days. If a previous backfill failed, it resumes from the
+    last chunk committed.
+
+    Parameters
+    ----------
+    date_from : Optional[datetime.date]
+        The date to obtain the transactions from. By default, the origin
+        of the account.
+    chunk_days : int
+        The number of days of each chunk, by default 30.
+    restart : bool
+        If True, the checkpoints are ignored, by default False.
+
+    Returns
+    -------
+    str
+        The id of the job.
+    """
+    if date_from is None:
+        date_from = get_date_from_search("from_origin").date()
+
+    job = job_manager.submit(
+        "backfill", backfill_job, date_from, chunk_days, restart
+    )
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Operation enqueued.",
+            "job_id": job.id,
+            "status_url": f"/database/jobs/{job.id}",
+        },
+    )
+
+
+@router.get(
+    "/jobs/{job_id}",
+    dependencies=[Depends(check_access_token)],
+    responses={404: {}},
+)
+async def get_job_status(job_id: str) -> dict:
+    """
+    This function returns the status and the progress of a background job.
+
+    Parameters
+    ----------
+    job_id : str
+        The id of the job.
+
+    Returns
+    -------
+    dict
+        The status, the progress counters and the result of the job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    return job.to_dict()
+
+
+@router.delete(
+    "/jobs/{job_id}",
+    dependencies=[Depends(check_access_token)],
+    responses={404: {}},
+)
+async def cancel_job(job_id: str) -> dict:
+    """
+    This function cancels a background job. A running job stops at its
+    next step.
+
+    Parameters
+    ----------
+    job_id : str
+        The id of the job.
+
+    Returns
+    -------
+    dict
+        The status of the job.
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    return job.to_dict()
+
+
+@router.post(
+    "/daily-aggregates",
+    dependencies=[Depends(check_access_token)],
+    responses={500: {}},
+)
+async def rebuild_aggregates():
+    """
+    This function rebuilds the daily aggregates from the transactions
+    table. It is used to backfill the aggregates.
+
+    Returns
+    -------
+    str
+        A message indicating the status of the operation.
+    """
     try:
-        # Get the date to search
-        date_to_search = get_date_from_search(timeframe)
+        total_rows = await run_in_database(rebuild_daily_aggregates)
+        # The features of the anomaly model are computed from the aggregates
+        await run_in_database(rebuild_anomaly_features)
+        result_cache.invalidate()
+        return JSONResponse(
+            status_code=200,
+            content={
+                "message": "Operation completed successfully.",
+                "rows": total_rows,
+            },
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="The process failed.")
 
-        # Establish the connection
-        cursor = get_cursor()
 
-        for email in EMAILS_FROM_:
-            # Process the transactions
-            transactions = get_transactions(
-                email_from=email, date_to_search=date_to_search
-            )
-            if len(transactions) == 0:
-                return JSONResponse(
-                    status_code=204,
-                    content={"message": "No transactions found."},
-                )
+@router.post(
+    "/anomaly-features",
+    dependencies=[Depends(check_access_token)],
+    responses={500: {}},
+)
+async def rebuild_features():
+    """
+    This function rebuilds the features of the anomaly model from the daily
+    aggregates. It is used to backfill the features.
 
-            for transaction in transactions:
-                insert_data_into_database(
-                    cursor,
-                    (
-                        transaction.transaction_type,
-                        transaction.amount,
-                        transaction.merchant,
-                        transaction.datetime.replace(tzinfo=None),
-                        transaction.paynment_method,
-                        transaction.email_log,
-                    ),
-                )
+    Returns
+    -------
+    str
+        A message indicating the status of the operation.
+    """
+    try:
+        total_rows = await run_in_database(rebuild_anomaly_features)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "message": "Operation completed successfully.",
+                "rows": total_rows,
+            },
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="The process failed.")
 
-        # Close the connection
-        cursor.close()
+
+@router.post(
+    "/columnar-store",
+    dependencies=[Depends(check_access_token)],
+    responses={500: {}},
+)
+async def rebuild_store():
+    """
+    This function rebuilds the columnar store from the transactions table.
+    It is used to backfill the store.
+
+    Returns
+    -------
+    str
+        A message indicating the status of the operation.
+    """
+    try:
+        total_rows = await run_in_database(rebuild_columnar_store)
+        result_cache.invalidate()
         return JSONResponse(
             status_code=200,
-            content={"message": "Operation completed successfully."},
+            content={
+                "message": "Operation completed successfully.",
+                "rows": total_rows,
+            },
         )
-    except Exception as e:
+    except Exception:
+        raise HTTPException(status_code=500, detail="The process failed.")
+
+
+@router.post(
+    "/merchants",
+    dependencies=[Depends(check_access_token)],
+    responses={500: {}},
+)
+async def rebuild_merchants_table():
+    """
+    This function creates the merchants of the transactions and sets the
+    ids of the merchants in the transactions and the labels. It is used to
+    backfill the ids.
+
+    Returns
+    -------
+    str
+        A message indicating the status of the operation.
+    """
+    try:
+        total_merchants = await run_in_database(rebuild_merchants)
+        result_cache.invalidate()
+        merchant_windows.invalidate()
+        transaction_outliers.invalidate()
+        return JSONResponse(
+            status_code=200,
+            content={
+                "message": "Operation completed successfully.",
+                "merchants": total_merchants,
+            },
+        )
+    except Exception:
         raise HTTPException(status_code=500, detail="The process failed.")
 
 
@@ -178,9 +833,6 @@ async def add_transaction(transaction: AddTransactionInfo) -> str:
         A message indicating the status of the connection.
     """
     try:
-        # Establish the connection
-        cursor = get_cursor()
-
         if transaction.transaction_type != "Compra":
             raise HTTPException(
                 status_code=501,
@@ -188,19 +840,7 @@ async def add_transaction(transaction: AddTransactionInfo) -> str:
             )
 
         # Insert the data into the database
-        insert_data_into_database(
-            cursor,
-            (
-                transaction.transaction_type,
-                transaction.amount,
-                transaction.merchant,
-                transaction.datetime.replace(tzinfo=None),
-                transaction.paynment_method,
-                transaction.email_log,
-            ),
-        )
-        # Close the connection
-        cursor.close()
+        await run_in_database(insert_transactions, [transaction])
         return JSONResponse(
             status_code=200,
             content={"message": "Operation completed successfully."},
@@ -213,7 +853,7 @@ async def add_transaction(transaction: AddTransactionInfo) -> str:
     "/unlabeled-transactions",
     dependencies=[Depends(check_access_token)],
 )
-async def are_there_transactions_without_label() -> bool:
+async def check_transactions_without_label() -> bool:
     """
     This function checks if there are transactions without labels.
 
@@ -224,29 +864,12 @@ async def are_there_transactions_without_label() -> bool:
         If true, there are transactions without labels.
     """
     try:
-        # Establish the connection
-        cursor = get_cursor()
-
-        # Obtain the rows
-        cursor.execute(
-            """
-            SELECT TOP 10 
-                    t.merchant,
-                    t.datetime,
-                    g.category
-            FROM [dbo].[transactions] AS t
-            LEFT JOIN [dbo].[categories_trx] AS g
-            ON (CAST(t.datetime AS DATETIME) = CAST(g.datetime AS DATETIME) 
-                AND CAST(t.merchant AS VARCHAR) = CAST(g.merchant AS VARCHAR))
-            WHERE transaction_type = 'Compra' AND g.category IS NULL
-            ORDER BY t.datetime DESC;
-            """
+        without_label = await run_in_database(
+            are_there_transactions_without_label
         )
-        rows = cursor.fetchall()
-        cursor.close()
 
         return JSONResponse(
-            status_code=200, content={"message": len(rows) > 0}
+            status_code=200, content={"message": without_label}
         )
     except Exception:
         raise HTTPException(status_code=500, detail="Connection failed.")
@@ -257,10 +880,17 @@ async def are_there_transactions_without_label() -> bool:
     dependencies=[Depends(check_access_token)],
 )
 async def get_transactions_with_labels(
-    start_date: datetime.date, end_date: datetime.date
+    start_date: datetime.date,
+    end_date: datetime.date,
+    request: Request,
 ) -> List[LabeledTransactionInfoFull]:
     """
-    This function gets the transactions with labels.
+    This function gets the transactions with labels. If the client already
+    has the transactions (If-None-Match header), a 304 response is
+    returned.
+
+    The rows of the database are serialised directly with orjson, without
+    validating them with the response model.
 
     Parameters
     ----------
@@ -274,54 +904,27 @@ async def get_transactions_with_labels(
     list
         A list with the transactions with labels.
     """
-    # Convert dates to format YYYY-MM-DD
-    start_date = start_date.strftime("%Y-%m-%d")
-    end_date = end_date.strftime("%Y-%m-%d")
+    # Check if the transactions changed since the last request
+    headers = {}
+    data_version = await run_in_database(
+        get_data_version,
+        datetime.datetime.combine(start_date, datetime.time()),
+        datetime.datetime.combine(end_date, datetime.time()),
+        include_labels=True,
+    )
+    if data_version is not None:
+        etag = compute_etag(
+            "labeled-transactions-full", start_date, end_date, data_version
+        )
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        headers["ETag"] = etag
 
     try:
-        # Establish the connection
-        cursor = get_cursor()
-
-        # Obtain the rows
-        cursor.execute(
-            f"""
-            SELECT 
-                    t.transaction_type,
-                    t.amount,
-                    t.merchant,
-                    t.datetime,
-                    t.payment_method,
-                    t.email_log_id,
-                    g.category,
-                    g.similarity
-            FROM [dbo].[transactions] AS t
-            LEFT JOIN [dbo].[categories_trx] AS g
-            ON (CAST(t.datetime AS DATETIME) = CAST(g.datetime AS DATETIME) 
-                AND CAST(t.merchant AS VARCHAR) = CAST(g.merchant AS VARCHAR))
-            WHERE CAST(t.datetime AS DATE) BETWEEN '{start_date}' AND '{end_date}'
-            ORDER BY t.datetime DESC;
-            """
+        rows = await run_in_database(
+            get_full_transaction_rows_with_labels, start_date, end_date
         )
-        rows = cursor.fetchall()
-        cursor.close()
-
-        # Get the transactions with the correct type
-        if len(rows) > 0:
-            transactions = [
-                LabeledTransactionInfoFull(
-                    transaction_type=str(transaction[0]),
-                    amount=transaction[1],
-                    merchant=str(transaction[2]),
-                    datetime=transaction[3],
-                    paynment_method=str(transaction[4]),
-                    email_log=transaction[5],
-                    category=str(transaction[6]),
-                )
-                for transaction in rows
-            ]
-        else:
-            transactions = []
-
-        return transactions
     except Exception:
         raise HTTPException(status_code=500, detail="Connection failed.")
+
+    return ORJSONResponse(content=rows, headers=headers)
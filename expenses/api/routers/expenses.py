@@ -1,24 +1,41 @@
 import datetime
-from typing import List, Literal
+from typing import Any, Dict, List, Literal, Optional
 
 import pytz
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 
 from expenses.api.schemas import (
+    DailyAggregate,
+    IntradayProfile,
     LabeledTransactionInfo,
+    ScoredTransactionInfo,
     SummaryADayLikeToday,
     SummaryTransactionInfo,
+    WeeklyExpenses,
 )
 from expenses.api.security import check_access_token
 from expenses.api.utils import (
+    ANOMALY_TRANSACTION_TYPES_,
+    compute_etag,
+    get_daily_aggregates,
+    get_data_version,
     get_date_from_search,
     get_summary_a_day_like_today,
+    get_summary_from_aggregates,
+    get_summary_from_database,
     get_transactions,
-    get_transactions_from_database,
+    get_transaction_rows_from_database,
     get_transactions_with_labels,
+    get_weekly_expenses,
+    intraday_profiles,
+    is_not_modified,
     process_transactions_api_expenses,
+    result_cache,
+    run_in_database,
+    transaction_outliers,
 )
-from expenses.processors.schemas import TransactionInfo
 
 router = APIRouter(prefix="/expenses")
 
@@ -28,31 +45,189 @@ EMAILS_FROM_ = [
     "alertasynotificaciones@bancolombia.com.co",
 ]
 
+# Fields of the outlier score added to each transaction
+OUTLIER_FIELDS_ = [
+    "merchant_zscore",
+    "merchant_history",
+    "category_zscore",
+    "category_history",
+]
 
-# Function to get the transactions from the database
-def get_gross_transactions(
-    timeframe: Literal["daily", "weekly", "partial_weekly", "monthly"]
-) -> List[TransactionInfo]:
+
+def add_outlier_scores(
+    transactions: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
     """
-    This function returns the full transactions of the current timeframe
+    This function adds the robust z-scores of each expense to the
+    transactions, against the history of its merchant and its category.
+    The scores are None for the other transactions, and for all of them if
+    the history cannot be read from the database.
+
+    Parameters
+    ----------
+    transactions : List[Dict[str, Any]]
+        The fields of the transactions.
 
     Returns
     -------
-    List[TransactionInfo]
-        The summary of the expenses of the day, week or month.
+    List[Dict[str, Any]]
+        The transactions with the fields of the scores.
     """
-    # Get the date to search
-    date_to_search = get_date_from_search(timeframe)
+    today = datetime.datetime.now().astimezone(
+        pytz.timezone("America/Bogota")
+    )
+    expenses = [
+        transaction
+        for transaction in transactions
+        if transaction["transaction_type"] in ANOMALY_TRANSACTION_TYPES_
+    ]
+    try:
+        scores = transaction_outliers.score_many(
+            [
+                (transaction["merchant"], transaction["amount"])
+                for transaction in expenses
+            ],
+            today.date(),
+        )
+    except Exception as e:
+        print(f"The transactions could not be scored: {e}")
+        expenses, scores = [], []
+
+    for transaction in transactions:
+        transaction.update(dict.fromkeys(OUTLIER_FIELDS_))
+    for transaction, score in zip(expenses, scores):
+        transaction.update({field: score[field] for field in OUTLIER_FIELDS_})
+
+    return transactions
+
+
+# Function to get the transactions from the emails
+def get_transactions_from_emails(
+    date_to_search: datetime.datetime,
+) -> List[Dict[str, Any]]:
+    """
+    This function returns the transactions of the emails from the date to
+    search, as dictionaries.
+
+    Parameters
+    ----------
+    date_to_search : datetime.datetime
+        The date to obtain the transactions from.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The fields of the transactions.
+    """
+    return [
+        transaction.dict()
+        for transaction in get_transactions(
+            email_from=EMAILS_FROM_[0], date_to_search=date_to_search
+        )
+        + get_transactions(
+            email_from=EMAILS_FROM_[1], date_to_search=date_to_search
+        )
+    ]
+
+
+# Function to get the transactions from the database
+async def get_gross_transactions(
+    date_to_search: datetime.datetime,
+) -> List[Dict[str, Any]]:
+    """
+    This function returns the full transactions from the date to search,
+    with the outlier score of the expenses. The transactions are returned
+    as dictionaries, so they are serialised directly. The emails are read
+    in the thread pool, so the pool of the database is not blocked by the
+    mail server.
+
+    Parameters
+    ----------
+    date_to_search : datetime.datetime
+        The date to obtain the transactions from.
 
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The fields of the transactions of the day, week or month.
+    """
     # Search in the database for the transactions
-    transactions_from_db = get_transactions_from_database(date_to_search)
+    transactions = await run_in_database(
+        get_transaction_rows_from_database, date_to_search
+    )
 
     # If there are not transactions in the database, search in the API
     # and process the transactions.
-    transactions = (
-        transactions_from_db
-        if len(transactions_from_db) > 0
-        else get_transactions(
+    if len(transactions) == 0:
+        transactions = await run_in_threadpool(
+            get_transactions_from_emails, date_to_search
+        )
+
+    return await run_in_database(add_outlier_scores, transactions)
+
+
+def get_scored_data_version(
+    date_from: datetime.datetime,
+) -> Optional[str]:
+    """
+    This function returns the version of the transactions of a window with
+    their outlier scores. The scores change when an expense of the history
+    or a label is added and each day, as the history moves, so they are
+    part of the version.
+
+    Parameters
+    ----------
+    date_from : datetime.datetime
+        The start date of the window.
+
+    Returns
+    -------
+    Optional[str]
+        The version of the data. None if there are no transactions in the
+        window or the version could not be obtained.
+    """
+    data_version = get_data_version(date_from)
+    if data_version is None:
+        return None
+
+    today = get_date_from_search("daily").date()
+    history_version = get_data_version(
+        datetime.datetime.combine(
+            transaction_outliers.get_window_start(today), datetime.time()
+        ),
+        include_labels=True,
+    )
+    return f"{data_version}|{history_version}|{today}"
+
+
+# Function to get the summary of the transactions
+def get_summary(
+    date_to_search: datetime.datetime,
+) -> SummaryTransactionInfo:
+    """
+    This function returns the summary of the expenses from the date to
+    search.
+
+    Parameters
+    ----------
+    date_to_search : datetime.datetime
+        The date to obtain the expenses from.
+
+    Returns
+    -------
+    SummaryTransactionInfo
+        The summary of the expenses.
+    """
+    # The summary is aggregated by the database, so only one row per
+    # transaction type is obtained.
+    aggregates = get_summary_from_database(date_to_search)
+    if len(aggregates) > 0:
+        return get_summary_from_aggregates(aggregates)
+
+    # If there are not transactions in the database, search in the API
+    # and aggregate the transactions.
+    return process_transactions_api_expenses(
+        get_transactions(
             email_from=EMAILS_FROM_[0], date_to_search=date_to_search
         )
         + get_transactions(
@@ -60,8 +235,6 @@ def get_gross_transactions(
         )
     )
 
-    return transactions
-
 
 # Create the endpoint to get the summary of the expenses of the day, week or
 # month
@@ -87,8 +260,12 @@ async def get_expenses(
     SummaryTransactionInfo
         The summary of the expenses of the day, week or month.
     """
-    return process_transactions_api_expenses(
-        get_gross_transactions(timeframe)
+    # Get the date to search
+    date_to_search = get_date_from_search(timeframe)
+
+    return await result_cache.get_or_compute_async(
+        ("summary", date_to_search.date()),
+        lambda: get_summary(date_to_search),
     )
 
 
@@ -97,38 +274,99 @@ async def get_expenses(
     response_model=SummaryADayLikeToday,
     dependencies=[Depends(check_access_token)],
 )
-async def get_expenses_a_day_like_today() -> SummaryADayLikeToday:
+async def get_expenses_a_day_like_today(
+    weeks: int = Query(default=8, ge=1)
+) -> SummaryADayLikeToday:
     """
     This function returns the summary of the expenses of a day like today.
 
+    Parameters
+    ----------
+    weeks : int
+        The number of weeks of the trailing median, by default 8.
+
     Returns
     -------
     SummaryADayLikeToday
         The summary of the expenses of a day like today.
     """
+    today = datetime.datetime.now().astimezone(
+        pytz.timezone("America/Bogota")
+    )
+
     # Return the summary
-    return SummaryADayLikeToday(
-        **get_summary_a_day_like_today(
-            datetime.datetime.now()
-            .astimezone(pytz.timezone("America/Bogota"))
-            .isoweekday()
-        )
+    return await result_cache.get_or_compute_async(
+        ("summary-historical-info", today.date(), weeks),
+        lambda: SummaryADayLikeToday(
+            **get_summary_a_day_like_today(
+                today.isoweekday(), weeks, today.date()
+            ),
+            hourly_profile=intraday_profiles.get(
+                today.isoweekday(), today.date()
+            ),
+        ),
+    )
+
+
+@router.get(
+    "/intraday-profile",
+    response_model=IntradayProfile,
+    dependencies=[Depends(check_access_token)],
+)
+async def get_intraday_profile(
+    weekday: Optional[int] = Query(default=None, ge=1, le=7)
+) -> IntradayProfile:
+    """
+    This function returns, for each hour, the median amount spent from the
+    start of the day to the end of the hour in the closed days of the
+    weekday. It is used to check if the spending of today is ahead or
+    behind the typical pace.
+
+    Parameters
+    ----------
+    weekday : Optional[int]
+        The weekday, from 1 (Monday) to 7 (Sunday). By default, the
+        weekday of today.
+
+    Returns
+    -------
+    IntradayProfile
+        The profile of the cumulative purchases by hour.
+    """
+    today = datetime.datetime.now().astimezone(
+        pytz.timezone("America/Bogota")
+    )
+    weekday = weekday or today.isoweekday()
+
+    profile = await run_in_database(
+        intraday_profiles.get, weekday, today.date()
+    )
+    return IntradayProfile(
+        weekday=weekday,
+        days=intraday_profiles.count_days(weekday),
+        profile=profile,
     )
 
 
 # Create the endpoint to get all the transactions of the current day
 @router.get(
     "/full-transactions",
-    response_model=List[TransactionInfo],
+    response_model=List[ScoredTransactionInfo],
     dependencies=[Depends(check_access_token)],
 )
 async def get_full_transactions(
     timeframe: Literal[
         "daily", "weekly", "partial_weekly", "monthly", "from_origin"
-    ]
-) -> List[TransactionInfo]:
+    ],
+    request: Request,
+) -> List[ScoredTransactionInfo]:
     """
-    This function returns the full transactions of the current day
+    This function returns the full transactions of the current day, with
+    the outlier score of each expense. If the client already has the
+    transactions (If-None-Match header), a 304 response is returned.
+
+    The rows of the database are serialised directly with orjson, without
+    validating them with the response model.
 
     Parameters
     ----------
@@ -137,10 +375,29 @@ async def get_full_transactions(
 
     Returns
     -------
-    List[TransactionInfo]
+    List[ScoredTransactionInfo]
         The summary of the expenses of the day, week or month.
     """
-    return get_gross_transactions(timeframe=timeframe)
+    # Get the date to search
+    date_to_search = get_date_from_search(timeframe)
+
+    # Check if the transactions changed since the last request
+    headers = {}
+    data_version = await run_in_database(
+        get_scored_data_version, date_to_search
+    )
+    if data_version is not None:
+        etag = compute_etag(
+            "full-transactions", date_to_search.date(), data_version
+        )
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        headers["ETag"] = etag
+
+    return ORJSONResponse(
+        content=await get_gross_transactions(date_to_search),
+        headers=headers,
+    )
 
 
 # Create the endpoint to get the transactions with the labels
@@ -152,10 +409,14 @@ async def get_full_transactions(
 async def obtain_transactions_with_labels(
     timeframe: Literal[
         "daily", "weekly", "partial_weekly", "monthly", "from_origin"
-    ]
+    ],
+    request: Request,
+    response: Response,
 ) -> List[LabeledTransactionInfo]:
     """
-    This function returns the transactions with the labels
+    This function returns the transactions with the labels. If the client
+    already has the transactions (If-None-Match header), a 304 response is
+    returned.
 
     Parameters
     ----------
@@ -170,8 +431,93 @@ async def obtain_transactions_with_labels(
     # Get the date to search
     date_to_search = get_date_from_search(timeframe)
 
-    # Get the transactions
-    transactions = get_transactions_with_labels(date_from=date_to_search)
+    # Check if the transactions changed since the last request
+    data_version = await run_in_database(
+        get_data_version, date_to_search, include_labels=True
+    )
+    if data_version is not None:
+        etag = compute_etag(
+            "labeled-transactions", date_to_search.date(), data_version
+        )
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+    # Get the transactions. The labels are written by the labels API,
+    # which does not invalidate the cache, so the version of the data is
+    # part of the key.
+    transactions = await result_cache.get_or_compute_async(
+        ("labeled-transactions", date_to_search.date(), data_version),
+        lambda: get_transactions_with_labels(date_from=date_to_search),
+    )
 
     # Return the transactions
     return transactions
+
+
+# Create the endpoint to get the daily aggregates of the transactions
+@router.get(
+    "/daily-aggregates",
+    response_model=List[DailyAggregate],
+    dependencies=[Depends(check_access_token)],
+)
+async def obtain_daily_aggregates(
+    timeframe: Literal[
+        "daily", "weekly", "partial_weekly", "monthly", "from_origin"
+    ]
+) -> List[DailyAggregate]:
+    """
+    This function returns the daily aggregates of the transactions by
+    transaction type.
+
+    Parameters
+    ----------
+    timeframe : Literal["daily", "weekly", "partial_weekly", "monthly", "from_origin"]
+        The timeframe to obtain the aggregates from.
+
+    Returns
+    -------
+    List[DailyAggregate]
+        The aggregates of each day and transaction type.
+    """
+    return await run_in_database(
+        get_daily_aggregates, get_date_from_search(timeframe)
+    )
+
+
+# Create the endpoint to get the expenses of each week
+@router.get(
+    "/weekly-expenses",
+    response_model=List[WeeklyExpenses],
+    dependencies=[Depends(check_access_token)],
+)
+async def obtain_weekly_expenses(
+    timeframe: Literal[
+        "daily", "weekly", "partial_weekly", "monthly", "from_origin"
+    ]
+) -> List[WeeklyExpenses]:
+    """
+    This function returns the expenses of each week from the start of the
+    day of the timeframe. It is computed from the columnar store, if it is
+    configured.
+
+    Parameters
+    ----------
+    timeframe : Literal["daily", "weekly", "partial_weekly", "monthly", "from_origin"]
+        The timeframe to obtain the expenses from.
+
+    Returns
+    -------
+    List[WeeklyExpenses]
+        The expenses of each week.
+    """
+    # The expenses are cached by day, so they are searched from the start
+    # of the day
+    date_to_search = datetime.datetime.combine(
+        get_date_from_search(timeframe).date(), datetime.time()
+    )
+
+    return await result_cache.get_or_compute_async(
+        ("weekly-expenses", date_to_search.date()),
+        lambda: get_weekly_expenses(date_to_search),
+    )
@@ -1,14 +1,79 @@
-from typing import List, Literal
+import datetime
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends
+import pytz
+from fastapi import APIRouter, Depends, Query
+from fastapi.exceptions import HTTPException
 
-from expenses.api.schemas import SummaryMerchant
+from expenses.api.schemas import SummaryMerchant, TopMerchant
 from expenses.api.security import check_access_token
-from expenses.api.utils import get_date_from_search, get_merchants_values
+from expenses.api.utils import (
+    get_date_from_search,
+    get_merchant_categories,
+    get_merchants_values,
+    merchant_windows,
+    result_cache,
+    run_in_database,
+)
+from expenses.api.utils.rolling import WINDOWS_
 
 router = APIRouter(prefix="/merchants")
 
 
+@router.get(
+    "/top",
+    response_model=List[TopMerchant],
+    dependencies=[Depends(check_access_token)],
+)
+async def get_top_merchants(
+    window: int = 30,
+    limit: int = Query(default=10, ge=1, le=100),
+    category: Optional[List[str]] = Query(default=None),
+) -> List[TopMerchant]:
+    """
+    This function returns the merchants with the largest purchases in the
+    last days, with the change from the previous period of the same size.
+
+    Parameters
+    ----------
+    window : int
+        The number of days of the window: 1, 7, 30 or 365, by default 30.
+    limit : int
+        The number of merchants to return, by default 10.
+    category : Optional[List[str]]
+        If given, only the merchants of these categories are returned.
+
+    Returns
+    -------
+    List[TopMerchant]
+        The merchants, sorted by the amount of the purchases.
+    """
+    # Check if the window is valid
+    if window not in WINDOWS_:
+        raise HTTPException(
+            status_code=400,
+            detail="The window must be 1, 7, 30 or 365 days",
+        )
+
+    today = datetime.datetime.now().astimezone(
+        pytz.timezone("America/Bogota")
+    )
+
+    # The labels are saved by another service, so they are cached
+    merchant_categories = await result_cache.get_or_compute_async(
+        ("merchant-categories",), get_merchant_categories
+    )
+
+    return await run_in_database(
+        merchant_windows.top,
+        today.date(),
+        window,
+        limit,
+        merchant_categories,
+        category,
+    )
+
+
 @router.get(
     "/{timeframe}",
     response_model=List[SummaryMerchant],
@@ -33,4 +98,7 @@ async def get_merchants(
     # Get the date to search
     date_to_search = get_date_from_search(timeframe)
 
-    return get_merchants_values(date_to_search)
+    return await result_cache.get_or_compute_async(
+        ("merchants", date_to_search.date()),
+        lambda: get_merchants_values(date_to_search),
+    )
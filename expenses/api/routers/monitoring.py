@@ -1,97 +1,503 @@
+import datetime
 import os
-import pickle
-import tempfile
-from typing import Literal
+from typing import TYPE_CHECKING, List, Literal, Tuple, Union
 
-import neptune
+import pytz
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import HTTPException
-from numpy import where
-from pandas import read_sql, to_datetime
-from sklearn.ensemble import IsolationForest
+from fastapi.responses import JSONResponse
 
-from expenses.api.schemas import AnomalyPredictionOutput
+from expenses.api.schemas import (
+    AnomalyBatchInput,
+    AnomalyDayPrediction,
+    AnomalyFeatures,
+    AnomalyPredictionOutput,
+    AnomalySweepInput,
+    TransactionOutlierScore,
+)
 from expenses.api.security import check_access_token
-from expenses.api.utils import get_cursor, get_model
+from expenses.api.utils import (
+    FEATURE_COLUMNS_,
+    get_anomaly_features,
+    get_model,
+    get_registry,
+    Job,
+    job_manager,
+    model_cache,
+    online_detector,
+    run_in_database,
+    SERVING_STAGE_,
+    transaction_outliers,
+)
+
+# numpy, pandas and sklearn are imported by the functions that use them,
+# so the API starts without them. The model is loaded in background when
+# the API starts.
+if TYPE_CHECKING:
+    import numpy as np
+    from pandas import DataFrame
+    from sklearn.ensemble import IsolationForest
 
 router = APIRouter(prefix="/monitoring")
 
+# Number of the most recent days held out to validate a model before it
+# is saved
+MODEL_HOLDOUT_DAYS_ = int(os.getenv("MODEL_HOLDOUT_DAYS", 30))
+
+# Maximum difference between the rate of anomalies of the held out days
+# and the contamination of a model to serve it, besides the sampling error
+MODEL_RATE_TOLERANCE_ = float(os.getenv("MODEL_RATE_TOLERANCE", 0.02))
+
+
+def validate_model(model: "IsolationForest", X: "DataFrame") -> float:
+    """
+    This function checks that a fitted model can be served. A copy of the
+    model is fitted without the last MODEL_HOLDOUT_DAYS_ days and it must
+    label those days as anomalies at the rate of its contamination, within
+    MODEL_RATE_TOLERANCE_ plus two standard errors of the rate. If the
+    contamination is "auto", the rate must be below 50%. The scores of
+    all the days must be finite. A ValueError is raised if the model is
+    not valid.
+
+    Parameters
+    ----------
+    model : IsolationForest
+        The fitted model.
+    X : DataFrame
+        The features used to fit the model, from the oldest to the newest
+        day.
+
+    Returns
+    -------
+    float
+        The rate of anomalies of the held out days.
+    """
+    import numpy as np
+    from sklearn.base import clone
+
+    if not np.all(np.isfinite(model.score_samples(X))):
+        raise ValueError("The scores of the model are not finite.")
+
+    # The threshold learned from the past must hold in the next days
+    if len(X) < 2 * MODEL_HOLDOUT_DAYS_:
+        raise ValueError(
+            f"There are not enough days ({len(X)}) to validate the model "
+            f"with {MODEL_HOLDOUT_DAYS_} days."
+        )
+    holdout_model = clone(model).fit(X.iloc[:-MODEL_HOLDOUT_DAYS_])
+    anomalies_ratio = float(
+        np.mean(holdout_model.predict(X.iloc[-MODEL_HOLDOUT_DAYS_:]) == -1)
+    )
+
+    if model.contamination == "auto":
+        if anomalies_ratio >= 0.5:
+            raise ValueError(
+                f"The model labels {anomalies_ratio:.0%} of the held out "
+                "days as anomalies."
+            )
+        return anomalies_ratio
+
+    contamination = model.contamination
+    tolerance = MODEL_RATE_TOLERANCE_ + 2 * np.sqrt(
+        contamination * (1 - contamination) / MODEL_HOLDOUT_DAYS_
+    )
+    if abs(anomalies_ratio - contamination) > tolerance:
+        raise ValueError(
+            f"The model labels {anomalies_ratio:.1%} of the held out days "
+            f"as anomalies, but its contamination is {contamination:.1%}."
+        )
+
+    return anomalies_ratio
+
+
+def register_model(
+    job: Job,
+    model: "IsolationForest",
+    X: "DataFrame",
+    metadata: dict,
+    promote: bool,
+) -> dict:
+    """
+    This function validates a fitted model and saves it in the registry in
+    the staging stage. If it is promoted, it is moved to the serving stage
+    and replaced in the cache, so the next predictions use it.
+
+    Parameters
+    ----------
+    job : Job
+        The job executed.
+    model : IsolationForest
+        The fitted model.
+    X : DataFrame
+        The features used to fit the model, from the oldest to the newest
+        day.
+    metadata : dict
+        The metadata saved with the version, with the rate of anomalies of
+        the held out days.
+    promote : bool
+        If True, the model is served after it is validated.
+
+    Returns
+    -------
+    dict
+        The version of the model and if it is served.
+    """
+    from expenses.api.utils.forest import CompactForest
+
+    holdout_rate = validate_model(model, X)
+    job.report("validated")
 
-@router.post("/model", dependencies=[Depends(check_access_token)])
-def retrain_anomaly_model(
-    max_samples: int, contamination: float, bootstrap: bool
-) -> str:
-    """
-    This function retrains the anomaly model with the current data
-    and save the model as a pkl file
-    """
-    conn, _ = get_cursor(return_conn=True)
-
-    # Get the data from the database
-    query = """
-        SELECT
-            CAST(datetime AS DATE) AS date_,
-            (-1) * AVG(CAST(amount AS float)) AS avg_amount,
-            (-1) * MIN(CAST(amount AS float)) AS max_amount,
-            COUNT(DISTINCT id) AS total_trx
-        FROM [dbo].[transactions]
-        WHERE transaction_type = 'Compra' or
-              transaction_type = 'QR' or
-              transaction_type = 'Transferencia'
-        GROUP BY CAST(datetime AS DATE)
-        ORDER BY CAST(datetime AS DATE) DESC;
-        """
-    df = read_sql(query, conn)
-
-    # Make modifications to the data
-    df["date_"] = to_datetime(df["date_"])
-    df["weekend"] = where(df["date_"].dt.dayofweek < 5, 0, 1)
-
-    # Create the dataset
-    X = df[["avg_amount", "max_amount", "total_trx", "weekend"]]
-
-    # Initialize Neptune run to log the model
-    run = neptune.init_run(
-        project="carlos.osorio/expenses-anomaly",
-        api_token=os.environ["NEPTUNE_API_TOKEN"] + "==",
+    registry = get_registry()
+    version = registry.register(
+        model,
+        stage="staging",
+        metadata={**metadata, "holdout_anomaly_rate": holdout_rate},
     )
+    job.report("registered")
+
+    if promote:
+        registry.promote(version, SERVING_STAGE_)
+        model_cache.swap(CompactForest.from_isolation_forest(model), version)
+    else:
+        # The new version is served if there is no version in the serving
+        # stage, so it is checked in the next request
+        model_cache.invalidate()
+
+    return {"version": version, "served": promote}
+
+
+def retrain_job(job: Job, params: dict, promote: bool) -> dict:
+    """
+    This function is the background job to retrain the anomaly model. The
+    model is fitted, validated and saved in the registry.
+
+    Parameters
+    ----------
+    job : Job
+        The job executed.
+    params : dict
+        The parameters of the Isolation Forest model.
+    promote : bool
+        If True, the model is served after it is validated.
+
+    Returns
+    -------
+    dict
+        The version of the model and if it is served.
+    """
+    from sklearn.ensemble import IsolationForest
+
+    # Get the data from the database, from the oldest to the newest day
+    X = get_anomaly_features().sort_values("date_")[FEATURE_COLUMNS_]
+    job.report("samples", X.shape[0])
 
     # Fit the Isolation Forest model
+    model = IsolationForest(**params)
+    model.fit(X)
+    job.report("fitted")
+
+    return register_model(
+        job,
+        model,
+        X,
+        {"parameters": params, "number_of_samples": X.shape[0]},
+        promote,
+    )
+
+
+def sweep_job(job: Job, sweep: AnomalySweepInput) -> dict:
+    """
+    This function is the background job to search the parameters of the
+    anomaly model. The contamination is the expected rate of anomalies and
+    the other parameters are evaluated in parallel with a time series
+    validation on the daily features. The most stable configuration is
+    fitted with all the days and saved in the registry.
+
+    Parameters
+    ----------
+    job : Job
+        The job executed.
+    sweep : AnomalySweepInput
+        The values of the parameters, the search and the validation.
+
+    Returns
+    -------
+    dict
+        The version of the best model, if it is served and the results of
+        all the configurations, with their fit time.
+    """
+    from sklearn.ensemble import IsolationForest
+
+    from expenses.api.utils.sweep import get_configurations, run_sweep
+
+    # The days are sorted from the oldest to the newest for the validation
+    df = get_anomaly_features().sort_values("date_")
+    X = df[FEATURE_COLUMNS_]
+    job.report("samples", X.shape[0])
+
+    configurations = get_configurations(
+        {
+            "max_samples": sweep.max_samples,
+            "bootstrap": sweep.bootstrap,
+            "n_estimators": sweep.n_estimators,
+        },
+        search=sweep.search,
+        n_iter=sweep.n_iter,
+        random_state=sweep.random_state,
+    )
+    job.report("configurations_total", len(configurations))
+
+    # Each result reports the progress, so a cancelled job stops the
+    # pending configurations.
+    results = run_sweep(
+        configurations,
+        X.to_numpy(dtype=float),
+        n_splits=sweep.n_splits,
+        contamination=sweep.target_rate,
+        n_jobs=sweep.n_jobs,
+        on_result=lambda result: job.report("configurations"),
+        random_state=sweep.random_state,
+    )
+
+    # The best configuration is fitted again with all the days
+    best = results[0]
+    model = IsolationForest(
+        **best["params"], random_state=sweep.random_state
+    )
+    model.fit(X)
+    job.report("fitted")
+
+    registered = register_model(
+        job,
+        model,
+        X,
+        {
+            "parameters": best["params"],
+            "number_of_samples": X.shape[0],
+            "agreement": best["agreement"],
+        },
+        sweep.promote,
+    )
+
+    return {**registered, "best": best, "results": results}
+
+
+@router.post(
+    "/model", dependencies=[Depends(check_access_token)], responses={202: {}}
+)
+async def retrain_anomaly_model(
+    max_samples: int,
+    contamination: float,
+    bootstrap: bool,
+    promote: bool = True,
+):
+    """
+    This function enqueues a job to retrain the anomaly model with the
+    current data. The progress of the job is returned by
+    /monitoring/model/jobs/{job_id}.
+
+    Parameters
+    ----------
+    max_samples : int
+        The number of samples to fit each tree.
+    contamination : float
+        The proportion of anomalies in the data.
+    bootstrap : bool
+        If the samples are drawn with replacement.
+    promote : bool
+        If True, the model is served once it is validated, by default True.
+
+    Returns
+    -------
+    str
+        The id of the job.
+    """
     params = {
         "max_samples": max_samples,
         "contamination": contamination,
         "bootstrap": bootstrap,
     }
-    model = IsolationForest(**params)
-    model.fit(X)
+    job = job_manager.submit(
+        "retrain_anomaly_model", retrain_job, params, promote
+    )
 
-    # Save the model to a temporary file
-    with tempfile.NamedTemporaryFile(
-        suffix=".pkl", delete=False
-    ) as temp_file:
-        pickle.dump(model, temp_file)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Operation enqueued.",
+            "job_id": job.id,
+            "status_url": f"/monitoring/model/jobs/{job.id}",
+        },
+    )
 
-        # Log the model
-        run["parameters"] = params
-        run["number_of_samples"] = X.shape[0]
 
-        model = neptune.init_model_version(
-            model="EX-ANOMODEL",
-            project="carlos.osorio/expenses-anomaly",
-            api_token=os.environ["NEPTUNE_API_TOKEN"] + "==",
-        )
-        model["model"].upload(temp_file.name)
-        model.change_stage("staging")
+@router.post(
+    "/model/sweep",
+    dependencies=[Depends(check_access_token)],
+    responses={202: {}},
+)
+async def sweep_anomaly_model(sweep: AnomalySweepInput):
+    """
+    This function enqueues a job to search the parameters of the anomaly
+    model with a grid or a random search. The progress of the job and the
+    results of the configurations are returned by
+    /monitoring/model/jobs/{job_id}.
+
+    Parameters
+    ----------
+    sweep : AnomalySweepInput
+        The values of the parameters, the search and the validation.
 
-    run.stop()
-    return "Model retrained successfully"
+    Returns
+    -------
+    str
+        The id of the job.
+    """
+    job = job_manager.submit("sweep_anomaly_model", sweep_job, sweep)
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Operation enqueued.",
+            "job_id": job.id,
+            "status_url": f"/monitoring/model/jobs/{job.id}",
+        },
+    )
+
+
+@router.get(
+    "/model/jobs/{job_id}",
+    dependencies=[Depends(check_access_token)],
+    responses={404: {}},
+)
+async def get_retrain_status(job_id: str) -> dict:
+    """
+    This function returns the status and the progress of a retraining job.
+
+    Parameters
+    ----------
+    job_id : str
+        The id of the job.
+
+    Returns
+    -------
+    dict
+        The status, the progress counters and the result of the job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    return job.to_dict()
+
+
+@router.get("/model/versions", dependencies=[Depends(check_access_token)])
+async def get_model_versions() -> List[dict]:
+    """
+    This function returns the versions of the anomaly model in the
+    registry.
+
+    Returns
+    -------
+    List[dict]
+        The id, the stage and the creation time of each version.
+    """
+    try:
+        return await run_in_threadpool(get_registry().list_versions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/model/versions/{version}/stage",
+    dependencies=[Depends(check_access_token)],
+    responses={404: {}},
+)
+async def promote_model_version(
+    version: str, stage: Literal["staging", "production", "archived"]
+) -> dict:
+    """
+    This function moves a version of the anomaly model to the stage. The
+    previous version of the stage is archived, and the version used to
+    predict is checked again in the next prediction.
+
+    Parameters
+    ----------
+    version : str
+        The id of the version.
+    stage : Literal["staging", "production", "archived"]
+        The new stage of the version.
+
+    Returns
+    -------
+    dict
+        The version and its stage.
+    """
+    try:
+        await run_in_threadpool(get_registry().promote, version, stage)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Version not found.")
+
+    model_cache.invalidate()
+    return {"version": version, "stage": stage}
+
+
+def score_features(
+    data: Union[List[List[float]], "np.ndarray"]
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    This function scores the rows of features with the model of the cache
+    in a single call.
+
+    Parameters
+    ----------
+    data : Union[List[List[float]], np.ndarray]
+        The features to predict, one row per day.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The score and the prediction of each row: -1 for an anomaly and 1
+        for a normal day.
+    """
+    import numpy as np
+
+    # The model is loaded the first time and when there is a new version
+    model = get_model()
+
+    # The prediction is computed from the score, as IsolationForest.predict
+    # does, so the trees are evaluated only once.
+    scores = model.score_samples(data)
+
+    return scores, np.where(scores < model.offset_, -1, 1)
+
+
+def predict_with_model(data: List[List[float]]) -> Tuple[float, int]:
+    """
+    This function predicts if the data is an anomaly with the model of the
+    cache.
+
+    Parameters
+    ----------
+    data : List[List[float]]
+        The features to predict.
+
+    Returns
+    -------
+    Tuple[float, int]
+        The score and the prediction.
+    """
+    scores, predictions = score_features(data)
+
+    return scores[0], predictions[0]
 
 
 @router.get(
     "/prediction",
     dependencies=[Depends(check_access_token)],
 )
-def predict_anomaly(
+async def predict_anomaly(
     avg_amount: float,
     max_amount: float,
     total_trx: int,
@@ -110,27 +516,171 @@ def predict_anomaly(
     Tuple[float, int]
         The score and the prediction.
     """
-    # This is made here to avoid loading the model at the start of the
-    # application. This is efficient since, altough the model is loaded
-    # every time the endpoint is called, the endpoint is called less
-    # frequently than the application is started.
-    model = get_model()
-
     # Data to predict
     data = [
         [avg_amount, max_amount, total_trx, 1 if weekend == "yes" else 0]
     ]
 
     try:
-        # Predict the anomaly
-        prediction = model.predict(data)
-
-        # Get the score
-        score = model.score_samples(data)
+        # Predict the anomaly and get the score
+        score, prediction = await run_in_threadpool(predict_with_model, data)
 
         return AnomalyPredictionOutput(
-            score=score[0],
-            prediction="anomaly" if prediction[0] == -1 else "normal",
+            score=score,
+            prediction="anomaly" if prediction == -1 else "normal",
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/batch-prediction",
+    dependencies=[Depends(check_access_token)],
+    responses={400: {}},
+)
+async def predict_anomalies(
+    batch: AnomalyBatchInput,
+) -> List[AnomalyDayPrediction]:
+    """
+    This function predicts if each day is an anomaly or not. The features
+    are the rows given or, if there are no rows, the features of the days
+    between the dates, computed from the daily aggregates. All the days
+    are scored in a single call to the model.
+
+    Parameters
+    ----------
+    batch : AnomalyBatchInput
+        The rows of features or the range of dates.
+
+    Returns
+    -------
+    List[AnomalyDayPrediction]
+        The features, the score and the prediction of each day.
+    """
+    if batch.rows is not None:
+        rows = batch.rows
+    elif batch.date_from is not None or batch.date_to is not None:
+        df = await run_in_database(
+            get_anomaly_features, batch.date_from, batch.date_to
+        )
+        rows = [
+            AnomalyFeatures(
+                date=row.date_.date(),
+                avg_amount=row.avg_amount,
+                max_amount=row.max_amount,
+                total_trx=row.total_trx,
+                weekend="yes" if row.weekend == 1 else "no",
+            )
+            for row in df.itertuples()
+        ]
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="The rows or the range of dates must be given.",
         )
+
+    if len(rows) == 0:
+        return []
+
+    import numpy as np
+
+    # Matrix of features, in the order of the training
+    X = np.array(
+        [
+            [
+                row.avg_amount,
+                row.max_amount,
+                row.total_trx,
+                1 if row.weekend == "yes" else 0,
+            ]
+            for row in rows
+        ],
+        dtype=float,
+    )
+
+    try:
+        scores, predictions = await run_in_threadpool(score_features, X)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    return [
+        AnomalyDayPrediction(
+            **row.dict(),
+            score=score,
+            prediction="anomaly" if prediction == -1 else "normal",
+        )
+        for row, score, prediction in zip(rows, scores, predictions)
+    ]
+
+
+@router.get("/online/days", dependencies=[Depends(check_access_token)])
+async def get_online_days() -> List[dict]:
+    """
+    This function returns the features of the recent days, updated with
+    each transaction inserted, and their last score.
+
+    Returns
+    -------
+    List[dict]
+        The date, the features, the score and the prediction of each day.
+    """
+    return online_detector.get_days()
+
+
+@router.get("/online/events", dependencies=[Depends(check_access_token)])
+async def get_online_events(after_id: int = 0) -> List[dict]:
+    """
+    This function returns the events emitted when the score of a day
+    crossed the threshold of the model, so the clients poll the new events
+    with the id of the last event received.
+
+    Parameters
+    ----------
+    after_id : int
+        Only the events with a greater id are returned, by default 0.
+
+    Returns
+    -------
+    List[dict]
+        The id, the date, the time of the detection, the score and the
+        features of each event.
+    """
+    return online_detector.get_events(after_id)
+
+
+@router.get(
+    "/transaction-score", dependencies=[Depends(check_access_token)]
+)
+async def score_transaction(
+    merchant: str, amount: float
+) -> TransactionOutlierScore:
+    """
+    This function returns the robust z-scores of an expense against the
+    recent expenses of its merchant and of its category, so an unusual
+    purchase is found even if its day is normal.
+
+    Parameters
+    ----------
+    merchant : str
+        The merchant of the expense.
+    amount : float
+        The amount of the expense.
+
+    Returns
+    -------
+    TransactionOutlierScore
+        The category of the merchant, the z-scores and the size of the
+        histories.
+    """
+    today = datetime.datetime.now().astimezone(
+        pytz.timezone("America/Bogota")
+    )
+
+    try:
+        score = await run_in_database(
+            transaction_outliers.score, merchant, amount, today.date()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return TransactionOutlierScore(**score)
@@ -1,13 +1,23 @@
 from .expenses import (
     AddTransactionInfo,
+    AnomalyBatchInput,
+    AnomalyDayPrediction,
+    AnomalyFeatures,
     AnomalyPredictionOutput,
+    AnomalySweepInput,
     BaseTransactionInfo,
+    DailyAggregate,
+    HourlyCumulativeAmount,
+    IntradayProfile,
     LabeledTransactionInfo,
+    ScoredTransactionInfo,
     SummaryADayLikeToday,
     SummaryTransactionInfo,
     LabeledTransactionInfoFull,
+    TransactionOutlierScore,
+    WeeklyExpenses,
 )
-from .merchants import SummaryMerchant
+from .merchants import SummaryMerchant, TopMerchant
 
 __all__ = [
     "SummaryMerchant",
@@ -18,4 +28,15 @@ __all__ = [
     "AnomalyPredictionOutput",
     "LabeledTransactionInfo",
     "LabeledTransactionInfoFull",
+    "DailyAggregate",
+    "WeeklyExpenses",
+    "HourlyCumulativeAmount",
+    "IntradayProfile",
+    "TopMerchant",
+    "AnomalyFeatures",
+    "AnomalyBatchInput",
+    "AnomalyDayPrediction",
+    "ScoredTransactionInfo",
+    "TransactionOutlierScore",
+    "AnomalySweepInput",
 ]
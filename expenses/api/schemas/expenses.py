@@ -1,7 +1,7 @@
 import datetime
-from typing import Union
+from typing import List, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, confloat, conint, conlist
 
 from expenses.processors.schemas import TransactionInfo
 
@@ -42,6 +42,56 @@ class AddTransactionInfo(TransactionInfo):
     email_log: str = ""
 
 
+class TransactionOutlierScore(BaseModel):
+    """
+    This class represents the robust z-scores of the amount of a
+    transaction against the history of its merchant and of its category.
+    A z-score is None if the history is too short.
+    """
+
+    category: Optional[str]
+    merchant_zscore: Optional[float]
+    merchant_history: int
+    category_zscore: Optional[float]
+    category_history: int
+
+
+class ScoredTransactionInfo(TransactionInfo):
+    """
+    This class represents a transaction with the robust z-scores of its
+    amount against the history of its merchant and of its category. Only
+    the expenses are scored. The scores are flat fields, so each row is a
+    row of a table.
+    This inherits from TransactionInfo.
+    """
+
+    merchant_zscore: Optional[float] = None
+    merchant_history: Optional[int] = None
+    category_zscore: Optional[float] = None
+    category_history: Optional[int] = None
+
+
+class HourlyCumulativeAmount(BaseModel):
+    """
+    This class represents the median amount spent up to the end of an hour
+    of the day.
+    """
+
+    hour: int
+    median_cumulative_amount: float
+
+
+class IntradayProfile(BaseModel):
+    """
+    This class represents the profile of the cumulative purchases by hour
+    of a weekday.
+    """
+
+    weekday: int
+    days: int
+    profile: List[HourlyCumulativeAmount]
+
+
 class SummaryADayLikeToday(BaseModel):
     """
     This class represents the summary of all the transactions of a day like
@@ -50,6 +100,34 @@ class SummaryADayLikeToday(BaseModel):
 
     mean_number_of_purchases: Union[float, None]
     median_amount_of_purchases: Union[float, None]
+    p10_amount_of_purchases: Union[float, None] = None
+    p90_amount_of_purchases: Union[float, None] = None
+    trailing_median_amount_of_purchases: Union[float, None] = None
+    hourly_profile: List[HourlyCumulativeAmount] = []
+
+
+class DailyAggregate(BaseModel):
+    """
+    This class represents the aggregated values of the transactions of a
+    day for a transaction type.
+    """
+
+    date: datetime.date
+    transaction_type: str
+    amount_sum: float
+    total_count: int
+    amount_min: float
+    amount_max: float
+    amount_avg: float
+
+
+class WeeklyExpenses(BaseModel):
+    """
+    This class represents the expenses of a week.
+    """
+
+    week: str
+    amount: float
 
 
 class AnomalyPredictionOutput(BaseModel):
@@ -61,6 +139,59 @@ class AnomalyPredictionOutput(BaseModel):
     prediction: str
 
 
+class AnomalyFeatures(BaseModel):
+    """
+    This class represents the features of a day for the anomaly model.
+    """
+
+    date: Optional[datetime.date] = None
+    avg_amount: float
+    max_amount: float
+    total_trx: int
+    weekend: Literal["yes", "no"]
+
+
+class AnomalySweepInput(BaseModel):
+    """
+    This class represents the search of the parameters of the anomaly
+    model: the values of each parameter, the search and the validation.
+    Each parameter needs at least one value. The contamination of all the
+    configurations is the expected rate of anomalies.
+    """
+
+    max_samples: conlist(conint(ge=1), min_items=1) = [64, 128, 256]
+    bootstrap: conlist(bool, min_items=1) = [False, True]
+    n_estimators: conlist(conint(ge=1), min_items=1) = [100]
+    search: Literal["grid", "random"] = "grid"
+    n_iter: conint(ge=1) = 10
+    n_splits: conint(ge=2) = 3
+    target_rate: confloat(gt=0, le=0.5) = 0.05
+    n_jobs: Optional[int] = None
+    random_state: Optional[int] = None
+    promote: bool = True
+
+
+class AnomalyBatchInput(BaseModel):
+    """
+    This class represents the input of the batch anomaly prediction: the
+    features of the days, or the dates to obtain them from the daily
+    aggregates.
+    """
+
+    date_from: Optional[datetime.date] = None
+    date_to: Optional[datetime.date] = None
+    rows: Optional[List[AnomalyFeatures]] = None
+
+
+class AnomalyDayPrediction(AnomalyFeatures):
+    """
+    This class represents the anomaly prediction of a day.
+    """
+
+    score: float
+    prediction: str
+
+
 # Model for the labeled transaction
 class LabeledTransactionInfo(BaseModel):
     """
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -9,3 +11,19 @@ class SummaryMerchant(BaseModel):
     merchant: str | None
     amount: float | None
     count: int | None
+
+
+class TopMerchant(BaseModel):
+    """
+    This class is the schema for the merchants with the largest purchases
+    in a window, compared with the previous period.
+    """
+
+    merchant: str
+    category: Optional[str]
+    amount: float
+    count: int
+    previous_amount: float
+    previous_count: int
+    amount_delta: float
+    amount_delta_pct: Optional[float]
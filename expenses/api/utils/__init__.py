@@ -1,14 +1,62 @@
-from expenses.api.utils.anomaly import get_model
+from expenses.api.utils.anomaly import (
+    SERVING_STAGE_,
+    get_model,
+    model_cache,
+)
+from expenses.api.utils.backends import get_backend
+from expenses.api.utils.cache import result_cache
+from expenses.api.utils.columnar import (
+    append_to_columnar_store,
+    get_weekly_expenses,
+    rebuild_columnar_store,
+    scan_transactions,
+)
+from expenses.api.utils.concurrency import run_in_database
 from expenses.api.utils.database import (
+    are_there_transactions_without_label,
+    check_connection,
+    get_backfill_checkpoint,
     get_cursor,
-    get_merchants_values,
+    get_daily_aggregates,
+    get_data_version,
+    get_full_transaction_rows_with_labels,
+    get_full_transactions_with_labels,
+    get_hourly_amounts,
     get_query_to_insert_values,
+    get_query_to_update_daily_aggregates,
     get_summary_a_day_like_today,
+    get_summary_from_database,
+    get_transaction_rows_from_database,
     get_transactions_from_database,
     get_transactions_with_labels,
+    rebuild_daily_aggregates,
+    save_backfill_checkpoint,
 )
 from expenses.api.utils.dates import get_date_from_search
+from expenses.api.utils.etag import compute_etag, is_not_modified
+from expenses.api.utils.features import (
+    ANOMALY_TRANSACTION_TYPES_,
+    FEATURE_COLUMNS_,
+    get_anomaly_features,
+    rebuild_anomaly_features,
+    update_anomaly_features,
+)
+from expenses.api.utils.ingestion import IngestionBuffer
+from expenses.api.utils.jobs import Job, JobCancelled, job_manager
+from expenses.api.utils.merchants import (
+    canonicalize_merchant,
+    get_merchant_categories,
+    get_merchants_values,
+    merchant_dictionary,
+    rebuild_merchants,
+)
+from expenses.api.utils.online import online_detector
+from expenses.api.utils.outliers import transaction_outliers
+from expenses.api.utils.profiles import intraday_profiles
+from expenses.api.utils.registry import get_registry
+from expenses.api.utils.rolling import merchant_windows
 from expenses.api.utils.transactions import (
+    get_summary_from_aggregates,
     get_transactions,
     process_transactions_api_expenses,
 )
@@ -24,4 +72,47 @@ __all__ = [
     "get_summary_a_day_like_today",
     "get_model",
     "get_transactions_with_labels",
+    "get_summary_from_database",
+    "get_summary_from_aggregates",
+    "get_daily_aggregates",
+    "get_query_to_update_daily_aggregates",
+    "rebuild_daily_aggregates",
+    "result_cache",
+    "get_data_version",
+    "compute_etag",
+    "is_not_modified",
+    "run_in_database",
+    "check_connection",
+    "are_there_transactions_without_label",
+    "get_full_transactions_with_labels",
+    "get_anomaly_features",
+    "get_backend",
+    "append_to_columnar_store",
+    "rebuild_columnar_store",
+    "scan_transactions",
+    "get_weekly_expenses",
+    "get_hourly_amounts",
+    "intraday_profiles",
+    "canonicalize_merchant",
+    "merchant_dictionary",
+    "rebuild_merchants",
+    "get_merchant_categories",
+    "merchant_windows",
+    "Job",
+    "JobCancelled",
+    "job_manager",
+    "get_backfill_checkpoint",
+    "save_backfill_checkpoint",
+    "IngestionBuffer",
+    "get_transaction_rows_from_database",
+    "get_full_transaction_rows_with_labels",
+    "model_cache",
+    "SERVING_STAGE_",
+    "get_registry",
+    "ANOMALY_TRANSACTION_TYPES_",
+    "FEATURE_COLUMNS_",
+    "rebuild_anomaly_features",
+    "update_anomaly_features",
+    "online_detector",
+    "transaction_outliers",
 ]
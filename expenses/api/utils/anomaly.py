@@ -1,45 +1,173 @@
 import os
-import pickle
+import threading
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
 
-import neptune
-from sklearn.ensemble import IsolationForest
+from expenses.api.utils.registry import get_registry
 
+if TYPE_CHECKING:
+    from expenses.api.utils.forest import CompactForest
 
-def get_model() -> IsolationForest:
+# Stage of the version used to predict
+SERVING_STAGE_ = os.getenv("MODEL_STAGE", "production")
+
+
+def get_serving_version() -> Optional[str]:
+    """
+    This function returns the version of the model used to predict: the
+    newest version in the serving stage or, if there is none, the newest
+    version.
+
+    Returns
+    -------
+    Optional[str]
+        The id of the version, or None if there are no versions.
+    """
+    versions = get_registry().list_versions()
+    for version in versions:
+        if version["stage"] == SERVING_STAGE_:
+            return version["id"]
+
+    return versions[0]["id"] if len(versions) > 0 else None
+
+
+class ModelCache:
+    """
+    This class keeps the anomaly model in memory. The serving version is
+    checked in the registry at most once per check interval, and the model
+    is loaded again only if the version changed. While a thread checks the
+    version, the other threads keep using the loaded model.
+
+    If there is no model loaded and it cannot be loaded, the error is kept
+    until the next check and raised without calling the registry, so the
+    callers of each insertion do not query it while there is no model.
+
+    Parameters
+    ----------
+    check_interval : float
+        The minimum time between the checks of the version, in seconds.
+    """
+
+    def __init__(self, check_interval: float = 300):
+        self._check_interval = check_interval
+        # The model and its version are replaced together
+        self._loaded: Optional[Tuple["CompactForest", str]] = None
+        self._error: Optional[Exception] = None
+        self._next_check = 0.0
+        self._load_lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """
+        This function loads the serving version if it is not the loaded one.
+        If the check fails, the loaded model is kept until the next check.
+        """
+        try:
+            latest_version = get_serving_version()
+            if latest_version is None and self._loaded is None:
+                raise RuntimeError("There is no version of the anomaly model.")
+            if latest_version is not None and (
+                self._loaded is None or latest_version != self._loaded[1]
+            ):
+                self._loaded = (
+                    get_registry().load(latest_version),
+                    latest_version,
+                )
+            self._error = None
+        except Exception as e:
+            if self._loaded is None:
+                self._error = e
+                raise
+            print(f"The version of the model could not be checked: {e}")
+        finally:
+            self._next_check = time.monotonic() + self._check_interval
+
+    def get_with_version(self) -> Tuple["CompactForest", str]:
+        """
+        This function returns the model and its version, loading it the
+        first time and when the serving version changes.
+
+        Returns
+        -------
+        Tuple[CompactForest, str]
+            The model to predict anomalies and its version.
+        """
+        if time.monotonic() >= self._next_check:
+            # Only the first requests wait for the model to be loaded
+            if self._load_lock.acquire(blocking=self._loaded is None):
+                try:
+                    if time.monotonic() >= self._next_check:
+                        self._refresh()
+                finally:
+                    self._load_lock.release()
+
+        loaded = self._loaded
+        if loaded is None:
+            # The last error is raised until the next check
+            raise self._error or RuntimeError(
+                "There is no version of the anomaly model."
+            )
+
+        return loaded
+
+    def get(self) -> "CompactForest":
+        """
+        This function returns the model to predict anomalies.
+        """
+        return self.get_with_version()[0]
+
+    def warm(self) -> None:
+        """
+        This function loads the model in background, so the first request
+        does not wait for it. If it fails, the model is loaded in the first
+        request.
+        """
+
+        def load() -> None:
+            try:
+                self.get()
+            except Exception as e:
+                print(f"The anomaly model could not be loaded: {e}")
+
+        threading.Thread(target=load, name="model-warm", daemon=True).start()
+
+    def swap(self, model: "CompactForest", version: str) -> None:
+        """
+        This function replaces the model in memory by a new version, e.g.
+        after it is retrained. The requests use the old model until the new
+        one is replaced, never a partial one.
+
+        Parameters
+        ----------
+        model : CompactForest
+            The new model.
+        version : str
+            The version of the model.
+        """
+        with self._load_lock:
+            self._loaded = (model, version)
+            self._error = None
+            self._next_check = time.monotonic() + self._check_interval
+
+    def invalidate(self) -> None:
+        """
+        This function forces the check of the version in the next request,
+        e.g. after a version is promoted.
+        """
+        self._next_check = 0.0
+
+
+model_cache = ModelCache(
+    check_interval=float(os.getenv("MODEL_CHECK_INTERVAL_SECONDS", 300))
+)
+
+
+def get_model() -> "CompactForest":
     """
-    This function downloads the model from Neptune.
+    This function returns the anomaly model from the in-process cache.
 
     Returns
     -------
-    model : IsolationForest
+    model : CompactForest
         The model to predict anomalies.
     """
-    # Load the model from neptune
-    model_neptune = neptune.init_model(
-        with_id="EX-ANOMODEL",
-        project="carlos.osorio/expenses-anomaly",
-        api_token=os.environ["NEPTUNE_API_TOKEN"] + "==",
-    )
-
-    # Get all the model versions
-    model_versions_df = (
-        model_neptune.fetch_model_versions_table().to_pandas()
-    )
-
-    # Get the latest model version
-    latest_model_version_id = model_versions_df.sort_values(
-        by=["sys/creation_time"], ascending=False
-    ).iloc[0]["sys/id"]
-
-    # Download the model
-    neptune.init_model_version(
-        project="carlos.osorio/expenses-anomaly",
-        with_id=latest_model_version_id,
-        api_token=os.environ["NEPTUNE_API_TOKEN"] + "==",
-    )["model"].download("anomaly_model.pkl")
-
-    # Load the model
-    with open("anomaly_model.pkl", "rb") as file:
-        model = pickle.load(file)
-
-    return model
+    return model_cache.get()
@@ -0,0 +1,451 @@
+import functools
+import os
+import sqlite3
+import threading
+from typing import List
+
+from dotenv import load_dotenv
+
+# Check if the file exists
+if os.path.exists("expenses/.env"):
+    load_dotenv(dotenv_path="expenses/.env")
+
+
+class DatabaseBackend:
+    """
+    This class is the base of the database backends. A backend creates the
+    connections to the database and returns the parts of the queries that
+    depend on the SQL dialect.
+    """
+
+    name = None
+
+    def connect(self):
+        """
+        This function creates a connection to the database. The connection
+        must follow the DB-API and use the qmark parameter style.
+        """
+        raise NotImplementedError
+
+    def date(self, column: str) -> str:
+        """
+        This function returns the expression of the date of a datetime
+        column.
+        """
+        raise NotImplementedError
+
+    def datetime(self, column: str) -> str:
+        """
+        This function returns the expression of a column as datetime, used
+        to compare datetimes saved with different types.
+        """
+        raise NotImplementedError
+
+    def text(self, column: str) -> str:
+        """
+        This function returns the expression of a column as text.
+        """
+        raise NotImplementedError
+
+    def weekday(self, column: str) -> str:
+        """
+        This function returns the expression of the weekday of a date
+        column, from 1 (Monday) to 7 (Sunday).
+        """
+        raise NotImplementedError
+
+    def hour(self, column: str) -> str:
+        """
+        This function returns the expression of the hour of a datetime
+        column.
+        """
+        raise NotImplementedError
+
+    def get_query_to_create_daily_aggregates(self) -> str:
+        """
+        This function returns the query to create the daily aggregates table
+        if it does not exist.
+        """
+        raise NotImplementedError
+
+    def get_query_to_update_daily_aggregates(self) -> str:
+        """
+        This function returns the query to add a transaction to the daily
+        aggregates. The query receives the datetime, the transaction type
+        and the amount of the transaction.
+        """
+        raise NotImplementedError
+
+    def get_queries_to_create_merchants(self) -> List[str]:
+        """
+        This function returns the queries to create the merchants table and
+        the merchant_id columns of the transactions and the labels, if they
+        do not exist.
+        """
+        raise NotImplementedError
+
+    def get_query_to_create_backfill_checkpoints(self) -> str:
+        """
+        This function returns the query to create the table of the
+        checkpoints of the backfills if it does not exist.
+        """
+        raise NotImplementedError
+
+    def get_query_to_create_anomaly_features(self) -> str:
+        """
+        This function returns the query to create the table of the daily
+        features of the anomaly model if it does not exist.
+        """
+        raise NotImplementedError
+
+
+class SQLServerBackend(DatabaseBackend):
+    """
+    This class is the backend for Azure SQL Server, used in production.
+    The transactions and the labels tables are created outside the
+    application, the tables of the application are created by the first
+    connection of the process.
+    """
+
+    name = "sqlserver"
+
+    def __init__(self):
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        # The driver is only needed if this backend is used
+        import pyodbc
+
+        conn = pyodbc.connect(
+            f"""DRIVER=ODBC Driver 18 for SQL Server;\
+            SERVER={os.getenv("SERVER")};\
+            DATABASE={os.getenv("DATABASE")};\
+            UID={os.getenv("USERNAME")};\
+            PWD={os.getenv("PASSWORD")}"""
+        )
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._create_tables(conn)
+                    self._initialized = True
+        return conn
+
+    def _create_tables(self, conn) -> None:
+        """
+        This function creates the tables of the application if they do not
+        exist. The DDL is transactional in SQL Server, so it is committed
+        before the connection is used, and a rollback of the first writes
+        does not remove the tables.
+        """
+        cursor = conn.cursor()
+        cursor.execute(self.get_query_to_create_daily_aggregates())
+        cursor.execute(self.get_query_to_create_backfill_checkpoints())
+        cursor.execute(self.get_query_to_create_anomaly_features())
+        for query in self.get_queries_to_create_merchants():
+            cursor.execute(query)
+        conn.commit()
+        cursor.close()
+
+    def date(self, column: str) -> str:
+        return f"CAST({column} AS DATE)"
+
+    def datetime(self, column: str) -> str:
+        return f"CAST({column} AS DATETIME)"
+
+    def text(self, column: str) -> str:
+        return f"CAST({column} AS VARCHAR)"
+
+    def weekday(self, column: str) -> str:
+        # 1900-01-01 was a Monday, so the result does not depend on the
+        # DATEFIRST setting of the session.
+        return f"(DATEDIFF(day, '19000101', {column}) % 7) + 1"
+
+    def hour(self, column: str) -> str:
+        return f"DATEPART(hour, {column})"
+
+    def get_query_to_create_daily_aggregates(self) -> str:
+        return """
+            IF OBJECT_ID('daily_aggregates', 'U') IS NULL
+            CREATE TABLE daily_aggregates (
+                date_ DATE NOT NULL,
+                transaction_type VARCHAR(50) NOT NULL,
+                amount_sum FLOAT NOT NULL,
+                total_count INT NOT NULL,
+                amount_min FLOAT NOT NULL,
+                amount_max FLOAT NOT NULL,
+                amount_avg FLOAT NOT NULL,
+                PRIMARY KEY (date_, transaction_type)
+            );
+            """
+
+    def get_query_to_update_daily_aggregates(self) -> str:
+        return """
+            MERGE daily_aggregates WITH (HOLDLOCK) AS target
+            USING (
+                SELECT
+                    CAST(? AS DATE) AS date_,
+                    ? AS transaction_type,
+                    CAST(? AS FLOAT) AS amount
+            ) AS source
+            ON (
+                target.date_ = source.date_ AND
+                target.transaction_type = source.transaction_type
+            )
+            WHEN MATCHED THEN UPDATE SET
+                amount_sum = target.amount_sum + source.amount,
+                total_count = target.total_count + 1,
+                amount_min = CASE
+                    WHEN source.amount < target.amount_min
+                    THEN source.amount
+                    ELSE target.amount_min END,
+                amount_max = CASE
+                    WHEN source.amount > target.amount_max
+                    THEN source.amount
+                    ELSE target.amount_max END,
+                amount_avg = (target.amount_sum + source.amount)
+                    / (target.total_count + 1)
+            WHEN NOT MATCHED THEN
+                INSERT (
+                    date_,
+                    transaction_type,
+                    amount_sum,
+                    total_count,
+                    amount_min,
+                    amount_max,
+                    amount_avg
+                )
+                VALUES (
+                    source.date_,
+                    source.transaction_type,
+                    source.amount,
+                    1,
+                    source.amount,
+                    source.amount,
+                    source.amount
+                );
+            """
+
+    def get_queries_to_create_merchants(self) -> List[str]:
+        return [
+            """
+            IF OBJECT_ID('merchants', 'U') IS NULL
+            CREATE TABLE merchants (
+                merchant_id INT IDENTITY(1, 1) PRIMARY KEY,
+                name VARCHAR(255) NOT NULL UNIQUE
+            );
+            """,
+            """
+            IF COL_LENGTH('transactions', 'merchant_id') IS NULL
+            ALTER TABLE transactions ADD merchant_id INT;
+            """,
+            """
+            IF COL_LENGTH('categories_trx', 'merchant_id') IS NULL
+            ALTER TABLE categories_trx ADD merchant_id INT;
+            """,
+        ]
+
+    def get_query_to_create_backfill_checkpoints(self) -> str:
+        return """
+            IF OBJECT_ID('backfill_checkpoints', 'U') IS NULL
+            CREATE TABLE backfill_checkpoints (
+                email_from VARCHAR(255) NOT NULL PRIMARY KEY,
+                date_until DATE NOT NULL,
+                updated_at DATETIME NOT NULL
+            );
+            """
+
+    def get_query_to_create_anomaly_features(self) -> str:
+        return """
+            IF OBJECT_ID('anomaly_features', 'U') IS NULL
+            CREATE TABLE anomaly_features (
+                date_ DATE NOT NULL PRIMARY KEY,
+                avg_amount FLOAT NOT NULL,
+                max_amount FLOAT NOT NULL,
+                total_trx INT NOT NULL,
+                weekend INT NOT NULL
+            );
+            """
+
+
+class SQLiteBackend(DatabaseBackend):
+    """
+    This class is the backend for an embedded SQLite database. It runs the
+    API in a single process without an external server, so it is used for
+    small deployments, local development and the benchmarks.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._initialized = False
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self._path, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        if not self._initialized:
+            self._create_tables(conn)
+            self._initialized = True
+        return conn
+
+    def _create_tables(self, conn: sqlite3.Connection) -> None:
+        """
+        This function creates the tables if they do not exist. In SQL
+        Server the transactions and the labels tables are created outside
+        the application.
+        """
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transaction_type TEXT,
+                amount FLOAT,
+                merchant TEXT,
+                datetime TIMESTAMP,
+                payment_method TEXT,
+                email_log_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_transactions_datetime
+            ON transactions (datetime);
+            CREATE TABLE IF NOT EXISTS categories_trx (
+                merchant TEXT,
+                datetime TIMESTAMP,
+                category TEXT,
+                similarity FLOAT
+            );
+            """
+        )
+        conn.execute(self.get_query_to_create_daily_aggregates())
+        conn.execute(self.get_query_to_create_backfill_checkpoints())
+        conn.execute(self.get_query_to_create_anomaly_features())
+        for query in self.get_queries_to_create_merchants():
+            conn.execute(query)
+
+        # SQLite can not add a column only if it does not exist
+        for table in ["transactions", "categories_trx"]:
+            columns = [
+                row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+            ]
+            if "merchant_id" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD merchant_id INTEGER")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_transactions_merchant_id "
+            "ON transactions (merchant_id)"
+        )
+        conn.commit()
+
+    def date(self, column: str) -> str:
+        return f"date({column})"
+
+    def datetime(self, column: str) -> str:
+        return f"datetime({column})"
+
+    def text(self, column: str) -> str:
+        return f"CAST({column} AS TEXT)"
+
+    def weekday(self, column: str) -> str:
+        # strftime('%w') is 0 for Sunday
+        return f"((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) + 1"
+
+    def hour(self, column: str) -> str:
+        return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+    def get_query_to_create_daily_aggregates(self) -> str:
+        return """
+            CREATE TABLE IF NOT EXISTS daily_aggregates (
+                date_ DATE NOT NULL,
+                transaction_type TEXT NOT NULL,
+                amount_sum FLOAT NOT NULL,
+                total_count INTEGER NOT NULL,
+                amount_min FLOAT NOT NULL,
+                amount_max FLOAT NOT NULL,
+                amount_avg FLOAT NOT NULL,
+                PRIMARY KEY (date_, transaction_type)
+            );
+            """
+
+    def get_query_to_update_daily_aggregates(self) -> str:
+        return """
+            INSERT INTO daily_aggregates (
+                date_,
+                transaction_type,
+                amount_sum,
+                total_count,
+                amount_min,
+                amount_max,
+                amount_avg
+            )
+            SELECT date(source.datetime_), source.transaction_type,
+                   source.amount, 1, source.amount, source.amount,
+                   source.amount
+            FROM (
+                SELECT
+                    ? AS datetime_,
+                    ? AS transaction_type,
+                    CAST(? AS FLOAT) AS amount
+            ) AS source
+            WHERE true
+            ON CONFLICT (date_, transaction_type) DO UPDATE SET
+                amount_sum = amount_sum + excluded.amount_sum,
+                total_count = total_count + 1,
+                amount_min = MIN(amount_min, excluded.amount_min),
+                amount_max = MAX(amount_max, excluded.amount_max),
+                amount_avg = (amount_sum + excluded.amount_sum)
+                    / (total_count + 1);
+            """
+
+    def get_queries_to_create_merchants(self) -> List[str]:
+        return [
+            """
+            CREATE TABLE IF NOT EXISTS merchants (
+                merchant_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE
+            );
+            """
+        ]
+
+    def get_query_to_create_backfill_checkpoints(self) -> str:
+        return """
+            CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+                email_from TEXT NOT NULL PRIMARY KEY,
+                date_until DATE NOT NULL,
+                updated_at TIMESTAMP NOT NULL
+            );
+            """
+
+    def get_query_to_create_anomaly_features(self) -> str:
+        return """
+            CREATE TABLE IF NOT EXISTS anomaly_features (
+                date_ DATE NOT NULL PRIMARY KEY,
+                avg_amount FLOAT NOT NULL,
+                max_amount FLOAT NOT NULL,
+                total_trx INTEGER NOT NULL,
+                weekend INTEGER NOT NULL
+            );
+            """
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend() -> DatabaseBackend:
+    """
+    This function returns the database backend set in the DATABASE_BACKEND
+    environment variable: "sqlserver" (default) or "sqlite". The path of
+    the SQLite database is set in the SQLITE_PATH environment variable.
+
+    Returns
+    -------
+    DatabaseBackend
+        The database backend.
+    """
+    backend_name = os.getenv("DATABASE_BACKEND", "sqlserver")
+
+    if backend_name == "sqlserver":
+        return SQLServerBackend()
+    elif backend_name == "sqlite":
+        return SQLiteBackend(
+            os.getenv("SQLITE_PATH", "expenses/expenses.db")
+        )
+
+    raise ValueError(f"Database backend {backend_name} not found")
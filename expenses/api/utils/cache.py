@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from expenses.api.utils.concurrency import run_in_database
+
+
+class ResultCache:
+    """
+    This class is an in-process cache for the results of the read
+    endpoints. The entries expire after a time to live and the least
+    recently used entries are discarded when the cache is full.
+
+    Each invalidation increases a generation counter. A result computed
+    while the cache was invalidated is returned but not cached, since it
+    may have been read before the write.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(
+        self, key: Hashable, function: Callable[[], Any]
+    ) -> Any:
+        """
+        This function returns the cached result for the key. If there is
+        not a valid result, it is computed with the function and cached.
+        If the function raises an exception, nothing is cached.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key of the result, usually the endpoint and the date to
+            search.
+        function : Callable[[], Any]
+            The function that computes the result.
+
+        Returns
+        -------
+        Any
+            The result for the key.
+        """
+        found, result, generation = self._get(key)
+        if found:
+            return result
+
+        # The result is computed outside the lock to avoid blocking the
+        # other requests while the database is queried.
+        result = function()
+        self._set(key, result, generation)
+
+        return result
+
+    async def get_or_compute_async(
+        self, key: Hashable, function: Callable[[], Any]
+    ) -> Any:
+        """
+        This function is the same as get_or_compute, but the function is
+        executed in the database pool, so the event loop is not blocked
+        when the result is not cached.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key of the result, usually the endpoint and the date to
+            search.
+        function : Callable[[], Any]
+            The blocking function that computes the result.
+
+        Returns
+        -------
+        Any
+            The result for the key.
+        """
+        found, result, generation = self._get(key)
+        if found:
+            return result
+
+        result = await run_in_database(function)
+        self._set(key, result, generation)
+
+        return result
+
+    def _get(self, key: Hashable) -> Tuple[bool, Any, int]:
+        """
+        This function returns if there is a valid result for the key, the
+        result and the current generation, updating the counters.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1], self._generation
+            self.misses += 1
+            return False, None, self._generation
+
+    def _set(self, key: Hashable, result: Any, generation: int) -> None:
+        """
+        This function caches the result for the key, discarding the least
+        recently used results if the cache is full. The result is not
+        cached if the cache was invalidated since the generation given.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self._ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """
+        This function removes all the cached results. It is called when
+        the transactions are written.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        This function returns the counters of the cache.
+
+        Returns
+        -------
+        Dict[str, float]
+            The hits, misses, hit ratio and size of the cache.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total > 0 else 0.0,
+                "size": len(self._entries),
+            }
+
+
+# Cache shared by all the read endpoints
+result_cache = ResultCache(
+    max_size=int(os.getenv("CACHE_MAX_SIZE", 256)),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", 300)),
+)
@@ -0,0 +1,431 @@
+import datetime
+import functools
+import os
+import threading
+import uuid
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from expenses.api.schemas import WeeklyExpenses
+from expenses.api.utils.database import get_cursor
+from expenses.api.utils.transactions import SUMMARY_TRANSACTION_TYPES_
+
+# pandas is imported when the transactions are read, so the API starts
+# without it
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+# Check if the file exists
+if os.path.exists("expenses/.env"):
+    load_dotenv(dotenv_path="expenses/.env")
+
+# Columns of the transactions saved in the store, in the order of the
+# insertion query.
+COLUMNS_ = [
+    "transaction_type",
+    "amount",
+    "merchant",
+    "datetime",
+    "payment_method",
+    "email_log_id",
+]
+
+# The received transfers are not expenses
+EXPENSE_TRANSACTION_TYPES_ = [
+    transaction_type
+    for transaction_type in SUMMARY_TRANSACTION_TYPES_.values()
+    if transaction_type != "Recepcion Transferencia"
+]
+
+
+class ColumnarStore:
+    """
+    This class is an append-only columnar store of the transactions. The
+    transactions are saved in Parquet files partitioned by month
+    (month=YYYY-MM), so the analytical queries only read the columns and
+    the months they need.
+
+    Each append writes a new part file, so the parts of a month are merged
+    when they are more than max_parts, keeping the number of files of a
+    scan bounded.
+
+    Parameters
+    ----------
+    path : str
+        The folder of the store.
+    max_parts : int
+        The maximum number of part files of a month, by default 16.
+    """
+
+    def __init__(self, path: str, max_parts: int = 16):
+        # pyarrow is only needed if the store is configured
+        import pyarrow as pa
+
+        self._path = path
+        self._max_parts = max_parts
+        # The writes of the store are serialized, the reads only list the
+        # files with the lock
+        self._lock = threading.Lock()
+        self._schema = pa.schema(
+            [
+                ("transaction_type", pa.string()),
+                ("amount", pa.float64()),
+                ("merchant", pa.string()),
+                ("datetime", pa.timestamp("us")),
+                ("payment_method", pa.string()),
+                ("email_log_id", pa.string()),
+            ]
+        )
+
+    def _write_part(self, month: str, table) -> None:
+        """
+        This function writes a new part file in the partition of the month.
+        The file is written with a hidden name and then renamed, so the
+        readers never see a partial file.
+        """
+        import pyarrow.parquet as pq
+
+        partition = os.path.join(self._path, f"month={month}")
+        os.makedirs(partition, exist_ok=True)
+
+        name = f"part-{uuid.uuid4().hex}.parquet"
+        temporal_path = os.path.join(partition, f".{name}.tmp")
+        pq.write_table(table, temporal_path)
+        os.replace(temporal_path, os.path.join(partition, name))
+
+    def _list_parts(self, partition: Optional[str] = None) -> List[str]:
+        """
+        This function returns the paths of the part files of a partition,
+        or of all the partitions if it is None.
+        """
+        if not os.path.exists(self._path):
+            return []
+
+        partitions = (
+            [partition] if partition is not None else os.listdir(self._path)
+        )
+        return [
+            os.path.join(self._path, partition, name)
+            for partition in partitions
+            if os.path.isdir(os.path.join(self._path, partition))
+            for name in os.listdir(os.path.join(self._path, partition))
+            if name.endswith(".parquet")
+        ]
+
+    def _compact_partition(self, partition: str) -> None:
+        """
+        This function merges the part files of a partition into a single
+        file. It is called with the lock.
+        """
+        import pyarrow.parquet as pq
+
+        parts = self._list_parts(partition)
+        if len(parts) <= 1:
+            return
+
+        table = pq.ParquetDataset(parts, schema=self._schema).read()
+        self._write_part(partition.split("=")[1], table)
+        for part in parts:
+            os.remove(part)
+
+    def append(self, rows: List[Tuple]) -> int:
+        """
+        This function appends the transactions to the store.
+
+        Parameters
+        ----------
+        rows : List[Tuple]
+            The transactions, with the values in the order of COLUMNS_.
+
+        Returns
+        -------
+        int
+            The number of transactions appended.
+        """
+        import pyarrow as pa
+
+        # Group the transactions by month
+        months = {}
+        for row in rows:
+            months.setdefault(row[3].strftime("%Y-%m"), []).append(row)
+
+        with self._lock:
+            for month, month_rows in months.items():
+                table = pa.Table.from_pylist(
+                    [dict(zip(COLUMNS_, row)) for row in month_rows],
+                    schema=self._schema,
+                )
+                self._write_part(month, table)
+
+                # The months with too many parts are merged
+                partition = f"month={month}"
+                if len(self._list_parts(partition)) > self._max_parts:
+                    self._compact_partition(partition)
+
+        return len(rows)
+
+    def compact(self) -> None:
+        """
+        This function merges the part files of each month into a single
+        file, since every append creates a new file.
+        """
+        if not os.path.exists(self._path):
+            return
+
+        with self._lock:
+            for partition in os.listdir(self._path):
+                self._compact_partition(partition)
+
+    def clear(self) -> None:
+        """
+        This function removes all the transactions of the store.
+        """
+        import shutil
+
+        with self._lock:
+            if os.path.exists(self._path):
+                shutil.rmtree(self._path)
+
+    def scan(
+        self,
+        columns: Sequence[str],
+        date_from: Optional[datetime.datetime] = None,
+        date_to: Optional[datetime.datetime] = None,
+        transaction_types: Optional[Sequence[str]] = None,
+    ) -> "DataFrame":
+        """
+        This function reads the columns of the transactions that match the
+        filters. The months out of the dates are not read.
+
+        The part files are listed with the lock, so a merge of the parts is
+        never seen half done. If a part is removed by a merge while it is
+        read, the parts are listed again.
+
+        Parameters
+        ----------
+        columns : Sequence[str]
+            The columns to read.
+        date_from : datetime.datetime, optional
+            The start datetime (inclusive), by default None.
+        date_to : datetime.datetime, optional
+            The end datetime (exclusive), by default None.
+        transaction_types : Sequence[str], optional
+            The transaction types to read, by default all of them.
+
+        Returns
+        -------
+        DataFrame
+            The transactions.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        from pandas import DataFrame
+
+        # The filters of the month prune the partitions
+        timestamp = pa.timestamp("us")
+        filters = []
+        if date_from is not None:
+            filters.append(ds.field("month") >= date_from.strftime("%Y-%m"))
+            filters.append(
+                ds.field("datetime")
+                >= pa.scalar(date_from.replace(tzinfo=None), timestamp)
+            )
+        if date_to is not None:
+            filters.append(ds.field("month") <= date_to.strftime("%Y-%m"))
+            filters.append(
+                ds.field("datetime")
+                < pa.scalar(date_to.replace(tzinfo=None), timestamp)
+            )
+        if transaction_types is not None:
+            filters.append(
+                ds.field("transaction_type").isin(list(transaction_types))
+            )
+
+        expression = None
+        for condition in filters:
+            expression = (
+                condition if expression is None else expression & condition
+            )
+
+        for attempt in range(2):
+            with self._lock:
+                parts = self._list_parts()
+            if len(parts) == 0:
+                return DataFrame(columns=list(columns))
+
+            dataset = ds.dataset(
+                parts,
+                schema=self._schema.append(pa.field("month", pa.string())),
+                format="parquet",
+                partitioning=ds.partitioning(
+                    pa.schema([("month", pa.string())]), flavor="hive"
+                ),
+                partition_base_dir=self._path,
+            )
+            try:
+                return dataset.to_table(
+                    columns=list(columns), filter=expression
+                ).to_pandas()
+            except FileNotFoundError:
+                if attempt == 1:
+                    raise
+
+
+@functools.lru_cache(maxsize=None)
+def get_columnar_store() -> Optional[ColumnarStore]:
+    """
+    This function returns the columnar store set in the COLUMNAR_STORE_PATH
+    environment variable. If it is not set, the store is not used.
+
+    Returns
+    -------
+    Optional[ColumnarStore]
+        The columnar store, or None.
+    """
+    path = os.getenv("COLUMNAR_STORE_PATH")
+    if not path:
+        return None
+
+    return ColumnarStore(
+        path, max_parts=int(os.getenv("COLUMNAR_STORE_MAX_PARTS", 16))
+    )
+
+
+def append_to_columnar_store(rows: List[Tuple]) -> None:
+    """
+    This function appends the inserted transactions to the columnar store,
+    if it is configured.
+
+    Parameters
+    ----------
+    rows : List[Tuple]
+        The transactions, with the values in the order of COLUMNS_.
+    """
+    store = get_columnar_store()
+    if store is not None and len(rows) > 0:
+        store.append(rows)
+
+
+def rebuild_columnar_store() -> int:
+    """
+    This function rebuilds the columnar store from the transactions table.
+    It is used to backfill the store.
+
+    Returns
+    -------
+    int
+        The number of transactions saved in the store.
+    """
+    store = get_columnar_store()
+    if store is None:
+        raise ValueError("The columnar store is not configured")
+
+    cursor = get_cursor()
+    cursor.execute(f"SELECT {', '.join(COLUMNS_)} FROM transactions")
+    rows = [tuple(row) for row in cursor.fetchall()]
+    cursor.close()
+
+    store.clear()
+    return store.append(rows)
+
+
+def scan_transactions(
+    columns: Sequence[str],
+    date_from: Optional[datetime.datetime] = None,
+    date_to: Optional[datetime.datetime] = None,
+    transaction_types: Optional[Sequence[str]] = None,
+) -> "DataFrame":
+    """
+    This function reads the columns of the transactions for the analytical
+    queries. The columnar store is used if it is configured, otherwise the
+    transactions table is queried.
+
+    Parameters
+    ----------
+    columns : Sequence[str]
+        The columns to read.
+    date_from : datetime.datetime, optional
+        The start datetime (inclusive), by default None.
+    date_to : datetime.datetime, optional
+        The end datetime (exclusive), by default None.
+    transaction_types : Sequence[str], optional
+        The transaction types to read, by default all of them.
+
+    Returns
+    -------
+    DataFrame
+        The transactions.
+    """
+    from pandas import read_sql, to_datetime
+
+    if any(column not in COLUMNS_ for column in columns):
+        raise ValueError(f"The columns must be in {COLUMNS_}")
+
+    store = get_columnar_store()
+    if store is not None:
+        return store.scan(columns, date_from, date_to, transaction_types)
+
+    # Build the same query over the transactions table
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("datetime >= ?")
+        params.append(date_from.replace(tzinfo=None))
+    if date_to is not None:
+        conditions.append("datetime < ?")
+        params.append(date_to.replace(tzinfo=None))
+    if transaction_types is not None:
+        conditions.append(
+            "transaction_type IN "
+            f"({', '.join('?' for _ in transaction_types)})"
+        )
+        params.extend(transaction_types)
+
+    query = f"SELECT {', '.join(columns)} FROM transactions"
+    if len(conditions) > 0:
+        query += " WHERE " + " AND ".join(conditions)
+
+    conn, _ = get_cursor(return_conn=True)
+    df = read_sql(query, conn, params=tuple(params))
+    conn.close()
+
+    if "datetime" in df.columns:
+        df["datetime"] = to_datetime(df["datetime"])
+
+    return df
+
+
+def get_weekly_expenses(
+    date_from: datetime.datetime,
+) -> List[WeeklyExpenses]:
+    """
+    This function returns the expenses of each week (%Y-%U) from the date
+    given, as positive amounts.
+
+    Parameters
+    ----------
+    date_from : datetime.datetime
+        The date to search.
+
+    Returns
+    -------
+    List[WeeklyExpenses]
+        The expenses of each week.
+    """
+    from pandas import to_datetime
+
+    df = scan_transactions(
+        ["datetime", "amount"],
+        date_from=date_from,
+        transaction_types=EXPENSE_TRANSACTION_TYPES_,
+    )
+    if df.empty:
+        return []
+
+    df["week"] = to_datetime(df["datetime"]).dt.strftime("%Y-%U")
+    df_weekly = df.groupby("week")["amount"].sum().reset_index()
+
+    return [
+        WeeklyExpenses(week=row.week, amount=-1 * row.amount)
+        for row in df_weekly.itertuples()
+    ]
@@ -0,0 +1,38 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# The database driver is blocking, so the queries are executed in a bounded
+# pool of threads. The size of the pool limits the number of concurrent
+# connections to the database.
+DATABASE_MAX_WORKERS = int(os.getenv("DATABASE_MAX_WORKERS", 8))
+
+database_executor = ThreadPoolExecutor(
+    max_workers=DATABASE_MAX_WORKERS, thread_name_prefix="database"
+)
+
+
+async def run_in_database(function: Callable, *args, **kwargs) -> Any:
+    """
+    This function executes a blocking function that access the database
+    in the database pool, so the event loop is not blocked while the
+    query is executed.
+
+    Parameters
+    ----------
+    function : Callable
+        The blocking function to execute.
+    *args, **kwargs
+        The arguments of the function.
+
+    Returns
+    -------
+    Any
+        The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        database_executor, functools.partial(function, *args, **kwargs)
+    )
@@ -1,12 +1,16 @@
 import datetime
 import os
-from typing import Dict, List, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import numpy as np
-import pyodbc
 from dotenv import load_dotenv
 
-from expenses.api.schemas import LabeledTransactionInfo, SummaryMerchant
+from expenses.api.schemas import (
+    BaseTransactionInfo,
+    DailyAggregate,
+    LabeledTransactionInfo,
+    LabeledTransactionInfoFull,
+)
+from expenses.api.utils.backends import get_backend
 from expenses.processors.schemas import TransactionInfo
 
 # Check if the file exists
@@ -14,9 +18,10 @@ if os.path.exists("expenses/.env"):
     load_dotenv(dotenv_path="expenses/.env")
 
 
-def get_cursor(return_conn: bool = False) -> Union[pyodbc.Cursor, None]:
+def get_cursor(return_conn: bool = False) -> Union[Any, None]:
     """
-    This function creates a connection to the database.
+    This function creates a connection to the database of the configured
+    backend.
 
     Parameters
     ----------
@@ -25,18 +30,12 @@ def get_cursor(return_conn: bool = False) -> Union[pyodbc.Cursor, None]:
         by default False.
     Returns
     -------
-    pyodbc.Connection
-        The connection to the database.
+    Cursor
+        The cursor of the connection to the database.
     """
     try:
         # Establish the connection
-        conn = pyodbc.connect(
-            f"""DRIVER=ODBC Driver 18 for SQL Server;\
-            SERVER={os.getenv("SERVER")};\
-            DATABASE={os.getenv("DATABASE")};\
-            UID={os.getenv("USERNAME")};\
-            PWD={os.getenv("PASSWORD")}"""
-        )
+        conn = get_backend().connect()
         cursor = conn.cursor()
         return cursor if not return_conn else (conn, cursor)
     except Exception as e:
@@ -44,11 +43,39 @@ def get_cursor(return_conn: bool = False) -> Union[pyodbc.Cursor, None]:
         return None
 
 
-def get_transactions_from_database(
+def get_transaction_row(transaction: Tuple) -> Dict[str, Any]:
+    """
+    This function converts a row of the transactions table to the fields
+    of TransactionInfo, with the same types the validation gives, so the
+    row can be serialised without building the model.
+
+    Parameters
+    ----------
+    transaction : Tuple
+        The transaction type, the amount, the merchant, the datetime, the
+        payment method and the email log of the transaction.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The fields of the transaction.
+    """
+    return {
+        "transaction_type": str(transaction[0]),
+        "amount": float(transaction[1]),
+        "merchant": str(transaction[2]),
+        "datetime": transaction[3],
+        "paynment_method": str(transaction[4]),
+        "email_log": None if transaction[5] is None else str(transaction[5]),
+    }
+
+
+def get_transaction_rows_from_database(
     date_from: datetime.datetime,
-) -> List[TransactionInfo]:
+) -> List[Dict[str, Any]]:
     """
-    Searches for the transactions in the database given a date.
+    Searches for the transactions in the database given a date. The rows
+    are returned as dictionaries, so they are serialised directly.
 
     Parameters
     ----------
@@ -57,8 +84,8 @@ def get_transactions_from_database(
 
     Returns
     -------
-    List[TransactionInfo]
-        The list of transactions.
+    List[Dict[str, Any]]
+        The fields of the transactions.
     """
     try:
         cursor = get_cursor()
@@ -76,91 +103,160 @@ def get_transactions_from_database(
             FROM transactions
             WHERE datetime >= ?
             """,
-            date_from.date(),
+            (date_from.date(),),
         )
         transactions_from_db = cursor.fetchall()
 
         # Close the connection
         cursor.close()
 
-        # Get the transactions with the correct type
-        if len(transactions_from_db) > 0:
-            transactions = [
-                TransactionInfo(
-                    transaction_type=str(transaction[0]),
-                    amount=transaction[1],
-                    merchant=str(transaction[2]),
-                    datetime=transaction[3],
-                    paynment_method=str(transaction[4]),
-                    email_log=transaction[5],
-                )
-                for transaction in transactions_from_db
-            ]
-        else:
-            transactions = []
-
-        return transactions
+        return [
+            get_transaction_row(transaction)
+            for transaction in transactions_from_db
+        ]
     except Exception:
         return []
 
 
-def get_merchants_values(
+def get_transactions_from_database(
     date_from: datetime.datetime,
-) -> List[SummaryMerchant]:
+) -> List[TransactionInfo]:
     """
-    This function returns the merchants and the values of the day.
+    Searches for the transactions in the database given a date.
 
     Parameters
     ----------
     date_from : datetime.datetime
         The date to search.
+
+    Returns
+    -------
+    List[TransactionInfo]
+        The list of transactions.
+    """
+    return [
+        TransactionInfo(**row)
+        for row in get_transaction_rows_from_database(date_from)
+    ]
+
+
+def get_summary_from_database(
+    date_from: datetime.datetime,
+) -> Dict[str, BaseTransactionInfo]:
+    """
+    Aggregates the transactions in the database by transaction type given a
+    date. The aggregation is made by the database, so only one row per
+    transaction type is returned.
+
+    Parameters
+    ----------
+    date_from : datetime.datetime
+        The date to search.
+
+    Returns
+    -------
+    Dict[str, BaseTransactionInfo]
+        The aggregated values indexed by the transaction type.
     """
     try:
         cursor = get_cursor()
 
-        # Get the transactions
+        # Get the aggregated values
         cursor.execute(
             """
             SELECT
-                merchant,
+                transaction_type,
                 SUM(amount) AS amount,
                 COUNT(*) AS count
             FROM transactions
-            WHERE datetime >= ? AND transaction_type = 'Compra'
-            AND merchant != ''
-            GROUP BY merchant
-            ORDER BY amount DESC
+            WHERE datetime >= ?
+            GROUP BY transaction_type
             """,
-            date_from,
+            (date_from.date(),),
         )
+        aggregates_from_db = cursor.fetchall()
+
+        # Close the connection
+        cursor.close()
 
-        # Get the merchants
-        merchants_inform = cursor.fetchall()
+        return {
+            str(aggregate[0]): BaseTransactionInfo(
+                name=str(aggregate[0]),
+                amount=float(aggregate[1]),
+                count=aggregate[2],
+            )
+            for aggregate in aggregates_from_db
+        }
+    except Exception:
+        return {}
+
+
+def get_data_version(
+    date_from: datetime.datetime,
+    date_to: Union[datetime.datetime, None] = None,
+    include_labels: bool = False,
+) -> Union[str, None]:
+    """
+    This function returns a marker of the version of the transactions in
+    a window. The marker changes when a transaction is inserted in the
+    window, so it is used to know if a response changed.
+
+    Parameters
+    ----------
+    date_from : datetime.datetime
+        The start date of the window.
+    date_to : datetime.datetime, optional
+        The end date of the window. If None, the window has no end.
+    include_labels : bool, optional
+        If True, the labels of the transactions are also considered,
+        by default False.
+
+    Returns
+    -------
+    str or None
+        The version of the data. None if there are no transactions in the
+        window or the version could not be obtained.
+    """
+    try:
+        cursor = get_cursor()
+
+        # Get the number of transactions and the last id of the window
+        cursor.execute(
+            f"""
+            SELECT COUNT(*), MAX(id)
+            FROM transactions
+            WHERE datetime >= ? AND {get_backend().date("datetime")} <= ?
+            """,
+            (date_from.date(), (date_to or datetime.datetime.max).date()),
+        )
+        total_count, max_id = cursor.fetchone()
+
+        if total_count == 0:
+            cursor.close()
+            return None
+
+        version = f"{total_count}-{max_id}"
+
+        # The labels are written by the labels API, so they are counted
+        # apart from the transactions.
+        if include_labels:
+            cursor.execute("SELECT COUNT(*) FROM categories_trx")
+            version += f"-{cursor.fetchone()[0]}"
 
         # Close the connection
         cursor.close()
 
-        # Get the transactions with the correct type
-        if len(merchants_inform) > 0:
-            transactions = [
-                SummaryMerchant(
-                    merchant=str(merchant[0]),
-                    amount=merchant[1],
-                    count=merchant[2],
-                )
-                for merchant in merchants_inform
-            ]
-        else:
-            transactions = []
-
-        return transactions
+        return version
     except Exception:
-        return []
+        return None
 
 
 def get_query_to_insert_values() -> str:
     """
     This function returns the query to insert the values in the database.
+    The query receives the values of the transaction, the id of the
+    merchant and the values of the transaction without the email log to
+    check if the transaction exists.
 
     Returns
     -------
@@ -175,9 +271,10 @@ def get_query_to_insert_values() -> str:
             merchant,
             datetime,
             payment_method,
-            email_log_id
+            email_log_id,
+            merchant_id
         )
-        SELECT ?, ?, ?, ?, ?, ?
+        SELECT ?, ?, ?, ?, ?, ?, ?
         WHERE NOT EXISTS (
             SELECT 1 FROM transactions
             WHERE
@@ -190,59 +287,352 @@ def get_query_to_insert_values() -> str:
         """
 
 
-def get_summary_a_day_like_today(weekday: int) -> Dict:
+def get_query_to_update_daily_aggregates() -> str:
     """
-    This function returns the summary of all the transactions of a day like
-    today.
+    This function returns the query to add a transaction to the daily
+    aggregates. The query receives the datetime, the transaction type and
+    the amount of the transaction.
+
+    Returns
+    -------
+    str
+        The query to update the daily aggregates.
+    """
+    return get_backend().get_query_to_update_daily_aggregates()
+
+
+def get_backfill_checkpoint(
+    cursor: Any, email_from: str
+) -> Optional[datetime.date]:
+    """
+    This function returns the date until which the emails of the address
+    were backfilled, that is, the end of the last committed chunk. The
+    table of the checkpoints is created if it does not exist.
 
     Parameters
     ----------
-    weekday : int
-        The weekday to search.
+    cursor : Cursor
+        The cursor to the database.
+    email_from : str
+        The email address of the backfill.
 
     Returns
     -------
-    dict
-        The summary of all the transactions of a day like today.
+    Optional[datetime.date]
+        The date of the checkpoint, or None if there is no checkpoint.
+    """
+    cursor.execute(get_backend().get_query_to_create_backfill_checkpoints())
+    cursor.connection.commit()
+
+    cursor.execute(
+        "SELECT date_until FROM backfill_checkpoints WHERE email_from = ?",
+        (email_from,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    # SQLite returns the dates as text
+    return (
+        datetime.date.fromisoformat(row[0])
+        if isinstance(row[0], str)
+        else row[0]
+    )
+
+
+def save_backfill_checkpoint(
+    cursor: Any, email_from: str, date_until: Optional[datetime.date]
+) -> None:
+    """
+    This function saves the checkpoint of the backfill of the address. It
+    is not committed, so it is committed with the transactions of the
+    chunk.
+
+    Parameters
+    ----------
+    cursor : Cursor
+        The cursor to the database.
+    email_from : str
+        The email address of the backfill.
+    date_until : Optional[datetime.date]
+        The end of the last chunk (exclusive). If None, the checkpoint is
+        removed.
+    """
+    cursor.execute(
+        "DELETE FROM backfill_checkpoints WHERE email_from = ?",
+        (email_from,),
+    )
+    if date_until is not None:
+        cursor.execute(
+            """
+            INSERT INTO backfill_checkpoints
+                (email_from, date_until, updated_at)
+            VALUES (?, ?, ?)
+            """,
+            (email_from, date_until, datetime.datetime.now()),
+        )
+
+
+def rebuild_daily_aggregates() -> int:
+    """
+    This function rebuilds the daily aggregates from the transactions
+    table. It creates the table if it does not exist, so it is also used
+    to backfill the aggregates.
+
+    Returns
+    -------
+    int
+        The number of rows in the daily aggregates.
+    """
+    backend = get_backend()
+    cursor = get_cursor()
+
+    # Create the table if it does not exist
+    cursor.execute(backend.get_query_to_create_daily_aggregates())
+
+    # Compute again all the aggregates in the same transaction
+    cursor.execute("DELETE FROM daily_aggregates;")
+    cursor.execute(
+        f"""
+        INSERT INTO daily_aggregates
+        (
+            date_,
+            transaction_type,
+            amount_sum,
+            total_count,
+            amount_min,
+            amount_max,
+            amount_avg
+        )
+        SELECT
+            {backend.date("datetime")},
+            transaction_type,
+            SUM(CAST(amount AS FLOAT)),
+            COUNT(*),
+            MIN(CAST(amount AS FLOAT)),
+            MAX(CAST(amount AS FLOAT)),
+            AVG(CAST(amount AS FLOAT))
+        FROM transactions
+        GROUP BY {backend.date("datetime")}, transaction_type;
+        """
+    )
+    cursor.execute("SELECT COUNT(*) FROM daily_aggregates;")
+    total_rows = cursor.fetchone()[0]
+    cursor.connection.commit()
+    cursor.close()
+
+    return total_rows
+
+
+def get_daily_aggregates(
+    date_from: datetime.datetime,
+) -> List[DailyAggregate]:
+    """
+    This function returns the daily aggregates by transaction type given a
+    date.
+
+    Parameters
+    ----------
+    date_from : datetime.datetime
+        The date to search.
+
+    Returns
+    -------
+    List[DailyAggregate]
+        The daily aggregates.
     """
     try:
         cursor = get_cursor()
-        # Get the transactions
+
+        # Get the aggregates
         cursor.execute(
             """
-                SET DATEFIRST 1;
-                SELECT CAST(datetime AS DATE),
-                        SUM(amount) AS amount_sum,
-                        COUNT(*) AS total_count
-                FROM transactions
-                WHERE transaction_type = 'Compra' AND
-                        DATEPART(weekday, datetime) = ?
-                GROUP BY CAST(datetime AS DATE)
+            SELECT
+                date_,
+                transaction_type,
+                amount_sum,
+                total_count,
+                amount_min,
+                amount_max,
+                amount_avg
+            FROM daily_aggregates
+            WHERE date_ >= ?
+            ORDER BY date_
             """,
-            weekday,
+            (date_from.date(),),
         )
-
-        # Get the summary
-        transactions = cursor.fetchall()
+        aggregates_from_db = cursor.fetchall()
 
         # Close the connection
         cursor.close()
+
+        return [
+            DailyAggregate(
+                date=aggregate[0],
+                transaction_type=str(aggregate[1]),
+                amount_sum=aggregate[2],
+                total_count=aggregate[3],
+                amount_min=aggregate[4],
+                amount_max=aggregate[5],
+                amount_avg=aggregate[6],
+            )
+            for aggregate in aggregates_from_db
+        ]
     except Exception:
+        return []
+
+
+def get_hourly_amounts(
+    date_from: Optional[datetime.date], date_to: datetime.date
+) -> List[Tuple]:
+    """
+    This function returns the amount of the purchases of each day and hour
+    between the dates. The amounts are aggregated in the database.
+
+    Parameters
+    ----------
+    date_from : Optional[datetime.date]
+        The start date (inclusive). If None, all the days are returned.
+    date_to : datetime.date
+        The end date (exclusive).
+
+    Returns
+    -------
+    List[Tuple]
+        The date, the hour and the amount of the purchases.
+    """
+    backend = get_backend()
+    date_ = backend.date("datetime")
+    hour_ = backend.hour("datetime")
+
+    conditions, params = ["datetime < ?"], [
+        datetime.datetime.combine(date_to, datetime.time())
+    ]
+    if date_from is not None:
+        conditions.append("datetime >= ?")
+        params.append(datetime.datetime.combine(date_from, datetime.time()))
+
+    cursor = get_cursor()
+    cursor.execute(
+        f"""
+            SELECT {date_} AS date_,
+                    {hour_} AS hour_,
+                    SUM(amount) AS amount
+            FROM transactions
+            WHERE transaction_type = 'Compra' AND
+                    {" AND ".join(conditions)}
+            GROUP BY {date_}, {hour_}
+        """,
+        tuple(params),
+    )
+    rows = [tuple(row) for row in cursor.fetchall()]
+    cursor.close()
+
+    # SQLite returns the dates as text
+    return [
+        (
+            datetime.date.fromisoformat(row[0])
+            if isinstance(row[0], str)
+            else row[0],
+            int(row[1]),
+            row[2],
+        )
+        for row in rows
+    ]
+
+
+def get_summary_a_day_like_today(
+    weekday: int,
+    weeks: int = 8,
+    today: Optional[datetime.date] = None,
+) -> Dict:
+    """
+    This function returns the summary of all the transactions of a day like
+    today: the distribution of the amount of the purchases of the days and
+    the median of the last weeks. The current day is not complete, so the
+    days are the previous ones, and the days without purchases count as
+    0.
+
+    Parameters
+    ----------
+    weekday : int
+        The weekday to search.
+    weeks : int, optional
+        The number of weeks of the trailing median, by default 8.
+    today : datetime.date, optional
+        The current date, the trailing weeks end the day before. If None,
+        the date of the server is used.
+
+    Returns
+    -------
+    dict
+        The summary of all the transactions of a day like today.
+    """
+    cursor = get_cursor()
+    if cursor is None:
+        raise ConnectionError("The connection to the database failed.")
+
+    # Get the purchases of each day, the most recent first
+    cursor.execute(
+        f"""
+            SELECT date_,
+                    amount_sum,
+                    total_count
+            FROM daily_aggregates
+            WHERE transaction_type = 'Compra' AND
+                    {get_backend().weekday("date_")} = ?
+            ORDER BY date_ DESC
+        """,
+        (weekday,),
+    )
+
+    # Get the summary
+    transactions = cursor.fetchall()
+
+    # Close the connection
+    cursor.close()
+
+    if len(transactions) == 0:
         return {}
 
-    # Get the summary with the correct type
-    if len(transactions) > 0:
-        # Compute the values
-        summary = {
-            "mean_number_of_purchases": np.mean(
-                [transaction[2] for transaction in transactions]
-            ),
-            "median_amount_of_purchases": np.median(
-                [transaction[1] for transaction in transactions]
-            ),
-        }
-    else:
-        summary = {}
+    import numpy as np
+
+    # The days without purchases are not in the aggregates, so each day
+    # like today is looked up, from the first day with purchases to the
+    # last complete one, the most recent first. SQLite returns the dates as
+    # text.
+    purchases_by_date = {
+        datetime.date.fromisoformat(transaction[0])
+        if isinstance(transaction[0], str)
+        else transaction[0]: transaction[1:]
+        for transaction in transactions
+    }
+    today = today or datetime.date.today()
+    last_date = today - datetime.timedelta(
+        days=(today.isoweekday() - weekday - 1) % 7 + 1
+    )
+    first_date = min(purchases_by_date)
+    dates = []
+    while last_date >= first_date:
+        dates.append(last_date)
+        last_date -= datetime.timedelta(weeks=1)
+    if len(dates) == 0:
+        return {}
+
+    amounts = np.array(
+        [purchases_by_date.get(date_, (0.0, 0))[0] for date_ in dates]
+    )
+    counts = [purchases_by_date.get(date_, (0.0, 0))[1] for date_ in dates]
+    p10, p50, p90 = np.percentile(amounts, [10, 50, 90])
+
+    # Compute the values
+    summary = {
+        "mean_number_of_purchases": np.mean(counts),
+        "median_amount_of_purchases": p50,
+        "p10_amount_of_purchases": p10,
+        "p90_amount_of_purchases": p90,
+        "trailing_median_amount_of_purchases": np.median(amounts[:weeks]),
+    }
 
     return summary
 
@@ -263,40 +653,168 @@ def get_transactions_with_labels(
     List[TransactionInfo]
         The transactions with the labels.
     """
-    try:
-        cursor = get_cursor()
+    cursor = get_cursor()
+    if cursor is None:
+        raise ConnectionError("The connection to the database failed.")
 
-        # Get the transactions
-        cursor.execute(
-            """
-            SELECT t.merchant, t.datetime, g.category, g.similarity
-            FROM [dbo].[transactions] AS t
-            LEFT JOIN [dbo].[categories_trx] AS g
-            ON (t.merchant = g.merchant AND t.datetime = g.datetime)
-            WHERE t.transaction_type = 'Compra' AND t.datetime >= ? 
-            AND g.category IS NOT NULL
-            """,
-            date_from.date(),
+    # Get the transactions
+    cursor.execute(
+        """
+        SELECT t.merchant, t.datetime, g.category, g.similarity
+        FROM transactions AS t
+        LEFT JOIN categories_trx AS g
+        ON (t.merchant_id = g.merchant_id AND t.datetime = g.datetime)
+        WHERE t.transaction_type = 'Compra' AND t.datetime >= ? 
+        AND g.category IS NOT NULL
+        """,
+        (date_from.date(),),
+    )
+    transactions_from_db = cursor.fetchall()
+
+    # Close the connection
+    cursor.close()
+
+    # Get the transactions with the correct type
+    if len(transactions_from_db) > 0:
+        transactions = [
+            LabeledTransactionInfo(
+                merchant=str(transaction[0]),
+                datetime=transaction[1],
+                category=str(transaction[2]),
+                similarity=transaction[3],
+            )
+            for transaction in transactions_from_db
+        ]
+    else:
+        transactions = []
+
+    return transactions
+
+
+def check_connection() -> None:
+    """
+    This function checks the connection to the database. An exception is
+    raised if the database is not available.
+    """
+    cursor = get_cursor()
+    cursor.execute("SELECT COUNT(*) FROM transactions WHERE 1 = 0")
+    cursor.fetchall()
+    cursor.close()
+
+
+def are_there_transactions_without_label() -> bool:
+    """
+    This function checks if there are purchases without labels. An
+    exception is raised if the database is not available.
+
+    Returns
+    -------
+    bool
+        If True, there are transactions without labels.
+    """
+    backend = get_backend()
+    cursor = get_cursor()
+
+    # Check if there is at least one transaction without label
+    cursor.execute(
+        f"""
+        SELECT CASE WHEN EXISTS (
+            SELECT 1
+            FROM transactions AS t
+            LEFT JOIN categories_trx AS g
+            ON (
+                {backend.datetime("t.datetime")}
+                    = {backend.datetime("g.datetime")}
+                AND t.merchant_id = g.merchant_id
+            )
+            WHERE transaction_type = 'Compra' AND g.category IS NULL
+        ) THEN 1 ELSE 0 END;
+        """
+    )
+    without_label = cursor.fetchone()[0]
+    cursor.close()
+
+    return without_label == 1
+
+
+def get_full_transaction_rows_with_labels(
+    start_date: datetime.date, end_date: datetime.date
+) -> List[Dict[str, Any]]:
+    """
+    This function returns all the transactions between two dates with
+    their labels. The rows are returned as dictionaries, so they are
+    serialised directly. An exception is raised if the database is not
+    available.
+
+    Parameters
+    ----------
+    start_date : datetime.date
+        The start date to search.
+    end_date : datetime.date
+        The end date to search.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The fields of the transactions with the labels.
+    """
+    backend = get_backend()
+    cursor = get_cursor()
+
+    # Obtain the rows
+    cursor.execute(
+        f"""
+        SELECT
+                t.transaction_type,
+                t.amount,
+                t.merchant,
+                t.datetime,
+                t.payment_method,
+                t.email_log_id,
+                g.category,
+                g.similarity
+        FROM transactions AS t
+        LEFT JOIN categories_trx AS g
+        ON (
+            {backend.datetime("t.datetime")}
+                = {backend.datetime("g.datetime")}
+            AND t.merchant_id = g.merchant_id
         )
-        transactions_from_db = cursor.fetchall()
+        WHERE {backend.date("t.datetime")} BETWEEN ? AND ?
+        ORDER BY t.datetime DESC;
+        """,
+        (start_date, end_date),
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    # The category is "None" for the transactions without label
+    return [
+        {**get_transaction_row(transaction), "category": str(transaction[6])}
+        for transaction in rows
+    ]
+
+
+def get_full_transactions_with_labels(
+    start_date: datetime.date, end_date: datetime.date
+) -> List[LabeledTransactionInfoFull]:
+    """
+    This function returns all the transactions between two dates with
+    their labels. An exception is raised if the database is not available.
 
-        # Close the connection
-        cursor.close()
+    Parameters
+    ----------
+    start_date : datetime.date
+        The start date to search.
+    end_date : datetime.date
+        The end date to search.
 
-        # Get the transactions with the correct type
-        if len(transactions_from_db) > 0:
-            transactions = [
-                LabeledTransactionInfo(
-                    merchant=str(transaction[0]),
-                    datetime=transaction[1],
-                    category=str(transaction[2]),
-                    similarity=transaction[3],
-                )
-                for transaction in transactions_from_db
-            ]
-        else:
-            transactions = []
-
-        return transactions
-    except Exception:
-        return []
+    Returns
+    -------
+    List[LabeledTransactionInfoFull]
+        The transactions with the labels.
+    """
+    return [
+        LabeledTransactionInfoFull(**row)
+        for row in get_full_transaction_rows_with_labels(start_date, end_date)
+    ]
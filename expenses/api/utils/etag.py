@@ -0,0 +1,45 @@
+import hashlib
+
+from fastapi import Request
+
+
+def compute_etag(*parts) -> str:
+    """
+    This function computes a strong ETag from the given parts. The parts
+    must identify the response, for example the endpoint, the date to
+    search and the version of the data.
+
+    Returns
+    -------
+    str
+        The quoted ETag.
+    """
+    digest = hashlib.sha1(
+        "|".join(str(part) for part in parts).encode("utf-8")
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    This function checks if the ETag matches the If-None-Match header of
+    the request, that is, if the client already has the response.
+
+    Parameters
+    ----------
+    request : Request
+        The request received.
+    etag : str
+        The ETag of the current response.
+
+    Returns
+    -------
+    bool
+        If True, the response was not modified.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
@@ -0,0 +1,161 @@
+import datetime
+from typing import TYPE_CHECKING, Any, Optional
+
+from expenses.api.utils.backends import get_backend
+from expenses.api.utils.database import get_cursor
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+# Transaction types of the expenses used by the anomaly model
+ANOMALY_TRANSACTION_TYPES_ = ["Compra", "QR", "Transferencia"]
+
+# Features of each day, in the order used by the model
+FEATURE_COLUMNS_ = ["avg_amount", "max_amount", "total_trx", "weekend"]
+
+
+def get_query_to_compute_features(date_filter: str = "") -> str:
+    """
+    This function returns the query that computes the features of each day
+    from the daily aggregates. Training and serving read the features
+    computed by this query, so both use the same definition.
+
+    Parameters
+    ----------
+    date_filter : str, optional
+        The conditions on date_ added to the query, e.g. "AND date_ = ?".
+
+    Returns
+    -------
+    str
+        The query that returns date_ and the features of each day.
+    """
+    backend = get_backend()
+    transaction_types = ", ".join(
+        f"'{transaction_type}'"
+        for transaction_type in ANOMALY_TRANSACTION_TYPES_
+    )
+
+    return f"""
+        SELECT
+            date_,
+            (-1) * SUM(amount_sum) / SUM(total_count) AS avg_amount,
+            (-1) * MIN(amount_min) AS max_amount,
+            SUM(total_count) AS total_trx,
+            CASE WHEN {backend.weekday("date_")} >= 6 THEN 1 ELSE 0 END
+                AS weekend
+        FROM daily_aggregates
+        WHERE transaction_type IN ({transaction_types}) {date_filter}
+        GROUP BY date_
+        """
+
+
+def _get_query_to_insert_features(date_filter: str = "") -> str:
+    """
+    This function returns the query that saves the features of the days in
+    the table of the features.
+    """
+    columns = ", ".join(["date_"] + FEATURE_COLUMNS_)
+    return f"""
+        INSERT INTO anomaly_features ({columns})
+        {get_query_to_compute_features(date_filter)}
+        """
+
+
+def update_anomaly_features(cursor: Any, date_: datetime.date) -> None:
+    """
+    This function computes again the features of a day after its daily
+    aggregates changed. The change is not committed, so it is committed
+    with the aggregates.
+
+    Parameters
+    ----------
+    cursor : Cursor
+        The cursor to the database.
+    date_ : datetime.date
+        The day to update.
+    """
+    cursor.execute("DELETE FROM anomaly_features WHERE date_ = ?", (date_,))
+    cursor.execute(
+        _get_query_to_insert_features("AND date_ = ?"), (date_,)
+    )
+
+
+def rebuild_anomaly_features() -> int:
+    """
+    This function computes again the features of all the days from the
+    daily aggregates. The table is created by the backend, so it is also
+    used to backfill the features.
+
+    Returns
+    -------
+    int
+        The number of days with features.
+    """
+    cursor = get_cursor()
+
+    # Compute again all the features in the same transaction
+    cursor.execute("DELETE FROM anomaly_features;")
+    cursor.execute(_get_query_to_insert_features())
+    cursor.execute("SELECT COUNT(*) FROM anomaly_features;")
+    total_rows = cursor.fetchone()[0]
+    cursor.connection.commit()
+    cursor.close()
+
+    return total_rows
+
+
+def get_anomaly_features(
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+) -> "DataFrame":
+    """
+    This function returns the features of each day, used to train the
+    anomaly model and to predict. pandas is imported here, only when the
+    features are read.
+
+    Parameters
+    ----------
+    date_from : Optional[datetime.date]
+        The start date (inclusive). If None, from the first day.
+    date_to : Optional[datetime.date]
+        The end date (inclusive). If None, until the last day.
+
+    Returns
+    -------
+    DataFrame
+        The date, avg_amount, max_amount, total_trx and weekend of each
+        day.
+    """
+    import numpy as np
+    from pandas import read_sql, to_datetime
+
+    # Filter the days of the range
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("date_ >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("date_ <= ?")
+        params.append(date_to)
+    date_filter = (
+        "WHERE " + " AND ".join(conditions) if len(conditions) > 0 else ""
+    )
+
+    conn, _ = get_cursor(return_conn=True)
+    df = read_sql(
+        f"""
+        SELECT date_, {", ".join(FEATURE_COLUMNS_)}
+        FROM anomaly_features
+        {date_filter}
+        ORDER BY date_ DESC;
+        """,
+        conn,
+        params=tuple(params),
+    )
+    conn.close()
+
+    df["date_"] = to_datetime(df["date_"])
+    df["weekend"] = df["weekend"].astype(np.int64)
+
+    return df
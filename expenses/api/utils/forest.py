@@ -0,0 +1,298 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict
+
+import numpy as np
+
+# Arrays of the nodes of the trees, each one saved in a .npy file
+NODE_ARRAYS_ = ["feature", "threshold", "left", "right", "value"]
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """
+    This function returns the average path length of an unsuccessful
+    search in a binary search tree of n samples, used to normalise the
+    depths of the isolation trees.
+
+    Parameters
+    ----------
+    n_samples : np.ndarray
+        The number of samples.
+
+    Returns
+    -------
+    np.ndarray
+        The average path length for each number of samples.
+    """
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    lengths[large] = 2.0 * (
+        np.log(n_samples[large] - 1.0) + np.euler_gamma
+    ) - 2.0 * (n_samples[large] - 1.0) / n_samples[large]
+
+    return lengths
+
+
+class CompactForest:
+    """
+    This class is an isolation forest saved as flat NumPy arrays, with a
+    scorer in pure NumPy. The nodes of all the trees are in the same
+    arrays, so the model is loaded with a memory map instead of
+    unpickling the estimators of sklearn, and all the trees are traversed
+    together.
+
+    The scores are the same of IsolationForest.score_samples and offset_
+    is the threshold of the predictions, so it is used as the model.
+
+    Parameters
+    ----------
+    nodes : Dict[str, np.ndarray]
+        The feature, threshold, left and right children and value of each
+        node. The children of a leaf are the leaf itself, and its value is
+        its depth plus the average path length of its samples.
+    roots : np.ndarray
+        The index of the root of each tree.
+    offset : float
+        The threshold of the scores of the anomalies.
+    denominator : float
+        The number of trees times the average path length of max_samples.
+    n_features : int
+        The number of features of the model.
+    """
+
+    def __init__(
+        self,
+        nodes: Dict[str, np.ndarray],
+        roots: np.ndarray,
+        offset: float,
+        denominator: float,
+        n_features: int,
+    ):
+        self.feature = nodes["feature"]
+        self.threshold = nodes["threshold"]
+        self.left = nodes["left"]
+        self.right = nodes["right"]
+        self.value = nodes["value"]
+        self.roots = roots
+        self.offset_ = offset
+        self.denominator = denominator
+        self.n_features_in_ = n_features
+
+        # The number of levels to traverse
+        self._max_depth = self._compute_max_depth()
+
+    def _compute_max_depth(self) -> int:
+        """
+        This function returns the depth of the deepest leaf.
+        """
+        depth, nodes = 0, np.asarray(self.roots)
+        while True:
+            nodes = nodes[self.left[nodes] != nodes]
+            if len(nodes) == 0:
+                return depth
+            nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+            depth += 1
+
+    @classmethod
+    def from_isolation_forest(cls, model: Any) -> "CompactForest":
+        """
+        This function converts a fitted IsolationForest of sklearn.
+
+        Parameters
+        ----------
+        model : IsolationForest
+            The fitted model.
+
+        Returns
+        -------
+        CompactForest
+            The same model as flat arrays.
+        """
+        subsample_features = model._max_features != model.n_features_in_
+
+        trees, roots, size = [], [], 0
+        for estimator, features in zip(
+            model.estimators_, model.estimators_features_
+        ):
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            indices = np.arange(tree.node_count) + size
+
+            # The features of the tree are indices of its subset
+            feature = np.maximum(tree.feature, 0)
+            if subsample_features:
+                feature = np.asarray(features)[feature]
+
+            # Depth of each node, the parents are before the children
+            depths = np.zeros(tree.node_count)
+            for node in np.flatnonzero(~is_leaf):
+                depths[tree.children_left[node]] = depths[node] + 1
+                depths[tree.children_right[node]] = depths[node] + 1
+
+            trees.append(
+                {
+                    "feature": feature,
+                    "threshold": tree.threshold,
+                    "left": np.where(
+                        is_leaf, indices, tree.children_left + size
+                    ),
+                    "right": np.where(
+                        is_leaf, indices, tree.children_right + size
+                    ),
+                    "value": np.where(
+                        is_leaf,
+                        depths + average_path_length(tree.n_node_samples),
+                        0.0,
+                    ),
+                }
+            )
+            roots.append(size)
+            size += tree.node_count
+
+        return cls(
+            nodes={
+                "feature": np.concatenate(
+                    [tree["feature"] for tree in trees]
+                ).astype(np.int32),
+                "threshold": np.concatenate(
+                    [tree["threshold"] for tree in trees]
+                ).astype(np.float64),
+                "left": np.concatenate(
+                    [tree["left"] for tree in trees]
+                ).astype(np.int32),
+                "right": np.concatenate(
+                    [tree["right"] for tree in trees]
+                ).astype(np.int32),
+                "value": np.concatenate(
+                    [tree["value"] for tree in trees]
+                ).astype(np.float64),
+            },
+            roots=np.array(roots, dtype=np.int32),
+            offset=float(model.offset_),
+            denominator=float(
+                len(model.estimators_)
+                * average_path_length([model._max_samples])[0]
+            ),
+            n_features=int(model.n_features_in_),
+        )
+
+    def save(self, path: str) -> None:
+        """
+        This function saves the model in a directory. The directory is
+        written with a temporary name and renamed, so a partial model is
+        never loaded.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the model. It must not exist.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        temp_path = tempfile.mkdtemp(dir=parent, prefix=".forest-")
+        try:
+            for name in NODE_ARRAYS_ + ["roots"]:
+                np.save(
+                    os.path.join(temp_path, f"{name}.npy"),
+                    getattr(self, name),
+                )
+            with open(os.path.join(temp_path, "meta.json"), "w") as f:
+                json.dump(
+                    {
+                        "offset": self.offset_,
+                        "denominator": self.denominator,
+                        "n_features": self.n_features_in_,
+                    },
+                    f,
+                )
+            os.replace(temp_path, path)
+        except Exception:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CompactForest":
+        """
+        This function loads a model saved in a directory. No code is
+        executed to load it, only arrays and numbers are read.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the model.
+        mmap : bool, optional
+            If True, the nodes are read from the files when they are used
+            and the pages are shared by the processes, by default True.
+
+        Returns
+        -------
+        CompactForest
+            The model.
+        """
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+        return cls(
+            nodes={
+                name: np.load(
+                    os.path.join(path, f"{name}.npy"),
+                    mmap_mode="r" if mmap else None,
+                    allow_pickle=False,
+                )
+                for name in NODE_ARRAYS_
+            },
+            roots=np.load(
+                os.path.join(path, "roots.npy"), allow_pickle=False
+            ),
+            offset=meta["offset"],
+            denominator=meta["denominator"],
+            n_features=meta["n_features"],
+        )
+
+    def score_samples(self, X: Any) -> np.ndarray:
+        """
+        This function returns the score of each row, as
+        IsolationForest.score_samples: the lower, the more abnormal.
+
+        Parameters
+        ----------
+        X : array-like of shape (n_samples, n_features)
+            The features.
+
+        Returns
+        -------
+        np.ndarray
+            The score of each row.
+        """
+        # The trees of sklearn compare the features as float32
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+
+        # Node of each row in each tree, all the trees are traversed
+        # together. The children of a leaf are the leaf, so the rows that
+        # reach a leaf stay there until the deepest leaf is reached.
+        positions = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self._max_depth):
+            goes_left = X[rows, self.feature[positions]] <= (
+                self.threshold[positions]
+            )
+            positions = np.where(
+                goes_left, self.left[positions], self.right[positions]
+            )
+
+        if self.denominator == 0:
+            return -np.ones(X.shape[0])
+
+        depths = self.value[positions].sum(axis=0)
+        return -(2 ** (-depths / self.denominator))
+
+    def predict(self, X: Any) -> np.ndarray:
+        """
+        This function returns -1 for the anomalies and 1 for the normal
+        rows, as IsolationForest.predict.
+        """
+        return np.where(self.score_samples(X) < self.offset_, -1, 1)
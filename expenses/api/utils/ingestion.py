@@ -0,0 +1,295 @@
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+
+class IngestionBuffer:
+    """
+    This class decouples the parsing of the emails from the writes to the
+    database. The parsed transactions are put in a bounded queue, and a
+    writer thread takes them in batches: a batch is written when it has
+    batch_size rows or when flush_interval_ms passed since its first row.
+
+    If the writer fails, the batch is appended to the spill file, if it is
+    configured, and the spilled rows are written again when the queue is
+    idle, at most every 5 seconds while they fail. Without a spill file the
+    batch is retried max_retries times and then its rows are failed, so a
+    producer never waits for a database that is down.
+
+    Parameters
+    ----------
+    writer : Callable[[List[Tuple]], List[bool]]
+        The function that writes a batch of rows. It returns, for each row,
+        if it was inserted.
+    max_size : int
+        The maximum number of rows in the queue.
+    batch_size : int
+        The maximum number of rows of a batch.
+    flush_interval_ms : int
+        The maximum time a row waits for its batch to be completed.
+    spill_path : Optional[str]
+        The path of the append-only spill file. If None, there is no spill.
+    max_retries : int
+        The number of times a batch is retried without a spill file, by
+        default 3.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[Tuple]], List[bool]],
+        max_size: int = 1000,
+        batch_size: int = 100,
+        flush_interval_ms: int = 200,
+        spill_path: Optional[str] = None,
+        max_retries: int = 3,
+    ):
+        self._writer = writer
+        self._queue = queue.Queue(maxsize=max_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._spill_path = spill_path
+        self._max_retries = max_retries
+        self._next_replay = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Metrics of the stages
+        self._started_at = time.monotonic()
+        self._produced = 0
+        self._written = 0
+        self._inserted = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._failed_rows = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._writer_seconds = 0.0
+        self._last_batch_ms = None
+
+    def _start(self) -> None:
+        """
+        This function starts the writer thread, the first time a row is
+        put in the queue.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ingestion-writer", daemon=True
+                )
+                self._thread.start()
+
+    def put(
+        self,
+        row: Tuple,
+        on_written: Optional[Callable[[bool], None]] = None,
+        on_failed: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        """
+        This function puts a row in the queue. It waits if the queue is
+        full.
+
+        Parameters
+        ----------
+        row : Tuple
+            The row to write.
+        on_written : Callable[[bool], None], optional
+            A function called with True if the row was inserted, or False
+            if it already existed or it was spilled.
+        on_failed : Callable[[Exception], None], optional
+            A function called with the error of the writer if the row could
+            not be written nor spilled.
+        """
+        self._start()
+        self._queue.put((row, on_written, on_failed))
+        with self._lock:
+            self._produced += 1
+
+    def flush(self) -> None:
+        """
+        This function waits until all the rows in the queue are written or
+        spilled.
+        """
+        self._queue.join()
+
+    def _run(self) -> None:
+        """
+        This function is the loop of the writer thread.
+        """
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self._flush_interval)]
+            except queue.Empty:
+                # Write the spilled rows when the queue is idle
+                self._replay_spill()
+                continue
+
+            # Complete the batch until it is full or the interval passes
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch: List[Tuple]) -> None:
+        """
+        This function writes a batch. If it fails, the batch is spilled or
+        retried, and its rows are failed when the retries are exhausted.
+        """
+        rows = [row for row, _, _ in batch]
+        retry_seconds = self._flush_interval
+        error = None
+
+        for attempt in range(self._max_retries + 1):
+            start = time.monotonic()
+            try:
+                inserted = self._writer(rows)
+                written = len(rows)
+                break
+            except Exception as e:
+                print(f"The batch of {len(rows)} rows failed: {e}")
+                with self._lock:
+                    self._failed_batches += 1
+
+                if self._spill_path is not None:
+                    self._spill(rows)
+                    inserted = [False] * len(rows)
+                    written = 0
+                    break
+
+                error = e
+                if attempt < self._max_retries:
+                    time.sleep(retry_seconds)
+                    retry_seconds = min(2 * retry_seconds, 5)
+        else:
+            with self._lock:
+                self._failed_rows += len(rows)
+            for _, _, on_failed in batch:
+                if on_failed is None:
+                    continue
+                # The callbacks must not stop the writer
+                try:
+                    on_failed(error)
+                except Exception:
+                    pass
+            return
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._batches += 1
+            self._written += written
+            self._inserted += sum(inserted)
+            self._writer_seconds += elapsed
+            self._last_batch_ms = 1000 * elapsed
+
+        for (_, on_written, _), row_inserted in zip(batch, inserted):
+            if on_written is None:
+                continue
+            # The callbacks must not stop the writer
+            try:
+                on_written(row_inserted)
+            except Exception:
+                pass
+
+    def _spill(self, rows: List[Tuple]) -> None:
+        """
+        This function appends the rows to the spill file.
+        """
+        with open(self._spill_path, "a") as f:
+            for row in rows:
+                f.write(
+                    json.dumps(
+                        [
+                            value.isoformat()
+                            if isinstance(value, datetime.datetime)
+                            else value
+                            for value in row
+                        ]
+                    )
+                    + "\n"
+                )
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            self._spilled += len(rows)
+
+    def _replay_spill(self) -> None:
+        """
+        This function writes the rows of the spill file. The file is
+        removed only if all of them were written, and the writes are
+        idempotent, so a row is not lost nor duplicated.
+        """
+        if self._spill_path is None or time.monotonic() < self._next_replay:
+            return
+
+        # The new spills while replaying go to a new file
+        replay_path = self._spill_path + ".replay"
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self._spill_path):
+                return
+            os.replace(self._spill_path, replay_path)
+
+        with open(replay_path, "r") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            # The datetime of the transaction is the fourth value
+            row[3] = datetime.datetime.fromisoformat(row[3])
+
+        inserted = 0
+        try:
+            for start in range(0, len(rows), self._batch_size):
+                batch = rows[start:start + self._batch_size]
+                inserted += sum(self._writer([tuple(row) for row in batch]))
+        except Exception as e:
+            print(f"The spilled rows could not be written: {e}")
+            self._next_replay = time.monotonic() + 5
+            return
+
+        os.remove(replay_path)
+        with self._lock:
+            self._written += len(rows)
+            self._inserted += inserted
+            self._replayed += len(rows)
+
+    def metrics(self) -> dict:
+        """
+        This function returns the metrics of the stages: the rows put by
+        the parsers and written by the writer, their throughput and the
+        depth of the queue.
+
+        Returns
+        -------
+        dict
+            The metrics of the buffer.
+        """
+        with self._lock:
+            uptime = time.monotonic() - self._started_at
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_max_size": self._queue.maxsize,
+                "produced": self._produced,
+                "written": self._written,
+                "inserted": self._inserted,
+                "batches": self._batches,
+                "failed_batches": self._failed_batches,
+                "failed_rows": self._failed_rows,
+                "spilled": self._spilled,
+                "replayed": self._replayed,
+                "produced_rows_per_second": self._produced / uptime,
+                "writer_rows_per_second": self._written / self._writer_seconds
+                if self._writer_seconds > 0
+                else None,
+                "last_batch_ms": self._last_batch_ms,
+            }
@@ -0,0 +1,189 @@
+import datetime
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class JobCancelled(Exception):
+    """
+    This exception is raised inside a job when it was cancelled, to stop
+    it at the next report of progress.
+    """
+
+
+class Job:
+    """
+    This class represents a job executed in background. The function of
+    the job reports its progress with counters, e.g. the emails fetched,
+    and the status of the job is polled by the clients.
+
+    Parameters
+    ----------
+    name : str
+        The name of the job.
+    """
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = "queued"
+        self.progress: Dict[str, int] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.datetime.now()
+        self.started_at: Optional[datetime.datetime] = None
+        self.finished_at: Optional[datetime.datetime] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def report(self, counter: str, value: int = 1) -> None:
+        """
+        This function adds the value to a counter of the progress. If the
+        job was cancelled, JobCancelled is raised so the job stops.
+
+        Parameters
+        ----------
+        counter : str
+            The name of the counter.
+        value : int, optional
+            The value to add, by default 1.
+        """
+        with self._lock:
+            self.progress[counter] = self.progress.get(counter, 0) + value
+
+        if self.is_cancelled():
+            raise JobCancelled()
+
+    def cancel(self) -> None:
+        """
+        This function requests the cancellation of the job.
+        """
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def to_dict(self) -> dict:
+        """
+        This function returns the status of the job.
+        """
+        with self._lock:
+            progress = dict(self.progress)
+
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    This class executes the jobs in an in-process pool of workers and keeps
+    the last jobs to answer their status.
+
+    Parameters
+    ----------
+    max_workers : int
+        The number of jobs executed at the same time.
+    max_jobs : int
+        The number of jobs kept. The oldest finished jobs are removed.
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 100):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="jobs"
+        )
+        self._max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run(self, job: Job, function: Callable, *args, **kwargs) -> None:
+        """
+        This function executes the function of the job and saves its
+        result or its error.
+        """
+        if job.is_cancelled():
+            job.status = "cancelled"
+            job.finished_at = datetime.datetime.now()
+            return
+
+        job.status = "running"
+        job.started_at = datetime.datetime.now()
+        try:
+            job.result = function(job, *args, **kwargs)
+            job.status = "completed"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.datetime.now()
+
+    def submit(self, name: str, function: Callable, *args, **kwargs) -> Job:
+        """
+        This function enqueues a job. The function receives the job as the
+        first argument, to report its progress.
+
+        Parameters
+        ----------
+        name : str
+            The name of the job.
+        function : Callable
+            The function of the job.
+        *args, **kwargs
+            The arguments of the function.
+
+        Returns
+        -------
+        Job
+            The job enqueued.
+        """
+        job = Job(name)
+        with self._lock:
+            self._jobs[job.id] = job
+
+            # Remove the oldest finished jobs
+            for job_id in list(self._jobs):
+                if len(self._jobs) <= self._max_jobs:
+                    break
+                if self._jobs[job_id].finished_at is not None:
+                    del self._jobs[job_id]
+
+        self._executor.submit(self._run, job, function, *args, **kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        This function returns the job, or None if it does not exist.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        This function requests the cancellation of the job. A running job
+        stops at its next report of progress.
+
+        Returns
+        -------
+        Optional[Job]
+            The job, or None if it does not exist.
+        """
+        job = self.get(job_id)
+        if job is not None and job.finished_at is None:
+            job.cancel()
+        return job
+
+
+job_manager = JobManager(max_workers=int(os.getenv("JOBS_MAX_WORKERS", 2)))
@@ -0,0 +1,411 @@
+import datetime
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from expenses.api.schemas import SummaryMerchant
+from expenses.api.utils.backends import get_backend
+from expenses.api.utils.database import get_cursor
+
+# Suffixes of the legal names that are not part of the merchant name
+LEGAL_SUFFIXES_ = {"SA", "SAS", "LTDA", "SRL", "CIA", "INC", "LLC", "BIC"}
+
+# Brands whose transactions are registered with the name of the store or
+# the service after the brand, e.g. "RAPPI SUPERMERCADOS".
+MERCHANT_BRANDS_ = {
+    "AMAZON",
+    "CABIFY",
+    "CARULLA",
+    "DIDI",
+    "EXITO",
+    "JUMBO",
+    "NETFLIX",
+    "OLIMPICA",
+    "RAPPI",
+    "SPOTIFY",
+    "UBER",
+}
+
+
+def canonicalize_merchant(merchant: Optional[str]) -> str:
+    """
+    This function returns the canonical name of a merchant, so the same
+    merchant written with different spacing, accents, punctuation or
+    suffixes has a single name.
+
+    Parameters
+    ----------
+    merchant : Optional[str]
+        The name of the merchant, as it comes in the email.
+
+    Returns
+    -------
+    str
+        The canonical name. It is empty if there is no merchant.
+    """
+    if merchant is None:
+        return ""
+
+    # Remove the accents and the punctuation
+    name = (
+        unicodedata.normalize("NFKD", merchant)
+        .encode("ascii", "ignore")
+        .decode("ascii")
+        .upper()
+        .replace(".", "")
+    )
+    tokens = re.sub(r"[^A-Z0-9&]+", " ", name).split()
+
+    # Remove the legal suffixes and the numbers of the branches
+    while len(tokens) > 1 and (
+        tokens[-1] in LEGAL_SUFFIXES_ or tokens[-1].isdigit()
+    ):
+        tokens.pop()
+
+    if len(tokens) > 0 and tokens[0] in MERCHANT_BRANDS_:
+        return tokens[0]
+
+    return " ".join(tokens)
+
+
+class MerchantDictionary:
+    """
+    This class keeps in memory the ids and the names of the merchants
+    table, so the transactions are saved and grouped by the id of the
+    merchant and the names are only resolved in the response.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+
+    def _add(self, merchant_id: int, name: str) -> None:
+        with self._lock:
+            self._ids[name] = merchant_id
+            self._names[merchant_id] = name
+
+    def load(self, cursor: Any) -> None:
+        """
+        This function loads all the merchants of the database.
+
+        Parameters
+        ----------
+        cursor : Cursor
+            The cursor to the database.
+        """
+        cursor.execute("SELECT merchant_id, name FROM merchants")
+        for merchant_id, name in cursor.fetchall():
+            self._add(merchant_id, name)
+
+    def get_id(self, cursor: Any, merchant: Optional[str]) -> Optional[int]:
+        """
+        This function returns the id of the merchant. If the merchant is
+        new, it is added to the merchants table without a commit, so it is
+        committed with the transaction of the caller. If the caller rolls
+        back, the merchants in memory must be invalidated.
+
+        Parameters
+        ----------
+        cursor : Cursor
+            The cursor to the database.
+        merchant : Optional[str]
+            The name of the merchant, as it comes in the email.
+
+        Returns
+        -------
+        Optional[int]
+            The id of the merchant, or None if there is no merchant.
+        """
+        name = canonicalize_merchant(merchant)
+        if name == "":
+            return None
+
+        merchant_id = self._ids.get(name)
+        if merchant_id is not None:
+            return merchant_id
+
+        cursor.execute(
+            """
+            INSERT INTO merchants (name)
+            SELECT ?
+            WHERE NOT EXISTS (SELECT 1 FROM merchants WHERE name = ?)
+            """,
+            (name, name),
+        )
+        cursor.execute(
+            "SELECT merchant_id FROM merchants WHERE name = ?", (name,)
+        )
+        merchant_id = cursor.fetchone()[0]
+        self._add(merchant_id, name)
+
+        return merchant_id
+
+    def get_names(
+        self, merchant_ids: Iterable[int], cursor: Any = None
+    ) -> Dict[int, str]:
+        """
+        This function returns the names of the merchants. If a merchant is
+        not in memory, the merchants are loaded from the database.
+
+        Parameters
+        ----------
+        merchant_ids : Iterable[int]
+            The ids of the merchants.
+        cursor : Cursor, optional
+            The cursor to the database. If None, a new connection is used
+            when the merchants are loaded.
+
+        Returns
+        -------
+        Dict[int, str]
+            The name of each merchant.
+        """
+        merchant_ids = list(merchant_ids)
+        if not set(merchant_ids).issubset(self._names):
+            if cursor is None:
+                new_cursor = get_cursor()
+                self.load(new_cursor)
+                new_cursor.close()
+            else:
+                self.load(cursor)
+
+        return {
+            merchant_id: self._names.get(merchant_id, "")
+            for merchant_id in merchant_ids
+        }
+
+    def invalidate(self) -> None:
+        """
+        This function removes the merchants from memory.
+        """
+        with self._lock:
+            self._ids.clear()
+            self._names.clear()
+
+
+merchant_dictionary = MerchantDictionary()
+
+
+def rebuild_merchants() -> int:
+    """
+    This function creates the merchants table if it does not exist and
+    sets the merchant_id of the transactions and the labels from the name
+    of the merchant. It is used to backfill the ids.
+
+    Returns
+    -------
+    int
+        The number of merchants.
+    """
+    cursor = get_cursor()
+    for query in get_backend().get_queries_to_create_merchants():
+        cursor.execute(query)
+    cursor.connection.commit()
+
+    merchant_dictionary.invalidate()
+    merchant_dictionary.load(cursor)
+
+    cursor.execute("SELECT DISTINCT merchant FROM transactions")
+    ids = [
+        (merchant_dictionary.get_id(cursor, row[0]), row[0])
+        for row in cursor.fetchall()
+    ]
+
+    # The labels have the same name of the merchant of the transactions
+    cursor.executemany(
+        "UPDATE transactions SET merchant_id = ? WHERE merchant = ?", ids
+    )
+    cursor.executemany(
+        "UPDATE categories_trx SET merchant_id = ? WHERE merchant = ?", ids
+    )
+    cursor.connection.commit()
+
+    cursor.execute("SELECT COUNT(*) FROM merchants")
+    total_merchants = cursor.fetchone()[0]
+    cursor.close()
+
+    return total_merchants
+
+
+def get_merchants_values(
+    date_from: datetime.datetime,
+) -> List[SummaryMerchant]:
+    """
+    This function returns the merchants and the values of the day. The
+    transactions are grouped by the id of the merchant.
+
+    Parameters
+    ----------
+    date_from : datetime.datetime
+        The date to search.
+    """
+    cursor = get_cursor()
+    if cursor is None:
+        raise ConnectionError("The connection to the database failed.")
+
+    # Get the transactions
+    cursor.execute(
+        """
+        SELECT
+            merchant_id,
+            SUM(amount) AS amount,
+            COUNT(*) AS count
+        FROM transactions
+        WHERE datetime >= ? AND transaction_type = 'Compra'
+        AND merchant_id IS NOT NULL
+        GROUP BY merchant_id
+        ORDER BY amount DESC
+        """,
+        (date_from.date(),),
+    )
+
+    # Get the merchants
+    merchants_inform = cursor.fetchall()
+    names = merchant_dictionary.get_names(
+        [merchant[0] for merchant in merchants_inform], cursor
+    )
+
+    # Close the connection
+    cursor.close()
+
+    # Get the transactions with the correct type
+    return [
+        SummaryMerchant(
+            merchant=names[merchant[0]],
+            amount=merchant[1],
+            count=merchant[2],
+        )
+        for merchant in merchants_inform
+    ]
+
+
+def get_merchant_daily_amounts(date_from: datetime.date) -> List[Tuple]:
+    """
+    This function returns the amount and the number of the purchases of
+    each merchant and day from the date given.
+
+    Parameters
+    ----------
+    date_from : datetime.date
+        The start date (inclusive).
+
+    Returns
+    -------
+    List[Tuple]
+        The date, the id of the merchant, the amount and the number of the
+        purchases.
+    """
+    date_ = get_backend().date("datetime")
+
+    cursor = get_cursor()
+    cursor.execute(
+        f"""
+        SELECT {date_} AS date_,
+                merchant_id,
+                SUM(amount) AS amount,
+                COUNT(*) AS count
+        FROM transactions
+        WHERE transaction_type = 'Compra' AND merchant_id IS NOT NULL
+        AND datetime >= ?
+        GROUP BY {date_}, merchant_id
+        """,
+        (datetime.datetime.combine(date_from, datetime.time()),),
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    # SQLite returns the dates as text
+    return [
+        (
+            datetime.date.fromisoformat(row[0])
+            if isinstance(row[0], str)
+            else row[0],
+            row[1],
+            row[2],
+            row[3],
+        )
+        for row in rows
+    ]
+
+
+def get_recent_expenses(
+    date_from: datetime.date, transaction_types: List[str]
+) -> List[Tuple]:
+    """
+    This function returns the expenses of the types given from the date
+    given, from the oldest to the newest.
+
+    Parameters
+    ----------
+    date_from : datetime.date
+        The start date (inclusive).
+    transaction_types : List[str]
+        The types of the transactions.
+
+    Returns
+    -------
+    List[Tuple]
+        The date, the merchant and the amount of each expense.
+    """
+    date_ = get_backend().date("datetime")
+    placeholders = ", ".join("?" for _ in transaction_types)
+
+    cursor = get_cursor()
+    cursor.execute(
+        f"""
+        SELECT {date_} AS date_, merchant, amount
+        FROM transactions
+        WHERE transaction_type IN ({placeholders})
+        AND datetime >= ?
+        ORDER BY datetime
+        """,
+        tuple(transaction_types)
+        + (datetime.datetime.combine(date_from, datetime.time()),),
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    # SQLite returns the dates as text
+    return [
+        (
+            datetime.date.fromisoformat(row[0])
+            if isinstance(row[0], str)
+            else row[0],
+            row[1],
+            row[2],
+        )
+        for row in rows
+    ]
+
+
+def get_merchant_categories() -> Dict[int, str]:
+    """
+    This function returns the category of each merchant: the most common
+    category of the labels of its transactions.
+
+    Returns
+    -------
+    Dict[int, str]
+        The category of each merchant.
+    """
+    cursor = get_cursor()
+    cursor.execute(
+        """
+        SELECT merchant_id, category, COUNT(*) AS count
+        FROM categories_trx
+        WHERE merchant_id IS NOT NULL AND category IS NOT NULL
+        GROUP BY merchant_id, category
+        """
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    categories, counts = {}, {}
+    for merchant_id, category, count in rows:
+        if count > counts.get(merchant_id, 0):
+            categories[merchant_id] = category
+            counts[merchant_id] = count
+
+    return categories
@@ -0,0 +1,322 @@
+import collections
+import datetime
+import json
+import os
+import threading
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+from expenses.api.utils.anomaly import model_cache
+from expenses.api.utils.features import FEATURE_COLUMNS_
+
+
+class OnlineAnomalyDetector:
+    """
+    This class keeps the features of the anomaly model of the recent days
+    up to date as the transactions are inserted, and scores a day again
+    each time it changes. When the score of a day crosses the threshold
+    of the model, an event is saved and sent to the listeners. The days
+    are scored in a background thread, so the insertions do not wait for
+    the model.
+
+    The count, the sum and the minimum of the amounts of each day are kept
+    in memory. The first transaction of a day reads the features of the
+    day from the database, the next ones only update them.
+
+    Parameters
+    ----------
+    max_age_days : int
+        The number of days before today that are scored, by default 1. The
+        older transactions, e.g. of a backfill, do not emit events.
+    max_events : int
+        The number of events kept in memory, by default 100.
+    threshold : Optional[float]
+        The score below which a day is an anomaly. If None, the offset_ of
+        the model is used, as its predictions.
+    """
+
+    def __init__(
+        self,
+        max_age_days: int = 1,
+        max_events: int = 100,
+        threshold: Optional[float] = None,
+    ):
+        self._max_age_days = max_age_days
+        self._threshold = threshold
+        self._lock = threading.Lock()
+        self._events = collections.deque(maxlen=max_events)
+        self._next_event_id = 1
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        This function removes the features of the days, so they are read
+        again from the database. It must be called when an insertion is
+        rolled back.
+        """
+        with self._lock:
+            # Count, sum and minimum of the amounts, score and state of
+            # each day
+            self._days: Dict[datetime.date, Dict[str, Any]] = {}
+            self._pending = set()
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        This function adds a function called with each new event.
+        """
+        self._listeners.append(listener)
+
+    def _is_recent(self, date_: datetime.date) -> bool:
+        days_ago = (datetime.date.today() - date_).days
+        return 0 <= days_ago <= self._max_age_days
+
+    def _read_day(
+        self, cursor: Any, date_: datetime.date
+    ) -> Optional[Dict[str, Any]]:
+        """
+        This function reads the features of a day from the database. The
+        transaction being inserted is already in them.
+        """
+        cursor.execute(
+            """
+            SELECT total_trx, avg_amount, max_amount
+            FROM anomaly_features
+            WHERE date_ = ?
+            """,
+            (date_,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        count, avg_amount, max_amount = row
+
+        # The amounts of the expenses are negative
+        return {
+            "count": int(count),
+            "amount_sum": -avg_amount * count,
+            "amount_min": -max_amount,
+            "score": None,
+            "anomaly": False,
+        }
+
+    def add(
+        self, cursor: Any, date_: datetime.date, amount: float
+    ) -> None:
+        """
+        This function adds a new transaction to the features of its day.
+        The day is scored in the next call to score_pending, after
+        schedule_scoring is called.
+
+        Parameters
+        ----------
+        cursor : Cursor
+            The cursor of the insertion, used to read the features of the
+            day the first time.
+        date_ : datetime.date
+            The date of the transaction.
+        amount : float
+            The amount of the transaction.
+        """
+        if not self._is_recent(date_):
+            return
+
+        with self._lock:
+            day = self._days.get(date_)
+            if day is not None:
+                day["count"] += 1
+                day["amount_sum"] += amount
+                day["amount_min"] = min(day["amount_min"], amount)
+            else:
+                self._days[date_] = self._read_day(cursor, date_) or {
+                    "count": 1,
+                    "amount_sum": amount,
+                    "amount_min": amount,
+                    "score": None,
+                    "anomaly": False,
+                }
+            self._pending.add(date_)
+
+            # The days that are not recent are not scored anymore
+            for old_date in [d for d in self._days if not self._is_recent(d)]:
+                del self._days[old_date]
+                self._pending.discard(old_date)
+
+    @staticmethod
+    def _features(date_: datetime.date, day: Dict[str, Any]) -> List[float]:
+        """
+        This function returns the features of a day, in the order of
+        FEATURE_COLUMNS_.
+        """
+        features = {
+            "avg_amount": -day["amount_sum"] / day["count"],
+            "max_amount": -day["amount_min"],
+            "total_trx": day["count"],
+            "weekend": 1 if date_.isoweekday() >= 6 else 0,
+        }
+        return [features[column] for column in FEATURE_COLUMNS_]
+
+    def score_pending(self) -> List[Dict[str, Any]]:
+        """
+        This function scores the days that changed since the last call, in
+        a single call to the model, and emits an event for each day whose
+        score crossed the threshold. If the model is not available, the
+        days are scored in the next call.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The new events.
+        """
+        with self._lock:
+            dates = sorted(self._pending)
+            rows = [
+                self._features(date_, self._days[date_]) for date_ in dates
+            ]
+        if len(dates) == 0:
+            return []
+
+        try:
+            model = model_cache.get()
+            scores = model.score_samples(rows)
+        except Exception as e:
+            print(f"The transactions could not be scored: {e}")
+            return []
+        threshold = (
+            self._threshold if self._threshold is not None else model.offset_
+        )
+
+        events = []
+        with self._lock:
+            for date_, row, score in zip(dates, rows, scores):
+                day = self._days.get(date_)
+                if day is None:
+                    continue
+
+                # The day is scored again if it changed while it was scored
+                if self._features(date_, day) == row:
+                    self._pending.discard(date_)
+
+                # An event is emitted when the day becomes an anomaly
+                is_anomaly = bool(score < threshold)
+                if is_anomaly and not day["anomaly"]:
+                    event = {
+                        "id": self._next_event_id,
+                        "date": date_.isoformat(),
+                        "detected_at": datetime.datetime.now().isoformat(),
+                        "score": float(score),
+                        "threshold": float(threshold),
+                        **dict(zip(FEATURE_COLUMNS_, row)),
+                    }
+                    self._next_event_id += 1
+                    self._events.append(event)
+                    events.append(event)
+                day["score"] = float(score)
+                day["anomaly"] = is_anomaly
+
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    print(f"The anomaly event could not be sent: {e}")
+
+        return events
+
+    def schedule_scoring(self) -> None:
+        """
+        This function wakes the scoring thread, started the first time, to
+        score the pending days. The calls made while the days are scored
+        are merged in the next call to score_pending.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="online-anomaly", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        """
+        This function is the loop of the scoring thread.
+        """
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.score_pending()
+
+    def get_days(self) -> List[Dict[str, Any]]:
+        """
+        This function returns the running features, the last score and the
+        state of the recent days.
+        """
+        with self._lock:
+            return [
+                {
+                    "date": date_.isoformat(),
+                    **dict(
+                        zip(FEATURE_COLUMNS_, self._features(date_, day))
+                    ),
+                    "score": day["score"],
+                    "prediction": "anomaly" if day["anomaly"] else "normal",
+                }
+                for date_, day in sorted(self._days.items())
+            ]
+
+    def get_events(self, after_id: int = 0) -> List[Dict[str, Any]]:
+        """
+        This function returns the events kept in memory with an id greater
+        than after_id, so a client gets only the new events.
+        """
+        with self._lock:
+            return [event for event in self._events if event["id"] > after_id]
+
+
+def post_to_webhook(url: str) -> Callable[[Dict[str, Any]], None]:
+    """
+    This function returns a listener that posts each event to the url in
+    background, so the insertion does not wait for it.
+
+    Parameters
+    ----------
+    url : str
+        The url of the webhook.
+
+    Returns
+    -------
+    Callable[[Dict[str, Any]], None]
+        The listener of the events.
+    """
+
+    def post(event: Dict[str, Any]) -> None:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(event).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+
+        def send() -> None:
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+            except Exception as e:
+                print(f"The anomaly event could not be posted: {e}")
+
+        threading.Thread(target=send, name="anomaly-webhook").start()
+
+    return post
+
+
+online_detector = OnlineAnomalyDetector(
+    max_age_days=int(os.getenv("ONLINE_ANOMALY_MAX_AGE_DAYS", 1)),
+    threshold=float(os.environ["ONLINE_ANOMALY_THRESHOLD"])
+    if "ONLINE_ANOMALY_THRESHOLD" in os.environ
+    else None,
+)
+if os.getenv("ANOMALY_WEBHOOK_URL") is not None:
+    online_detector.subscribe(
+        post_to_webhook(os.environ["ANOMALY_WEBHOOK_URL"])
+    )
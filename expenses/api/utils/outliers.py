@@ -0,0 +1,272 @@
+import collections
+import datetime
+import threading
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from expenses.api.utils.features import ANOMALY_TRANSACTION_TYPES_
+from expenses.api.utils.merchants import (
+    canonicalize_merchant,
+    get_merchant_categories,
+    get_recent_expenses,
+    merchant_dictionary,
+)
+
+# Scale of the MAD and of the mean absolute deviation to be comparable to
+# the standard deviation of a normal distribution
+MAD_SCALE_ = 0.6745
+MEAN_AD_SCALE_ = 1.253314
+
+
+def robust_zscore(
+    value: float, median: float, mad: float, mean_ad: float
+) -> Optional[float]:
+    """
+    This function returns the robust z-score of a value: its distance to
+    the median in MADs. If the MAD is 0, the mean absolute deviation is
+    used instead.
+
+    Parameters
+    ----------
+    value : float
+        The value to score.
+    median : float
+        The median of the history.
+    mad : float
+        The median absolute deviation of the history.
+    mean_ad : float
+        The mean absolute deviation of the history.
+
+    Returns
+    -------
+    Optional[float]
+        The robust z-score, or None if the history has no deviation and the
+        value is not the median.
+    """
+    if mad > 0:
+        return MAD_SCALE_ * (value - median) / mad
+    if mean_ad > 0:
+        return (value - median) / (MEAN_AD_SCALE_ * mean_ad)
+    return 0.0 if value == median else None
+
+
+class TransactionOutliers:
+    """
+    This class keeps the recent expenses of each merchant and of each
+    category in memory, to score each transaction with the robust z-score
+    of its amount against the history of its merchant and of its category.
+    A purchase that is unusual for its merchant is found even if the total
+    of its day is normal.
+
+    The median and the deviations of a merchant or a category are computed
+    when they are needed and kept until a new expense of it is added, so
+    an insertion only appends the amount and a score is a lookup.
+
+    Parameters
+    ----------
+    window_days : int
+        The number of days of the history, by default 365.
+    max_history : int
+        The maximum number of expenses kept by merchant or category, by
+        default 200.
+    min_history : int
+        The minimum number of expenses to score against a history, by
+        default 5.
+    """
+
+    def __init__(
+        self,
+        window_days: int = 365,
+        max_history: int = 200,
+        min_history: int = 5,
+    ):
+        self._window_days = window_days
+        self._max_history = max_history
+        self._min_history = min_history
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        This function removes the history, so it is loaded again from the
+        database.
+        """
+        with self._lock:
+            # Date and amount of the expenses, by merchant and by category
+            self._history: Dict[Tuple[str, str], Deque] = {}
+            # Median, MAD, mean absolute deviation and size of each history
+            self._stats: Dict[Tuple[str, str], Tuple] = {}
+            self._categories: Dict[str, str] = {}
+            self._today: Optional[datetime.date] = None
+
+    def get_window_start(self, today: datetime.date) -> datetime.date:
+        """
+        This function returns the first date of the history used to score
+        the expenses of a day.
+        """
+        return today - datetime.timedelta(days=self._window_days)
+
+    def _append(
+        self, merchant: str, date_: datetime.date, amount: float
+    ) -> None:
+        """
+        This function adds an expense to the history of its merchant and
+        of its category.
+        """
+        keys = [("merchant", merchant)]
+        if merchant in self._categories:
+            keys.append(("category", self._categories[merchant]))
+
+        # The expenses are scored by their absolute amount
+        for key in keys:
+            self._history.setdefault(
+                key, collections.deque(maxlen=self._max_history)
+            ).append((date_, abs(amount)))
+            self._stats.pop(key, None)
+
+    def _load(self, today: datetime.date) -> None:
+        """
+        This function loads the expenses of the window and the category of
+        each merchant from the database. If the database cannot be read,
+        the exception is raised and the history is loaded in the next call.
+        """
+        merchant_categories = get_merchant_categories()
+        names = merchant_dictionary.get_names(merchant_categories)
+        expenses = get_recent_expenses(
+            self.get_window_start(today), ANOMALY_TRANSACTION_TYPES_
+        )
+
+        self._history, self._stats = {}, {}
+        self._categories = {
+            names[merchant_id]: category
+            for merchant_id, category in merchant_categories.items()
+        }
+        for date_, merchant, amount in expenses:
+            self._append(canonicalize_merchant(merchant), date_, amount)
+        self._today = today
+
+    def _get_stats(self, key: Tuple[str, str]) -> Optional[Tuple]:
+        """
+        This function returns the median, the MAD, the mean absolute
+        deviation and the size of a history, computed once per change.
+        """
+        if key not in self._stats:
+            import numpy as np
+
+            date_from = self.get_window_start(self._today)
+            amounts = np.array(
+                [
+                    amount
+                    for date_, amount in self._history.get(key, [])
+                    if date_ > date_from
+                ]
+            )
+            if len(amounts) < self._min_history:
+                self._stats[key] = None
+            else:
+                median = np.median(amounts)
+                deviations = np.abs(amounts - median)
+                self._stats[key] = (
+                    float(median),
+                    float(np.median(deviations)),
+                    float(np.mean(deviations)),
+                    len(amounts),
+                )
+
+        return self._stats[key]
+
+    def add(
+        self, merchant: Optional[str], date_: datetime.date, amount: float
+    ) -> None:
+        """
+        This function adds a new expense to the history, if it is loaded.
+
+        Parameters
+        ----------
+        merchant : Optional[str]
+            The merchant, as it comes in the email.
+        date_ : datetime.date
+            The date of the expense.
+        amount : float
+            The amount of the expense.
+        """
+        with self._lock:
+            if self._today is None:
+                return
+            self._append(canonicalize_merchant(merchant), date_, amount)
+
+    def score(
+        self, merchant: Optional[str], amount: float, today: datetime.date
+    ) -> Dict[str, Any]:
+        """
+        This function returns the robust z-scores of an expense against the
+        history of its merchant and of its category. The history is loaded
+        the first time and again each day.
+
+        Parameters
+        ----------
+        merchant : Optional[str]
+            The merchant, as it comes in the email.
+        amount : float
+            The amount of the expense.
+        today : datetime.date
+            The current date.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The category of the merchant, the z-scores and the size of the
+            histories. A z-score is None if the history is too short. A
+            positive z-score is an expense larger than usual.
+        """
+        return self.score_many([(merchant, amount)], today)[0]
+
+    def score_many(
+        self,
+        expenses: List[Tuple[Optional[str], float]],
+        today: datetime.date,
+    ) -> List[Dict[str, Any]]:
+        """
+        This function returns the scores of many expenses, as score, with
+        the lock taken once.
+
+        Parameters
+        ----------
+        expenses : List[Tuple[Optional[str], float]]
+            The merchant and the amount of each expense.
+        today : datetime.date
+            The current date.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The scores of each expense.
+        """
+        with self._lock:
+            if self._today != today:
+                self._load(today)
+
+            scores = []
+            for merchant, amount in expenses:
+                name = canonicalize_merchant(merchant)
+                category = self._categories.get(name)
+                score = {"category": category}
+                for kind, key in [("merchant", name), ("category", category)]:
+                    stats = (
+                        self._get_stats((kind, key))
+                        if key is not None
+                        else None
+                    )
+                    score[f"{kind}_zscore"] = (
+                        robust_zscore(abs(amount), *stats[:3])
+                        if stats is not None
+                        else None
+                    )
+                    score[f"{kind}_history"] = (
+                        stats[3] if stats is not None else 0
+                    )
+                scores.append(score)
+
+        return scores
+
+
+transaction_outliers = TransactionOutliers()
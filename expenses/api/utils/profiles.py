@@ -0,0 +1,118 @@
+import datetime
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from expenses.api.utils.database import get_hourly_amounts
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class IntradayProfiles:
+    """
+    This class keeps the profile of the cumulative purchases by hour of
+    each weekday: for each hour, the median amount spent from the start of
+    the day to the end of the hour. Only the closed days are used, and the
+    days without purchases since the first purchase count as 0.
+
+    The cumulative amounts of the closed days are kept in memory, so when
+    a day closes only that day is read from the database and the profile
+    of its weekday is recomputed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        This function removes the loaded days, so the profiles are
+        computed again from all the history. It must be called when a
+        transaction of a closed day changes.
+        """
+        with self._lock:
+            # Cumulative amounts of each closed day, by weekday
+            self._days: Dict[int, Dict[datetime.date, np.ndarray]] = {}
+            self._profiles: Dict[int, List[Dict]] = {}
+            self._closed_until: Optional[datetime.date] = None
+            self._first_date: Optional[datetime.date] = None
+
+    def invalidate_day(self, date_: datetime.date) -> None:
+        """
+        This function invalidates the profiles if the day is already
+        closed, for example when a past transaction is inserted.
+        """
+        if self._closed_until is not None and date_ < self._closed_until:
+            self.invalidate()
+
+    def _load_days(
+        self, date_from: Optional[datetime.date], date_to: datetime.date
+    ) -> None:
+        """
+        This function loads the cumulative amounts of the days between the
+        dates and updates the profiles of their weekdays.
+        """
+        import numpy as np
+
+        amounts: Dict[datetime.date, np.ndarray] = {}
+        for date_, hour, amount in get_hourly_amounts(date_from, date_to):
+            amounts.setdefault(date_, np.zeros(24))[hour] += amount
+
+        # The days without purchases are not returned, so they are added
+        # with 0 from the first day with purchases
+        if len(amounts) > 0 and self._first_date is None:
+            self._first_date = min(amounts)
+        if self._first_date is not None:
+            date_ = max(date_from or self._first_date, self._first_date)
+            while date_ < date_to:
+                amounts.setdefault(date_, np.zeros(24))
+                date_ += datetime.timedelta(days=1)
+
+        for date_, day_amounts in amounts.items():
+            self._days.setdefault(date_.isoweekday(), {})[date_] = np.cumsum(
+                day_amounts
+            )
+
+        for weekday in {date_.isoweekday() for date_ in amounts}:
+            median_cumulative = np.median(
+                np.stack(list(self._days[weekday].values())), axis=0
+            )
+            self._profiles[weekday] = [
+                {"hour": hour, "median_cumulative_amount": float(amount)}
+                for hour, amount in enumerate(median_cumulative)
+            ]
+
+        self._closed_until = date_to
+
+    def get(self, weekday: int, today: datetime.date) -> List[Dict]:
+        """
+        This function returns the profile of the weekday. The days closed
+        since the last call are loaded first.
+
+        Parameters
+        ----------
+        weekday : int
+            The weekday, from 1 (Monday) to 7 (Sunday).
+        today : datetime.date
+            The current date. The days before it are closed.
+
+        Returns
+        -------
+        List[Dict]
+            The hour and the median cumulative amount of each hour.
+        """
+        with self._lock:
+            if self._closed_until is None or self._closed_until < today:
+                self._load_days(self._closed_until, today)
+            return self._profiles.get(weekday, [])
+
+    def count_days(self, weekday: int) -> int:
+        """
+        This function returns the number of closed days of the weekday used
+        in the profile.
+        """
+        with self._lock:
+            return len(self._days.get(weekday, {}))
+
+
+intraday_profiles = IntradayProfiles()
@@ -0,0 +1,406 @@
+import datetime
+import functools
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from expenses.api.utils.forest import CompactForest
+
+# Stages of the versions of the model
+STAGES_ = ["none", "staging", "production", "archived"]
+
+
+class ModelRegistry:
+    """
+    This class is the base of the registries of the anomaly model. A
+    registry saves the versions of the model, loads them and keeps the
+    stage of each version.
+    """
+
+    name = None
+
+    def register(
+        self,
+        model: Any,
+        stage: str = "staging",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        This function saves a new version of the model in the stage and
+        returns the id of the version.
+        """
+        raise NotImplementedError
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """
+        This function returns the id, the stage and the creation time of
+        each version, from the newest to the oldest.
+        """
+        raise NotImplementedError
+
+    def load(self, version: str) -> "CompactForest":
+        """
+        This function loads a version of the model, as a CompactForest.
+        """
+        raise NotImplementedError
+
+    def promote(self, version: str, stage: str) -> None:
+        """
+        This function moves a version to the stage. The previous version of
+        the stage is archived, so there is one version per stage.
+        """
+        raise NotImplementedError
+
+    def get_version(self, stage: Optional[str] = None) -> Optional[str]:
+        """
+        This function returns the newest version of the stage, or the
+        newest version if the stage is None.
+
+        Parameters
+        ----------
+        stage : Optional[str]
+            The stage of the version.
+
+        Returns
+        -------
+        Optional[str]
+            The id of the version, or None if there are no versions.
+        """
+        for version in self.list_versions():
+            if stage is None or version["stage"] == stage:
+                return version["id"]
+        return None
+
+
+def _hash_forest(path: str) -> str:
+    """
+    This function returns the hash of the files of a compact model.
+    """
+    content_hash = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as f:
+            content_hash.update(f.read())
+    return content_hash.hexdigest()
+
+
+class LocalModelRegistry(ModelRegistry):
+    """
+    This class is the registry of the models in a local directory. Each
+    version is saved in a file named by the hash of its content, so a file
+    is never changed and the same model is saved once. The versions and
+    their stages are kept in an index that is replaced atomically.
+
+    The model is also saved as a CompactForest, which is the one loaded:
+    its arrays are memory-mapped and no pickle is executed to serve it.
+    The pickle is kept for the versions saved before the compact format.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the registry.
+    """
+
+    name = "local"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._index_path = os.path.join(path, "registry.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, "versions"), exist_ok=True)
+
+    def _read_index(self) -> Dict[str, Any]:
+        if not os.path.exists(self._index_path):
+            return {"versions": []}
+        with open(self._index_path, "r") as f:
+            return json.load(f)
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        """
+        This function writes the index in a temporary file and renames it,
+        so the readers see the old or the new index, never a partial one.
+        """
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=self._path, prefix=".registry-", suffix=".tmp"
+        )
+        with os.fdopen(descriptor, "w") as f:
+            json.dump(index, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._index_path)
+
+    def _version_path(self, content_hash: str) -> str:
+        return os.path.join(self._path, "versions", f"{content_hash}.pkl")
+
+    def _forest_path(self, content_hash: str) -> str:
+        return os.path.join(self._path, "versions", f"{content_hash}.forest")
+
+    def register(
+        self,
+        model: Any,
+        stage: str = "staging",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        from expenses.api.utils.forest import CompactForest
+
+        content = pickle.dumps(model)
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        with self._lock:
+            index = self._read_index()
+
+            # The same model is not saved twice
+            for version in index["versions"]:
+                if version["sha256"] == content_hash:
+                    return version["id"]
+
+            # The content is written before the version is in the index
+            path = self._version_path(content_hash)
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+
+            forest_path = self._forest_path(content_hash)
+            if not os.path.exists(forest_path):
+                CompactForest.from_isolation_forest(model).save(forest_path)
+
+            version_number = len(index["versions"]) + 1
+            version_id = f"{version_number:04d}-{content_hash[:12]}"
+            index["versions"].append(
+                {
+                    "id": version_id,
+                    "sha256": content_hash,
+                    "forest_sha256": _hash_forest(forest_path),
+                    "stage": "none",
+                    "created_at": datetime.datetime.now().isoformat(),
+                    "metadata": metadata or {},
+                }
+            )
+            self._write_index(index)
+
+        if stage != "none":
+            self.promote(version_id, stage)
+
+        return version_id
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            versions = self._read_index()["versions"]
+
+        return [
+            {
+                "id": version["id"],
+                "stage": version["stage"],
+                "created_at": version["created_at"],
+            }
+            for version in reversed(versions)
+        ]
+
+    def load(self, version: str) -> "CompactForest":
+        from expenses.api.utils.forest import CompactForest
+
+        with self._lock:
+            versions = self._read_index()["versions"]
+
+        saved_versions = {v["id"]: v for v in versions}
+        if version not in saved_versions:
+            raise KeyError(f"The version {version} does not exist.")
+        saved_version = saved_versions[version]
+
+        # The content must be the one registered
+        if "forest_sha256" in saved_version:
+            path = self._forest_path(saved_version["sha256"])
+            if _hash_forest(path) != saved_version["forest_sha256"]:
+                raise ValueError(f"The version {version} is corrupted.")
+            return CompactForest.load(path)
+
+        with open(self._version_path(saved_version["sha256"]), "rb") as f:
+            content = f.read()
+
+        if hashlib.sha256(content).hexdigest() != saved_version["sha256"]:
+            raise ValueError(f"The version {version} is corrupted.")
+
+        return CompactForest.from_isolation_forest(pickle.loads(content))
+
+    def promote(self, version: str, stage: str) -> None:
+        if stage not in STAGES_:
+            raise ValueError(f"The stage {stage} does not exist.")
+
+        with self._lock:
+            index = self._read_index()
+            if version not in {v["id"] for v in index["versions"]}:
+                raise KeyError(f"The version {version} does not exist.")
+
+            # Both changes are written in the same index
+            for saved_version in index["versions"]:
+                if saved_version["id"] == version:
+                    saved_version["stage"] = stage
+                elif (
+                    saved_version["stage"] == stage
+                    and stage not in ["none", "archived"]
+                ):
+                    saved_version["stage"] = "archived"
+            self._write_index(index)
+
+
+class NeptuneModelRegistry(ModelRegistry):
+    """
+    This class is the registry of the models in Neptune, used in
+    production. neptune is imported when it is used, because importing it
+    takes more than a second and the local registry does not need it.
+
+    Parameters
+    ----------
+    project : str
+        The Neptune project.
+    model_id : str
+        The id of the model in the project.
+    """
+
+    name = "neptune"
+
+    def __init__(self, project: str, model_id: str):
+        self._project = project
+        self._model_id = model_id
+
+    def _api_token(self) -> str:
+        return os.environ["NEPTUNE_API_TOKEN"] + "=="
+
+    def register(
+        self,
+        model: Any,
+        stage: str = "staging",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        import neptune
+
+        # Initialize Neptune run to log the metadata
+        run = neptune.init_run(
+            project=self._project, api_token=self._api_token()
+        )
+        for key, value in (metadata or {}).items():
+            run[key] = value
+        run.stop()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "anomaly_model.pkl")
+            with open(path, "wb") as f:
+                pickle.dump(model, f)
+
+            model_version = neptune.init_model_version(
+                model=self._model_id,
+                project=self._project,
+                api_token=self._api_token(),
+            )
+            model_version["model"].upload(path)
+            model_version.wait()
+            version_id = model_version["sys/id"].fetch()
+            model_version.stop()
+
+        if stage != "none":
+            self.promote(version_id, stage)
+
+        return version_id
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        import neptune
+
+        model_neptune = neptune.init_model(
+            with_id=self._model_id,
+            project=self._project,
+            api_token=self._api_token(),
+            mode="read-only",
+        )
+        versions_df = model_neptune.fetch_model_versions_table().to_pandas()
+        model_neptune.stop()
+
+        if len(versions_df) == 0:
+            return []
+
+        versions_df = versions_df.sort_values(
+            by=["sys/creation_time"], ascending=False
+        )
+        return [
+            {
+                "id": row["sys/id"],
+                "stage": row["sys/stage"],
+                "created_at": str(row["sys/creation_time"]),
+            }
+            for _, row in versions_df.iterrows()
+        ]
+
+    def load(self, version: str) -> "CompactForest":
+        import neptune
+
+        from expenses.api.utils.forest import CompactForest
+
+        model_version = neptune.init_model_version(
+            project=self._project,
+            with_id=version,
+            api_token=self._api_token(),
+            mode="read-only",
+        )
+
+        # Download the model in a temporary directory
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "anomaly_model.pkl")
+            model_version["model"].download(path)
+            model_version.stop()
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+
+        # The trees are scored with the compact model, as the local one
+        return CompactForest.from_isolation_forest(model)
+
+    def promote(self, version: str, stage: str) -> None:
+        import neptune
+
+        if stage not in STAGES_:
+            raise ValueError(f"The stage {stage} does not exist.")
+
+        # Neptune changes the stage of a version atomically, then the
+        # previous versions of the stage are archived.
+        previous_versions = [
+            saved_version["id"]
+            for saved_version in self.list_versions()
+            if saved_version["stage"] == stage
+            and saved_version["id"] != version
+        ]
+        for version_id, new_stage in [(version, stage)] + [
+            (version_id, "archived")
+            for version_id in previous_versions
+            if stage not in ["none", "archived"]
+        ]:
+            model_version = neptune.init_model_version(
+                project=self._project,
+                with_id=version_id,
+                api_token=self._api_token(),
+            )
+            model_version.change_stage(new_stage)
+            model_version.stop()
+
+
+@functools.lru_cache(maxsize=None)
+def get_registry() -> ModelRegistry:
+    """
+    This function returns the registry of the models: the local directory
+    set in the MODEL_REGISTRY_PATH environment variable, or Neptune if it
+    is not set.
+
+    Returns
+    -------
+    ModelRegistry
+        The registry of the models.
+    """
+    registry_path = os.getenv("MODEL_REGISTRY_PATH")
+    if registry_path is not None:
+        return LocalModelRegistry(registry_path)
+
+    return NeptuneModelRegistry(
+        project="carlos.osorio/expenses-anomaly", model_id="EX-ANOMODEL"
+    )
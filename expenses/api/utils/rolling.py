@@ -0,0 +1,272 @@
+import datetime
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from expenses.api.utils.merchants import (
+    get_merchant_daily_amounts,
+    merchant_dictionary,
+)
+
+# Sizes of the rolling windows, in days
+WINDOWS_ = [1, 7, 30, 365]
+
+
+class RollingMerchantWindows:
+    """
+    This class keeps the amount and the number of purchases of each
+    merchant in rolling windows of 1, 7, 30 and 365 days, and in the
+    previous period of the same size, to compare them.
+
+    The purchases of each day are kept in memory for the largest window
+    and its previous period. When a purchase is inserted it is added to
+    the windows, and when the day changes only the days that move from
+    one period to the other are added or subtracted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """
+        This function removes the loaded days, so the windows are computed
+        again from the database.
+        """
+        with self._lock:
+            self._days: Dict[datetime.date, Dict[int, List]] = {}
+            self._totals: Dict[int, Dict[str, Dict[int, List]]] = {}
+            self._today: Optional[datetime.date] = None
+
+    def _period(self, date_: datetime.date, window: int) -> Optional[str]:
+        """
+        This function returns the period of the window of the day:
+        "current", "previous" or None if the day is out of both periods.
+        """
+        days_ago = (self._today - date_).days
+        if 0 <= days_ago < window:
+            return "current"
+        elif window <= days_ago < 2 * window:
+            return "previous"
+        return None
+
+    def _update_totals(
+        self,
+        window: int,
+        period: str,
+        merchant_id: int,
+        amount: float,
+        count: int,
+    ) -> None:
+        """
+        This function adds the purchases of a merchant to a period of a
+        window. The merchants without purchases are removed.
+        """
+        totals = self._totals[window][period].setdefault(
+            merchant_id, [0.0, 0]
+        )
+        totals[0] += amount
+        totals[1] += count
+        if totals[1] == 0:
+            del self._totals[window][period][merchant_id]
+
+    def _add_to_totals(
+        self,
+        date_: datetime.date,
+        merchant_id: int,
+        amount: float,
+        count: int,
+    ) -> None:
+        """
+        This function adds the purchases of a merchant in a day to the
+        periods of the windows that contain the day.
+        """
+        for window in WINDOWS_:
+            period = self._period(date_, window)
+            if period is not None:
+                self._update_totals(
+                    window, period, merchant_id, amount, count
+                )
+
+    def _load(self, today: datetime.date) -> None:
+        """
+        This function loads the purchases of the days of the windows from
+        the database.
+        """
+        self._today = today
+        self._days = {}
+        self._totals = {
+            window: {"current": {}, "previous": {}} for window in WINDOWS_
+        }
+
+        date_from = today - datetime.timedelta(days=2 * max(WINDOWS_) - 1)
+        for date_, merchant_id, amount, count in get_merchant_daily_amounts(
+            date_from
+        ):
+            self._days.setdefault(date_, {})[merchant_id] = [amount, count]
+            self._add_to_totals(date_, merchant_id, amount, count)
+
+    def _advance(self, today: datetime.date) -> None:
+        """
+        This function moves the windows to the new day. Each day, only the
+        days that change of period are moved: the last day of the current
+        period goes to the previous period and the last day of the
+        previous period goes out of the window.
+        """
+        while self._today < today:
+            for window in WINDOWS_:
+                for days_ago, old_period, new_period in [
+                    (window - 1, "current", "previous"),
+                    (2 * window - 1, "previous", None),
+                ]:
+                    date_ = self._today - datetime.timedelta(days=days_ago)
+                    for merchant_id, (amount, count) in self._days.get(
+                        date_, {}
+                    ).items():
+                        self._update_totals(
+                            window, old_period, merchant_id, -amount, -count
+                        )
+                        if new_period is not None:
+                            self._update_totals(
+                                window, new_period, merchant_id, amount, count
+                            )
+
+            # Remove the day out of the largest previous period
+            self._days.pop(
+                self._today - datetime.timedelta(days=2 * max(WINDOWS_) - 1),
+                None,
+            )
+            self._today += datetime.timedelta(days=1)
+
+            # The purchases of the new day were saved before the day came
+            for merchant_id, (amount, count) in self._days.get(
+                self._today, {}
+            ).items():
+                for window in WINDOWS_:
+                    self._update_totals(
+                        window, "current", merchant_id, amount, count
+                    )
+
+    def _refresh(self, today: datetime.date) -> None:
+        if self._today is None or today < self._today:
+            self._load(today)
+        elif today > self._today:
+            self._advance(today)
+
+    def add(
+        self, date_: datetime.date, merchant_id: Optional[int], amount: float
+    ) -> None:
+        """
+        This function adds a new purchase to the windows, if they are
+        loaded.
+
+        Parameters
+        ----------
+        date_ : datetime.date
+            The date of the purchase.
+        merchant_id : Optional[int]
+            The id of the merchant.
+        amount : float
+            The amount of the purchase.
+        """
+        with self._lock:
+            if self._today is None or merchant_id is None:
+                return
+
+            if (self._today - date_).days >= 2 * max(WINDOWS_):
+                return
+
+            totals = self._days.setdefault(date_, {}).setdefault(
+                merchant_id, [0.0, 0]
+            )
+            totals[0] += amount
+            totals[1] += 1
+
+            # The purchases of the next days are added when the day comes
+            if date_ <= self._today:
+                self._add_to_totals(date_, merchant_id, amount, 1)
+
+    def top(
+        self,
+        today: datetime.date,
+        window: int,
+        limit: int,
+        merchant_categories: Dict[int, str],
+        categories: Optional[Sequence[str]] = None,
+    ) -> List[Dict]:
+        """
+        This function returns the merchants with the largest purchases in
+        the window, with the purchases of the previous period.
+
+        Parameters
+        ----------
+        today : datetime.date
+            The current date, the last day of the window.
+        window : int
+            The size of the window in days: 1, 7, 30 or 365.
+        limit : int
+            The number of merchants to return.
+        merchant_categories : Dict[int, str]
+            The category of each merchant.
+        categories : Optional[Sequence[str]]
+            If given, only the merchants of these categories are returned.
+
+        Returns
+        -------
+        List[Dict]
+            The merchants, sorted by the amount of the purchases.
+        """
+        with self._lock:
+            self._refresh(today)
+            current = {
+                merchant_id: list(totals)
+                for merchant_id, totals in self._totals[window][
+                    "current"
+                ].items()
+            }
+            previous = {
+                merchant_id: list(totals)
+                for merchant_id, totals in self._totals[window][
+                    "previous"
+                ].items()
+            }
+
+        if categories is not None:
+            current = {
+                merchant_id: totals
+                for merchant_id, totals in current.items()
+                if merchant_categories.get(merchant_id) in categories
+            }
+
+        # The amounts of the purchases are negative
+        ranking = sorted(current.items(), key=lambda item: item[1][0])[
+            :limit
+        ]
+        names = merchant_dictionary.get_names(
+            [merchant_id for merchant_id, _ in ranking]
+        )
+
+        top_merchants = []
+        for merchant_id, (amount, count) in ranking:
+            previous_amount, previous_count = previous.get(
+                merchant_id, [0.0, 0]
+            )
+            top_merchants.append(
+                {
+                    "merchant": names[merchant_id],
+                    "category": merchant_categories.get(merchant_id),
+                    "amount": amount,
+                    "count": count,
+                    "previous_amount": previous_amount,
+                    "previous_count": previous_count,
+                    "amount_delta": amount - previous_amount,
+                    "amount_delta_pct": (amount - previous_amount)
+                    / abs(previous_amount)
+                    if previous_amount != 0
+                    else None,
+                }
+            )
+
+        return top_merchants
+
+
+merchant_windows = RollingMerchantWindows()
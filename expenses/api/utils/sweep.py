@@ -0,0 +1,215 @@
+import itertools
+import random
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import IsolationForest
+
+
+def get_configurations(
+    grid: Dict[str, List[Any]],
+    search: str = "grid",
+    n_iter: int = 10,
+    random_state: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    This function returns the configurations of the Isolation Forest to
+    evaluate: all the combinations of the grid, or a random sample of them.
+
+    Parameters
+    ----------
+    grid : Dict[str, List[Any]]
+        The values of each parameter.
+    search : str, optional
+        "grid" or "random", by default "grid".
+    n_iter : int, optional
+        The number of configurations of the random search, by default 10.
+    random_state : Optional[int]
+        The seed of the random search.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The parameters of each configuration.
+    """
+    names = list(grid)
+    configurations = [
+        dict(zip(names, values))
+        for values in itertools.product(*[grid[name] for name in names])
+    ]
+    if search == "random" and n_iter < len(configurations):
+        configurations = random.Random(random_state).sample(
+            configurations, n_iter
+        )
+
+    return configurations
+
+
+def time_series_splits(
+    n_samples: int, n_splits: int
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    This function returns the indices of the training and the validation
+    days of each fold. The days are sorted from the oldest to the newest,
+    each fold trains with all the days before its validation block, so a
+    model is never validated with days older than its training days.
+
+    Parameters
+    ----------
+    n_samples : int
+        The number of days.
+    n_splits : int
+        The number of folds.
+
+    Yields
+    ------
+    Tuple[np.ndarray, np.ndarray]
+        The indices of the training and the validation days.
+    """
+    block_size = n_samples // (n_splits + 1)
+    if block_size == 0:
+        raise ValueError(
+            f"There are not enough days ({n_samples}) for {n_splits} folds."
+        )
+
+    for fold in range(1, n_splits + 1):
+        validation_end = (
+            n_samples if fold == n_splits else (fold + 1) * block_size
+        )
+        yield (
+            np.arange(0, fold * block_size),
+            np.arange(fold * block_size, validation_end),
+        )
+
+
+def evaluate_configuration(
+    params: Dict[str, Any],
+    X: np.ndarray,
+    n_splits: int,
+    contamination: float,
+    random_state: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    This function fits a configuration in each fold and measures how much
+    the models of the folds agree on the anomalies of the last validation
+    block, which none of them was trained with: the mean Jaccard index of
+    the anomalies of each pair of folds. A stable configuration labels the
+    same days as anomalies when it is trained with more days. It is
+    executed in a worker process.
+
+    Parameters
+    ----------
+    params : Dict[str, Any]
+        The parameters of the Isolation Forest.
+    X : np.ndarray
+        The features of the days, from the oldest to the newest.
+    n_splits : int
+        The number of folds, at least two.
+    contamination : float
+        The expected rate of anomalies, the contamination of the models.
+    random_state : Optional[int]
+        The seed of the models, so the ranking is reproducible.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The parameters with the contamination, the agreement, the rate of
+        anomalies of the validation days of each fold and the mean fit
+        time in seconds.
+    """
+    params = {**params, "contamination": contamination}
+    splits = list(time_series_splits(len(X), n_splits))
+    reference = splits[-1][1]
+
+    anomalies, rates, fit_times = [], [], []
+    for train, validation in splits:
+        model = IsolationForest(
+            **params, n_jobs=1, random_state=random_state
+        )
+
+        start = time.perf_counter()
+        model.fit(X[train])
+        fit_times.append(time.perf_counter() - start)
+
+        rates.append(float(np.mean(model.predict(X[validation]) == -1)))
+        anomalies.append(
+            set(reference[model.predict(X[reference]) == -1].tolist())
+        )
+
+    # Two folds without anomalies agree
+    agreements = [
+        len(first & second) / len(first | second) if first | second else 1.0
+        for first, second in itertools.combinations(anomalies, 2)
+    ]
+
+    return {
+        "params": params,
+        "agreement": float(np.mean(agreements)),
+        "anomaly_rates": rates,
+        "fit_seconds": float(np.mean(fit_times)),
+    }
+
+
+def run_sweep(
+    configurations: List[Dict[str, Any]],
+    X: np.ndarray,
+    n_splits: int,
+    contamination: float,
+    n_jobs: Optional[int] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    random_state: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    This function evaluates the configurations in parallel, one per worker
+    process, and returns the results from the best to the worst: the
+    highest agreement between the folds and then the fastest fit.
+
+    The workers are the processes of joblib, the same used by sklearn with
+    n_jobs. They are started once and reused by the next sweeps.
+
+    Parameters
+    ----------
+    configurations : List[Dict[str, Any]]
+        The parameters of each configuration.
+    X : np.ndarray
+        The features of the days, from the oldest to the newest.
+    n_splits : int
+        The number of folds, at least two.
+    contamination : float
+        The expected rate of anomalies, the contamination of the models.
+    n_jobs : Optional[int]
+        The number of worker processes. If None, one per CPU.
+    on_result : Optional[Callable[[Dict[str, Any]], None]]
+        A function called with each result when it is returned. If it
+        raises an exception, the pending configurations are cancelled.
+    random_state : Optional[int]
+        The seed of the models, so the ranking is reproducible.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The result of each configuration.
+    """
+    parallel = Parallel(
+        n_jobs=n_jobs if n_jobs is not None else -1,
+        backend="loky",
+        return_as="generator",
+    )
+
+    results = []
+    for result in parallel(
+        delayed(evaluate_configuration)(
+            params, X, n_splits, contamination, random_state
+        )
+        for params in configurations
+    ):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    return sorted(
+        results,
+        key=lambda result: (-result["agreement"], result["fit_seconds"]),
+    )
@@ -1,7 +1,8 @@
 import datetime
 import os
 from collections import defaultdict
-from typing import List
+from email.message import Message
+from typing import Callable, Dict, List, Optional
 
 from expenses.api.schemas.expenses import (
     BaseTransactionInfo,
@@ -12,14 +13,29 @@ from expenses.core.transaction_email import TransactionEmail
 from expenses.processors.factory import EmailProcessorFactory
 from expenses.processors.schemas import TransactionInfo
 
+# Mapping between the fields of the summary and the transaction types
+# stored in the database.
+SUMMARY_TRANSACTION_TYPES_ = {
+    "purchases": "Compra",
+    "withdrawals": "Retiro",
+    "transfer_reception": "Recepcion Transferencia",
+    "transfer_qr": "QR",
+    "payment": "Pago",
+    "transfer": "Transferencia",
+}
+
 
 def get_transactions(
     email_from: str,
     date_to_search: datetime.datetime,
+    progress: Optional[Callable[[str], None]] = None,
+    date_until: Optional[datetime.datetime] = None,
+    on_transaction: Optional[Callable[[TransactionInfo], None]] = None,
 ) -> List[TransactionInfo]:
     """
     This function obtains the transactions from the specified email address
-    and returns the list of the information for all the transactions.
+    and returns the list of the information for all the transactions. Each
+    email is parsed when it is fetched.
 
     Parameters
     ----------
@@ -29,43 +45,95 @@ def get_transactions(
     date_to_search : datetime.datetime
         The date to obtain the transactions from.
 
+    progress : Callable[[str], None], optional
+        A function called with "fetched" after each email is fetched and
+        with "parsed" after each transaction is parsed.
+
+    date_until : datetime.datetime, optional
+        The date to obtain the transactions until (exclusive). If None,
+        until today.
+
+    on_transaction : Callable[[TransactionInfo], None], optional
+        A function called with each transaction when it is parsed, so it is
+        processed while the next emails are fetched.
+
     Returns
     -------
     List[TransactionInfo]
         The list of the information for all the transactions.
     """
+    transactions = []
+    processor_factory = EmailProcessorFactory()
+
+    def process_email(message: Message) -> None:
+        if progress is not None:
+            progress("fetched")
+
+        try:
+            transaction = processor_factory.get_processor(
+                TransactionEmail(message)
+            ).process()
+        except ValueError:
+            return
+
+        transactions.append(transaction)
+        if progress is not None:
+            progress("parsed")
+        if on_transaction is not None:
+            on_transaction(transaction)
+
     gmail_client = GmailClient(os.getenv("EMAIL"))
     emails_list = gmail_client.obtain_emails(
         email_from,
         most_recents_first=True,
         limit=None,
         date_to_search=date_to_search,
+        on_fetch=process_email,
+        date_until=date_until,
     )
 
     if len(emails_list) > 0:
         print(email_from, TransactionEmail(emails_list[0]))
 
-    transactions = []
-    processor_factory = EmailProcessorFactory()
-    for email in emails_list:
-        try:
-            transactions.append(
-                processor_factory.get_processor(
-                    TransactionEmail(email)
-                ).process()
-            )
-        except ValueError:
-            continue
-
     return transactions
 
 
+def get_summary_from_aggregates(
+    aggregates: Dict[str, BaseTransactionInfo],
+) -> SummaryTransactionInfo:
+    """
+    This function builds the summary of the transactions from the values
+    already aggregated by transaction type.
+
+    Parameters
+    ----------
+    aggregates : Dict[str, BaseTransactionInfo]
+        The aggregated values of the transactions, indexed by the
+        transaction type.
+
+    Returns
+    -------
+    SummaryTransactionInfo
+        The summary of the transactions.
+    """
+    return SummaryTransactionInfo(
+        **{
+            field: aggregates.get(
+                transaction_type,
+                BaseTransactionInfo(name="", amount=0, count=0),
+            )
+            for field, transaction_type in SUMMARY_TRANSACTION_TYPES_.items()
+        }
+    )
+
+
 def process_transactions_api_expenses(
     transactions: List[TransactionInfo],
 ) -> SummaryTransactionInfo:
     """
     This function processes the transactions and returns the summary of the
-    transactions.
+    transactions. This is only used for the transactions obtained from the
+    emails, the transactions in the database are aggregated by the query.
 
     Parameters
     ----------
@@ -77,16 +145,6 @@ def process_transactions_api_expenses(
     SummaryTransactionInfo
         The summary of the transactions.
     """
-
-    summary = SummaryTransactionInfo(
-        purchases=BaseTransactionInfo(name="", amount=0, count=0),
-        withdrawals=BaseTransactionInfo(name="", amount=0, count=0),
-        transfer_reception=BaseTransactionInfo(name="", amount=0, count=0),
-        transfer_qr=BaseTransactionInfo(name="", amount=0, count=0),
-        payment=BaseTransactionInfo(name="", amount=0, count=0),
-        transfer=BaseTransactionInfo(name="", amount=0, count=0),
-    )
-
     transaction_summary = defaultdict(
         lambda: BaseTransactionInfo(name="", amount=0, count=0)
     )
@@ -102,14 +160,4 @@ def process_transactions_api_expenses(
 
         transaction_summary[transaction.transaction_type].count += 1
 
-    # Set the values of the summary
-    summary.purchases = transaction_summary["Compra"]
-    summary.withdrawals = transaction_summary["Retiro"]
-    summary.transfer_reception = transaction_summary[
-        "Recepcion Transferencia"
-    ]
-    summary.transfer_qr = transaction_summary["QR"]
-    summary.payment = transaction_summary["Pago"]
-    summary.transfer = transaction_summary["Transferencia"]
-
-    return summary
+    return get_summary_from_aggregates(transaction_summary)
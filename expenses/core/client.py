@@ -3,7 +3,7 @@ import email
 import imaplib
 import os
 from email.message import Message
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from dotenv import load_dotenv
 
@@ -47,6 +47,7 @@ class GmailClient:
         email_from: str,
         most_recents_first: True,
         date_to_search: Optional[datetime.datetime] = None,
+        date_until: Optional[datetime.datetime] = None,
     ) -> List[str]:
         """
         This function obtains the ids of the emails from the specified email
@@ -66,6 +67,10 @@ class GmailClient:
             If None, obtain all the emails. The function receives a datetime
             object, but it only uses the date part.
 
+        date_until: datetime.datetime, optional
+            The date to obtain the emails until (exclusive). If None, obtain
+            the emails until today. Only the date part is used.
+
         Returns
         -------
         List[str]
@@ -87,6 +92,9 @@ class GmailClient:
                 f'(FROM "{email_from}") (SINCE "{date_to_search}")'
             )
 
+        if date_until is not None:
+            query_search += f' (BEFORE "{date_until.strftime("%d-%b-%Y")}")'
+
         _, msgs_ids = self.conn.search(None, query_search)
 
         # The msgs ids are returned as a list of bytes, so we need to decode
@@ -104,6 +112,8 @@ class GmailClient:
         most_recents_first: True,
         limit: int = None,
         date_to_search: Optional[datetime.datetime] = None,
+        on_fetch: Optional[Callable[[Message], None]] = None,
+        date_until: Optional[datetime.datetime] = None,
     ) -> List[Message]:
         """
         This function obtains the emails from the specified email address.
@@ -124,6 +134,13 @@ class GmailClient:
         date: datetime.datetime, optional
             The date to obtain the emails from.
 
+        on_fetch: Callable[[Message], None], optional
+            A function called after each email is fetched, e.g. to report
+            the progress. If it raises an exception, the fetch stops.
+
+        date_until: datetime.datetime, optional
+            The date to obtain the emails until (exclusive).
+
         Returns
         -------
         List[Message]
@@ -134,7 +151,7 @@ class GmailClient:
 
         # Obtain the ids of the emails
         msgs_ids = self._obtain_emails_ids(
-            email_from, most_recents_first, date_to_search
+            email_from, most_recents_first, date_to_search, date_until
         )
         limit = len(msgs_ids) if limit is None else limit
 
@@ -146,5 +163,7 @@ class GmailClient:
                 if isinstance(response, tuple):
                     msg = email.message_from_bytes(response[1])
                     messages.append(msg)
+                    if on_fetch is not None:
+                        on_fetch(msg)
 
         return messages
@@ -7,11 +7,18 @@ from expenses.api.routers import (
     monitoring_router,
 )
 from expenses.api.security import check_access_token
+from expenses.api.utils import model_cache
 
 # Define the FastAPI app
 app = FastAPI(title="Personal expenses API", version="0.1.0")
 
 
+# Load the anomaly model before the first prediction
+@app.on_event("startup")
+async def warm_model_cache():
+    model_cache.warm()
+
+
 # Create a root endpoint
 @app.get("/", dependencies=[Depends(check_access_token)])
 async def root():
@@ -0,0 +1,119 @@
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from expenses.api.utils.forest import CompactForest
+
+# Number of days to fit the model and of rows of the batch scoring
+TRAINING_DAYS_ = 1_000
+BATCH_ROWS_ = 365
+
+# Number of calls to measure each latency
+REPETITIONS_ = 200
+
+
+def build_features(total_rows: int, seed: int = 0) -> np.ndarray:
+    """
+    This function builds daily features as the ones of the anomaly model:
+    avg_amount, max_amount, total_trx and weekend.
+    """
+    rng = np.random.default_rng(seed)
+    total_trx = rng.poisson(6, total_rows) + 1
+    avg_amount = rng.lognormal(10, 0.5, total_rows)
+    max_amount = avg_amount * rng.uniform(1, 4, total_rows)
+    weekend = rng.integers(0, 2, total_rows)
+
+    return np.column_stack([avg_amount, max_amount, total_trx, weekend])
+
+
+def _timed_load(function: Callable[[], Any]) -> Tuple[Any, float, int]:
+    """
+    This function returns the result of a load, its time in seconds and
+    the peak of memory allocated by Python in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def _latency(function: Callable[[], Any]) -> float:
+    """
+    This function returns the median latency of a call in seconds.
+    """
+    times = []
+    for _ in range(REPETITIONS_):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return float(np.median(times))
+
+
+def _directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+    )
+
+
+def forest_benchmark_test():
+    """
+    This test compares the compact model with the pickled IsolationForest:
+    the scores must be the same, and the load time, the memory and the
+    latency to score a day and a year are printed.
+    """
+    X = build_features(TRAINING_DAYS_)
+    model = IsolationForest(max_samples=256, random_state=0).fit(X)
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "anomaly_model.pkl")
+        forest_path = os.path.join(directory, "anomaly_model.forest")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(model, f)
+        CompactForest.from_isolation_forest(model).save(forest_path)
+
+        def load_pickle() -> IsolationForest:
+            with open(pickle_path, "rb") as f:
+                return pickle.load(f)
+
+        pickled, pickle_time, pickle_memory = _timed_load(load_pickle)
+        compact, compact_time, compact_memory = _timed_load(
+            lambda: CompactForest.load(forest_path)
+        )
+        print(
+            f"Load: pickle {pickle_time * 1000:.1f} ms, "
+            f"{pickle_memory / 1024:.0f} KiB allocated, "
+            f"{os.path.getsize(pickle_path) / 1024:.0f} KiB on disk; "
+            f"compact {compact_time * 1000:.1f} ms, "
+            f"{compact_memory / 1024:.0f} KiB allocated, "
+            f"{_directory_size(forest_path) / 1024:.0f} KiB on disk"
+        )
+
+        # The compact model gives the same scores and predictions
+        X_test = build_features(BATCH_ROWS_, seed=1)
+        assert np.allclose(
+            pickled.score_samples(X_test), compact.score_samples(X_test)
+        )
+        assert np.array_equal(pickled.predict(X_test), compact.predict(X_test))
+
+        for name, rows in [("day", X_test[:1]), ("year", X_test)]:
+            pickle_latency = _latency(lambda: pickled.score_samples(rows))
+            compact_latency = _latency(lambda: compact.score_samples(rows))
+            print(
+                f"Score a {name}: pickle {pickle_latency * 1000:.2f} ms, "
+                f"compact {compact_latency * 1000:.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    forest_benchmark_test()
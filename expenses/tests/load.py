@@ -0,0 +1,84 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+
+import expenses.api.routers.expenses as expenses_router
+from expenses.api.security import check_access_token
+from expenses.main import app
+
+# Latency of the simulated slow query, in seconds
+SLOW_QUERY_SECONDS = 0.5
+
+
+def slow_daily_aggregates(date_from):
+    """
+    This function simulates a slow query to the database.
+    """
+    time.sleep(SLOW_QUERY_SECONDS)
+    return []
+
+
+async def _timed_get(client: httpx.AsyncClient, url: str) -> float:
+    """
+    This function returns the latency of a request in seconds.
+    """
+    start = time.perf_counter()
+    response = await client.get(url)
+    assert response.status_code == 200
+    return time.perf_counter() - start
+
+
+async def _mixed_load(slow_requests: int, fast_requests: int) -> dict:
+    """
+    This function sends slow and fast requests at the same time and
+    returns the latencies of each kind of request.
+    """
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        slow = [
+            _timed_get(client, "/expenses/daily-aggregates?timeframe=daily")
+            for _ in range(slow_requests)
+        ]
+        fast = [_timed_get(client, "/") for _ in range(fast_requests)]
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*slow, *fast)
+        total = time.perf_counter() - start
+
+    return {
+        "slow": latencies[:slow_requests],
+        "fast": latencies[slow_requests:],
+        "total": total,
+    }
+
+
+def load_mixed_requests_test():
+    """
+    This test measures if the slow queries block the event loop: the fast
+    requests should be answered while the slow queries are running, and
+    the slow queries should run concurrently in the database pool. The
+    latencies are printed, since they depend on the load of the machine.
+    """
+    app.dependency_overrides[check_access_token] = lambda: {}
+    original_function = expenses_router.get_daily_aggregates
+    expenses_router.get_daily_aggregates = slow_daily_aggregates
+
+    try:
+        results = asyncio.run(
+            _mixed_load(slow_requests=8, fast_requests=100)
+        )
+    finally:
+        expenses_router.get_daily_aggregates = original_function
+        app.dependency_overrides.clear()
+
+    fast_p95 = statistics.quantiles(results["fast"], n=20)[-1]
+    print(
+        f"Fast requests p95: {fast_p95 * 1000:.1f} ms, "
+        f"slow requests max: {max(results['slow']) * 1000:.1f} ms, "
+        f"total: {results['total'] * 1000:.1f} ms "
+        f"(slow query: {SLOW_QUERY_SECONDS * 1000:.0f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    load_mixed_requests_test()
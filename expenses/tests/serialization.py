@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import time
+from typing import Any, Callable, Dict, List
+
+import httpx
+import pytz
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import parse_obj_as
+
+import expenses.api.routers.database as database_router
+import expenses.api.routers.expenses as expenses_router
+import expenses.api.utils.outliers as outliers_module
+from expenses.api.schemas import (
+    LabeledTransactionInfoFull,
+    ScoredTransactionInfo,
+)
+from expenses.api.security import check_access_token
+from expenses.api.utils import transaction_outliers
+from expenses.main import app
+
+# Number of rows of each benchmark
+ROWS_ = [10_000, 100_000]
+
+# Number of rows added to the history of the outlier scores
+HISTORY_ROWS_ = 10_000
+
+
+def build_rows(total_rows: int) -> List[Dict[str, Any]]:
+    """
+    This function builds the rows of the transactions as they are returned
+    by the database.
+    """
+    now = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            "transaction_type": "Compra",
+            "amount": -1000.0 * (i % 97),
+            "merchant": f"MERCHANT {i % 500}",
+            "datetime": now - datetime.timedelta(minutes=i),
+            "paynment_method": "T.Cred *1234",
+            "email_log": f"email-{i}",
+            "category": "Food",
+        }
+        for i in range(total_rows)
+    ]
+
+
+def _timed(function: Callable[[], Any]) -> float:
+    """
+    This function returns the time of a call in seconds.
+    """
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def seed_outlier_history(rows: List[Dict[str, Any]]) -> None:
+    """
+    This function loads the rows in the history of the outlier scores as
+    expenses of today, without the database, so the expenses are scored
+    against their merchant.
+    """
+    today = datetime.datetime.now().astimezone(
+        pytz.timezone("America/Bogota")
+    )
+    original_functions = (
+        outliers_module.get_merchant_categories,
+        outliers_module.get_recent_expenses,
+    )
+    outliers_module.get_merchant_categories = lambda: {}
+    outliers_module.get_recent_expenses = lambda date_from, types: [
+        (today.date(), row["merchant"], row["amount"]) for row in rows
+    ]
+
+    try:
+        transaction_outliers.invalidate()
+        transaction_outliers.score_many([], today.date())
+    finally:
+        (
+            outliers_module.get_merchant_categories,
+            outliers_module.get_recent_expenses,
+        ) = original_functions
+
+
+def _validated_response(model: Any, rows: List[Dict[str, Any]]) -> bytes:
+    """
+    This function serialises the rows as FastAPI does with the response
+    model: the rows are validated, encoded and dumped with json.
+    """
+    return JSONResponse(
+        content=jsonable_encoder(parse_obj_as(List[model], rows))
+    ).body
+
+
+async def _timed_get(url: str) -> float:
+    """
+    This function returns the latency of a request in seconds.
+    """
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        start = time.perf_counter()
+        response = await client.get(url)
+        assert response.status_code == 200
+        return time.perf_counter() - start
+
+
+def serialization_benchmark_test():
+    """
+    This test compares the time to serialise the responses of the
+    transactions endpoints with the validated path of FastAPI and with the
+    direct path of the rows, for 10k and 100k rows. The outlier scores of
+    the full transactions are computed in both paths, against a history of
+    the same merchants. The times are printed, since they depend on the
+    load of the machine.
+    """
+    app.dependency_overrides[check_access_token] = lambda: {}
+    original_rows = expenses_router.get_transaction_rows_from_database
+    original_labeled = database_router.get_full_transaction_rows_with_labels
+    original_version = (
+        expenses_router.get_data_version,
+        database_router.get_data_version,
+    )
+    expenses_router.get_data_version = lambda *args, **kwargs: None
+    database_router.get_data_version = lambda *args, **kwargs: None
+
+    try:
+        seed_outlier_history(build_rows(HISTORY_ROWS_))
+
+        for total_rows in ROWS_:
+            rows = build_rows(total_rows)
+            transaction_rows = [
+                {k: v for k, v in row.items() if k != "category"}
+                for row in rows
+            ]
+            expenses_router.get_transaction_rows_from_database = (
+                lambda date_from: transaction_rows
+            )
+            database_router.get_full_transaction_rows_with_labels = (
+                lambda start_date, end_date: rows
+            )
+
+            scoring = _timed(
+                lambda: expenses_router.add_outlier_scores(transaction_rows)
+            )
+            print(
+                f"outlier scores ({total_rows} rows): "
+                f"{scoring * 1000:.0f} ms"
+            )
+
+            for name, model, get_rows, url in [
+                (
+                    "full-transactions",
+                    ScoredTransactionInfo,
+                    lambda: expenses_router.add_outlier_scores(
+                        transaction_rows
+                    ),
+                    "/expenses/full-transactions?timeframe=daily",
+                ),
+                (
+                    "labeled-transactions",
+                    LabeledTransactionInfoFull,
+                    lambda: rows,
+                    "/database/labeled-transactions"
+                    "?start_date=2024-01-01&end_date=2024-01-31",
+                ),
+            ]:
+                validated = _timed(
+                    lambda: _validated_response(model, get_rows())
+                )
+                endpoint = asyncio.run(_timed_get(url))
+                print(
+                    f"{name} ({total_rows} rows): validated serialisation "
+                    f"{validated * 1000:.0f} ms, endpoint with the direct "
+                    f"serialisation {endpoint * 1000:.0f} ms"
+                )
+    finally:
+        expenses_router.get_transaction_rows_from_database = original_rows
+        transaction_outliers.invalidate()
+        database_router.get_full_transaction_rows_with_labels = (
+            original_labeled
+        )
+        (
+            expenses_router.get_data_version,
+            database_router.get_data_version,
+        ) = original_version
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    serialization_benchmark_test()
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from typing import Dict
+
+# Expected time to import the application, in seconds
+STARTUP_BUDGET_SECONDS_ = 1.0
+
+# Dependencies that must be imported only when they are used
+LAZY_MODULES_ = ["numpy", "pandas", "sklearn", "neptune", "joblib", "pyarrow"]
+
+
+def _import_times() -> Dict[str, int]:
+    """
+    This function imports the application in a new interpreter with
+    -X importtime and returns the cumulative time of each module in
+    microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import expenses.main"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        check=True,
+    )
+
+    # Each line is "import time: self [us] | cumulative | imported package"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+
+    return times
+
+
+def startup_benchmark_test():
+    """
+    This test imports the application as the server does when it starts:
+    the heavy dependencies must not be imported. The time of the import,
+    compared with the budget, and the slowest modules are printed, since
+    the time depends on the load of the machine.
+    """
+    times = _import_times()
+
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+    for module, cumulative in slowest[:10]:
+        print(f"{cumulative / 1000:8.1f} ms  {module}")
+
+    startup = times["expenses.main"] / 1_000_000
+    print(
+        f"Startup: {startup * 1000:.0f} ms "
+        f"(budget {STARTUP_BUDGET_SECONDS_ * 1000:.0f} ms)"
+    )
+
+    imported = {module.split(".")[0] for module in times}
+    for module in LAZY_MODULES_:
+        assert module not in imported, f"{module} is imported at startup"
+
+
+if __name__ == "__main__":
+    startup_benchmark_test()
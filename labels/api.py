@@ -3,7 +3,6 @@ import pickle
 from typing import List, Union
 
 import numpy as np
-import pyodbc
 from dotenv import load_dotenv
 from fastapi import FastAPI
 
@@ -58,8 +57,11 @@ async def save_categories(
     for transaction in labeled_transactions:
         cursor.execute(
             """
-            INSERT INTO categories_trx (merchant, datetime, category, similarity)
-            SELECT ?, ?, ?, ?
+            INSERT INTO categories_trx
+                (merchant, merchant_id, datetime, category, similarity)
+            SELECT ?, (
+                SELECT MAX(merchant_id) FROM transactions WHERE merchant = ?
+            ), ?, ?, ?
             WHERE NOT EXISTS (
                 SELECT 1 FROM categories_trx
                 WHERE
@@ -68,15 +70,18 @@ async def save_categories(
                     category = ?
             )
             """,
-            transaction.merchant,
-            transaction.datetime,
-            transaction.category,
-            transaction.similarity,
-            transaction.merchant,
-            transaction.datetime,
-            transaction.category,
+            (
+                transaction.merchant,
+                transaction.merchant,
+                transaction.datetime,
+                transaction.category,
+                transaction.similarity,
+                transaction.merchant,
+                transaction.datetime,
+                transaction.category,
+            ),
         )
-        cursor.commit()
+        cursor.connection.commit()
 
     return {"message": "Data saved successfully"}
 
@@ -99,16 +104,19 @@ async def get_category(
     Category
         The category and the similarity score
     """
-    merchants = [transaction.merchant for transaction in transactions]
-    categories_ = get_merchant_category(merchants)
+    # Each merchant is labeled only once
+    merchants = list(
+        dict.fromkeys(transaction.merchant for transaction in transactions)
+    )
+    categories_ = dict(zip(merchants, get_merchant_category(merchants)))
     return [
         LabeledTransaction(
             merchant=transaction.merchant,
             datetime=transaction.datetime,
-            category=result_category["category"],
-            similarity=result_category["similarity"],
+            category=categories_[transaction.merchant]["category"],
+            similarity=categories_[transaction.merchant]["similarity"],
         )
-        for transaction, result_category in zip(transactions, categories_)
+        for transaction in transactions
     ]
 
 
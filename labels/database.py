@@ -1,16 +1,18 @@
 import os
-from typing import Union
+import sqlite3
+from typing import Any, Union
 
-import pyodbc
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 
-def get_cursor(return_conn: bool = False) -> Union[pyodbc.Cursor, None]:
+def get_cursor(return_conn: bool = False) -> Union[Any, None]:
     """
-    This function creates a connection to the database.
+    This function creates a connection to the database. The backend is
+    set in the DATABASE_BACKEND environment variable: "sqlserver"
+    (default) or "sqlite", with the path of the database in SQLITE_PATH.
 
     Parameters
     ----------
@@ -19,18 +21,27 @@ def get_cursor(return_conn: bool = False) -> Union[pyodbc.Cursor, None]:
         by default False.
     Returns
     -------
-    pyodbc.Connection
-        The connection to the database.
+    Cursor
+        The cursor of the connection to the database.
     """
     try:
         # Establish the connection
-        conn = pyodbc.connect(
-            f"""DRIVER=ODBC Driver 18 for SQL Server;\
-            SERVER={os.getenv("SERVER")};\
-            DATABASE={os.getenv("DATABASE")};\
-            UID={os.getenv("USERNAME")};\
-            PWD={os.getenv("PASSWORD")}"""
-        )
+        if os.getenv("DATABASE_BACKEND", "sqlserver") == "sqlite":
+            conn = sqlite3.connect(
+                os.getenv("SQLITE_PATH", "expenses/expenses.db"),
+                detect_types=sqlite3.PARSE_DECLTYPES,
+            )
+        else:
+            # The driver is only needed if SQL Server is used
+            import pyodbc
+
+            conn = pyodbc.connect(
+                f"""DRIVER=ODBC Driver 18 for SQL Server;\
+                SERVER={os.getenv("SERVER")};\
+                DATABASE={os.getenv("DATABASE")};\
+                UID={os.getenv("USERNAME")};\
+                PWD={os.getenv("PASSWORD")}"""
+            )
         cursor = conn.cursor()
         return cursor if not return_conn else (conn, cursor)
     except Exception:
@@ -17,6 +17,10 @@ load_dotenv()
 # URL of the API
 URL_API = "http://ec2-23-20-155-185.compute-1.amazonaws.com:5000"
 
+# Last responses of the API with their ETag, indexed by the url. They are
+# used to avoid downloading the transactions when they did not change.
+_CACHED_RESPONSES = {}
+
 
 def get_transactions(
     timeframe: Literal[
@@ -48,10 +52,16 @@ def get_transactions(
         "Accept": "application/json",
         "Authorization": f"Bearer {os.getenv('API_EXPENSES_TOKEN')}",
     }
+    if url in _CACHED_RESPONSES:
+        headers["If-None-Match"] = _CACHED_RESPONSES[url][0]
     response = requests.get(url, headers=headers)
 
+    # If the transactions did not change, use the last response
+    if response.status_code == 304:
+        transactions = _CACHED_RESPONSES[url][1]
+
     # Check if the response is 200
-    if response.status_code != 200:
+    elif response.status_code != 200:
         return [
             {
                 "datetime": datetime.datetime.now().isoformat(),
@@ -60,9 +70,13 @@ def get_transactions(
                 "amount": 0,
             }
         ]
+    else:
+        transactions = response.json()
+        if "ETag" in response.headers:
+            _CACHED_RESPONSES[url] = (response.headers["ETag"], transactions)
 
     # Return the transactions as a DataFrame
-    df_transactions = pd.DataFrame(response.json())
+    df_transactions = pd.DataFrame(transactions)
     return (
         df_transactions[
             df_transactions["transaction_type"].isin(
@@ -72,75 +86,42 @@ def get_transactions(
         if return_as_pandas
         else [
             transaction
-            for transaction in response.json()
+            for transaction in transactions
             if transaction["transaction_type"]
             in ["Compra", "Transferencia", "QR", "Pago"]
         ]
     )
 
 
-def compute_daily_values(transactions: pd.DataFrame) -> dict:
-    """
-    Compute the daily values of expenses to pass through the anomaly model.
-
-    Parameters
-    ----------
-    transactions : pd.DataFrame
-        The transactions of the current day.
-
-    Returns
-    -------
-    dict
-        The dictionary with the needed values
-    """
-    expenses_values = {
-        "avg_amount": (-1) * transactions["amount"].mean(),
-        "max_amount": (-1) * transactions["amount"].max(),
-        "total_trx": transactions.shape[0],
-        "weekend": "yes"
-        if datetime.datetime.now()
-        .astimezone(pytz.timezone("America/Bogota"))
-        .isoweekday()
-        in [6, 7]
-        else "no",
-    }
-    return expenses_values
-
-
-def check_anomaly(expenses_values: dict) -> Literal["normal", "anomaly"]:
+def check_anomaly(date_: datetime.date) -> Literal["normal", "anomaly"]:
     """
-    Make the request to check if the daily values are an anomaly.
+    Make the request to check if the expenses of the day are an anomaly.
+    The features of the day are computed by the API, with the same
+    definition used to train the model.
 
     Parameters
     ----------
-    expenses_values : dict
-        The dictionary with the needed values
+    date_ : datetime.date
+        The day to check.
 
     Returns
     -------
     Literal["normal", "anomaly"]
         Whether the values are an anomaly or not.
     """
-    params = {
-        "avg_amount": expenses_values["avg_amount"],
-        "max_amount": expenses_values["max_amount"],
-        "total_trx": expenses_values["total_trx"],
-        "weekend": expenses_values["weekend"],
-    }
-
     headers = {
         "accept": "application/json",
         "Authorization": f"Bearer {os.getenv('API_EXPENSES_TOKEN')}",
     }
-    response = requests.get(
-        URL_API + "/monitoring/predict_anomaly/",  # noqa
+    response = requests.post(
+        URL_API + "/monitoring/batch-prediction",
         headers=headers,
-        params=params,
+        json={"date_from": date_.isoformat(), "date_to": date_.isoformat()},
     )
-    if response.status_code != 200:
+    if response.status_code != 200 or len(response.json()) == 0:
         return "normal"
 
-    return response.json()["prediction"]
+    return response.json()[0]["prediction"]
 
 
 def get_average_normal_values() -> float:
@@ -163,6 +144,40 @@ def get_average_normal_values() -> float:
     return (-1) * response.json()["median_amount_of_purchases"]
 
 
+def get_typical_pace(hour: int) -> Union[float, None]:
+    """
+    This function calls the endpoint to obtain the amount usually spent
+    up to the end of the hour in a day like today.
+
+    Parameters
+    ----------
+    hour : int
+        The hour of the day.
+
+    Returns
+    -------
+    Union[float, None]
+        The median cumulative amount spent up to the hour, or None if
+        there is no history.
+    """
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {os.getenv('API_EXPENSES_TOKEN')}",
+    }
+    response = requests.get(
+        URL_API + "/expenses/intraday-profile/",  # noqa
+        headers=headers,
+    )
+    if response.status_code != 200:
+        return None
+
+    profile = response.json()["profile"]
+    if len(profile) == 0:
+        return None
+
+    return (-1) * profile[hour]["median_cumulative_amount"]
+
+
 def create_html_email(transactions: List[dict]) -> str:
     """
     Create the html email to send.
@@ -179,7 +194,11 @@ def create_html_email(transactions: List[dict]) -> str:
     """
     # Check the day status
     day_status = (
-        check_anomaly(compute_daily_values(pd.DataFrame(transactions)))
+        check_anomaly(
+            datetime.datetime.now()
+            .astimezone(pytz.timezone("America/Bogota"))
+            .date()
+        )
         if len(transactions) > 0
         else "normal"
     )
@@ -204,6 +223,19 @@ def create_html_email(transactions: List[dict]) -> str:
             )
         ),
     }
+    # Compare the spending with the usual spending up to this hour
+    now = datetime.datetime.now().astimezone(pytz.timezone("America/Bogota"))
+    typical_pace = get_typical_pace(now.hour)
+    pace_status = None
+    if typical_pace is not None:
+        pace_status = (
+            "ahead of"
+            if (-1)
+            * sum([transaction["amount"] for transaction in transactions])
+            > typical_pace
+            else "behind"
+        )
+
     # Render the template with the data
     rendered_template = template.render(
         date_value=datetime.datetime.now()
@@ -227,6 +259,10 @@ def create_html_email(transactions: List[dict]) -> str:
             * sum([transaction["amount"] for transaction in transactions])
             / get_average_normal_values()
         ),
+        typical_pace_amount="${:,.2f}".format(typical_pace)
+        if typical_pace is not None
+        else None,
+        pace_status=pace_status,
     )
 
     return rendered_template